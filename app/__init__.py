@@ -4,9 +4,12 @@ from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from .cache import Cache
+from .database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 migrate = Migrate()
+cache = Cache()
 login_manager = LoginManager()
 login_manager.login_view = 'main.admin_login'
 login_manager.login_message_category = 'info'
@@ -28,16 +31,162 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # --- Configuration for Database Connections ---
+    app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 10))
+    app.config['DB_MAX_OVERFLOW'] = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    app.config['DB_POOL_TIMEOUT'] = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    # Recycle connections before MySQL's wait_timeout drops them, and test each one on checkout
+    app.config['DB_POOL_RECYCLE'] = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    app.config['DB_POOL_PRE_PING'] = os.environ.get('DB_POOL_PRE_PING', '1') not in ('0', 'false', 'no')
+    # Server-side limit on statement run time (MySQL SELECTs, PostgreSQL); 0 = none
+    app.config['DB_STATEMENT_TIMEOUT_MS'] = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+    # Optional read replica for read-only views and the forecast extract
+    app.config['DATABASE_REPLICA_URL'] = os.environ.get('DATABASE_REPLICA_URL')
+    app.config['REPLICA_RETRY_SECONDS'] = int(os.environ.get('REPLICA_RETRY_SECONDS', 30))
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+    from .database import engine_options
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(database_uri, app.config)
+    if app.config['DATABASE_REPLICA_URL']:
+        replica_uri = app.config['DATABASE_REPLICA_URL']
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_uri, **engine_options(replica_uri, app.config)}}
+
+    # How many times an order is re-run after a deadlock or lock timeout
+    app.config['ORDER_RETRY_ATTEMPTS'] = int(os.environ.get('ORDER_RETRY_ATTEMPTS', 5))
+
+    # --- Configuration for Instrumentation ---
+    app.config['INSTRUMENTATION_ENABLED'] = os.environ.get('INSTRUMENTATION_ENABLED', '1') not in ('0', 'false', 'no')
+    # Statements slower than this are logged with their query plan
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+    # Their bound parameters (customer details, password hashes...) are only logged when this is on
+    app.config['SLOW_QUERY_LOG_PARAMETERS'] = os.environ.get('SLOW_QUERY_LOG_PARAMETERS', '0') not in ('0', 'false', 'no')
+    # Requests issuing more statements than this are logged (usually an N+1)
+    app.config['REQUEST_QUERY_WARN'] = int(os.environ.get('REQUEST_QUERY_WARN', 50))
+    # If set, /metrics requires "Authorization: Bearer <token>"; if not, it is only served in debug mode
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+    # --- Configuration for Result Caching ---
+    app.config['CACHE_DEFAULT_TTL'] = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    # Optional cache shared by all workers, e.g. redis://localhost:6379/0 or sqlite:////tmp/inventory-cache.db;
+    # without one, results are cached per process and their versions kept in the database
+    app.config['CACHE_SHARED_URL'] = os.environ.get('CACHE_SHARED_URL')
+
+    # Seconds a signed-in user's row is reused by the user loader without a query (0 disables)
+    app.config['IDENTITY_CACHE_TTL'] = int(os.environ.get('IDENTITY_CACHE_TTL', 30))
+    app.config['IDENTITY_CACHE_MAX'] = int(os.environ.get('IDENTITY_CACHE_MAX', 10000))
+
+    # --- Configuration for Password Hashing ---
+    # werkzeug method string; raising the cost rehashes each password at its next login
+    app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Per worker process: threads that hash passwords, and how many hashes may wait for one before
+    # logins are turned away. Across processes, at most WORKERS x processes hashes run at once.
+    app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get('PASSWORD_HASH_QUEUE', 64))
+
+    # --- Configuration for the Storefront Catalog ---
+    app.config['CATALOG_PAGE_SIZE'] = int(os.environ.get('CATALOG_PAGE_SIZE', 24))
+    # Anonymous storefront pages: how long rendered pages and product cards stay in the result
+    # cache, and the max-age browsers and proxies get (0 = revalidate with the ETag every time)
+    app.config['STOREFRONT_PAGE_TTL'] = int(os.environ.get('STOREFRONT_PAGE_TTL', 3600))
+    app.config['STOREFRONT_MAX_AGE'] = int(os.environ.get('STOREFRONT_MAX_AGE', 0))
+
+    # --- Configuration for Billing Terminals ---
+    # How often the billing screen polls for price and stock changes
+    app.config['POS_POLL_SECONDS'] = int(os.environ.get('POS_POLL_SECONDS', 15))
+    # Versions handed to terminals lag this far behind, covering writes that committed out of order
+    app.config['POS_SYNC_OVERLAP_SECONDS'] = float(os.environ.get('POS_SYNC_OVERLAP_SECONDS', 10))
+    # Beyond this many changed products a terminal is told to re-fetch the snapshot
+    app.config['POS_SYNC_MAX_CHANGES'] = int(os.environ.get('POS_SYNC_MAX_CHANGES', 1000))
+    app.config['POS_MAX_BATCH'] = int(os.environ.get('POS_MAX_BATCH', 100))
+
+    # --- Configuration for Admin Listings ---
+    app.config['ADMIN_PAGE_SIZE'] = int(os.environ.get('ADMIN_PAGE_SIZE', 50))
+    app.config['ADMIN_MAX_PAGE_SIZE'] = int(os.environ.get('ADMIN_MAX_PAGE_SIZE', 500))
+
+    # --- Configuration for Bulk Import/Export ---
+    app.config['BULK_CHUNK_SIZE'] = int(os.environ.get('BULK_CHUNK_SIZE', 1000))
+
+    # --- Configuration for the Store Calendar ---
+    # Sales are reported by the store's calendar day (bill.sale_date), e.g. Asia/Kolkata
+    app.config['STORE_TIMEZONE'] = os.environ.get('STORE_TIMEZONE', 'UTC')
+    # Zone of the naive timestamps the database's now() writes (UTC on SQLite; MySQL's session time zone)
+    app.config['DATABASE_TIMEZONE'] = os.environ.get('DATABASE_TIMEZONE', 'UTC')
+
+    # --- Configuration for Demand Forecasting ---
+    # Versioned model artifacts; see app/ml_models.py for the layout
+    app.config['FORECAST_MODEL_DIR'] = os.environ.get('FORECAST_MODEL_DIR', os.path.join(app.instance_path, 'forecast_models'))
+    app.config['FORECAST_WORKERS'] = int(os.environ.get('FORECAST_WORKERS', os.cpu_count() or 1))
+    app.config['FORECAST_HORIZON_DAYS'] = int(os.environ.get('FORECAST_HORIZON_DAYS', 30))
+    # The forecasting page queues a background retrain once the live model is older than this
+    app.config['FORECAST_MAX_AGE_HOURS'] = float(os.environ.get('FORECAST_MAX_AGE_HOURS', 24))
+
+    # --- Configuration for Reorder Points ---
+    # Sales velocity is averaged over this many days
+    app.config['REORDER_WINDOW_DAYS'] = int(os.environ.get('REORDER_WINDOW_DAYS', 28))
+    # Days between placing a purchase order and the stock arriving, plus a buffer on top
+    app.config['REORDER_LEAD_TIME_DAYS'] = float(os.environ.get('REORDER_LEAD_TIME_DAYS', 7))
+    app.config['REORDER_SAFETY_DAYS'] = float(os.environ.get('REORDER_SAFETY_DAYS', 3))
+
+    # --- Configuration for Background Jobs ---
+    app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 2))
+    app.config['JOB_TIMEOUT'] = int(os.environ.get('JOB_TIMEOUT', 3600))
+    app.config['JOB_RESULT_TTL'] = int(os.environ.get('JOB_RESULT_TTL', 86400))
+
+    # --- Configuration for the Outbox ---
+    # Worker threads per process for post-commit work such as sales rollups (0 = run `flask process-outbox` instead)
+    app.config['OUTBOX_WORKERS'] = int(os.environ.get('OUTBOX_WORKERS', 2))
+    # Idle workers look for due events this often; new events wake them immediately
+    app.config['OUTBOX_POLL_SECONDS'] = float(os.environ.get('OUTBOX_POLL_SECONDS', 5))
+    # Woken workers wait this long so a burst of events is handled in one transaction
+    app.config['OUTBOX_BATCH_DELAY_SECONDS'] = float(os.environ.get('OUTBOX_BATCH_DELAY_SECONDS', 0.2))
+    app.config['OUTBOX_BATCH_SIZE'] = int(os.environ.get('OUTBOX_BATCH_SIZE', 50))
+    # A claimed event that isn't finished within this long is handed to another worker
+    app.config['OUTBOX_LEASE_SECONDS'] = int(os.environ.get('OUTBOX_LEASE_SECONDS', 60))
+    # Failed handlers are retried after OUTBOX_RETRY_SECONDS, doubling each time, up to OUTBOX_MAX_ATTEMPTS tries
+    app.config['OUTBOX_RETRY_SECONDS'] = float(os.environ.get('OUTBOX_RETRY_SECONDS', 2))
+    app.config['OUTBOX_MAX_ATTEMPTS'] = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 8))
+    app.config['OUTBOX_RETENTION_DAYS'] = float(os.environ.get('OUTBOX_RETENTION_DAYS', 7))
+
+    # --- Configuration for Shopping Carts ---
+    # 'database' (cart tables), 'memory://' (per process), sqlite:////path/carts.db or redis://host:6379/1
+    app.config['CART_STORE_URL'] = os.environ.get('CART_STORE_URL', 'database')
+    # Carts nobody has changed for this long are dropped
+    app.config['CART_TTL_DAYS'] = float(os.environ.get('CART_TTL_DAYS', 30))
+    app.config['CART_MEMORY_MAX'] = int(os.environ.get('CART_MEMORY_MAX', 10000))
+
     # --- Configuration for File Uploads ---
     UPLOAD_FOLDER = os.path.join(app.root_path, 'static/uploads')
     app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+    # Resized copies rendered for every product image (formats Pillow can't write are skipped)
+    app.config['IMAGE_VARIANT_WIDTHS'] = [int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1280').split(',')]
+    app.config['IMAGE_VARIANT_FORMATS'] = os.environ.get('IMAGE_VARIANT_FORMATS', 'avif,webp').split(',')
+    app.config['IMAGE_QUALITY'] = int(os.environ.get('IMAGE_QUALITY', 75))
 
 
     # --- Initialize Extensions ---
     db.init_app(app)
+    from . import database, instrumentation
+    database.init_app(app)
+    instrumentation.init_app(app, db)
     migrate.init_app(app, db)
     login_manager.init_app(app)
+    cache.init_app(app)
+    from . import outbox
+    outbox.init_app(app)
+
+    from .cart import make_store
+    app.extensions['cart_store'] = make_store(app.config['CART_STORE_URL'], int(app.config['CART_TTL_DAYS'] * 86400),
+                                              app.config['CART_MEMORY_MAX'])
+
+    from . import images
+    app.after_request(images.cache_headers)
+    # Globals rather than context variables so imported macros (templates/_picture.html) see them
+    app.add_template_global(images.variants, 'image_variants')
+    app.add_template_global(images.srcset, 'image_srcset')
+    from .httpcache import product_card
+    app.add_template_global(product_card)
 
     # --- Make functions and classes available in all templates ---
     from .models import Customer, AdminUser
@@ -53,4 +202,8 @@ def create_app():
     from .admin.routes import admin as admin_blueprint
     app.register_blueprint(admin_blueprint, url_prefix='/admin')
 
+    # --- Register CLI Commands ---
+    from .commands import register_commands
+    register_commands(app)
+
     return app
\ No newline at end of file
@@ -1,68 +1,38 @@
 # FILE: app/admin/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, json, current_app
+from flask import Blueprint, render_template, request, redirect, url_for, flash, json, current_app, Response, stream_with_context, abort
 from flask_login import login_required, current_user
-from sqlalchemy import func, distinct
-from app import db
-from app.models import Product, Batch, Bill, BillItem, AdminUser, Customer
-from app import ml_models
-import os
-from werkzeug.utils import secure_filename
-from datetime import datetime, timedelta
+from app import db, cache
+from app.models import Product, Batch, Bill, BillItem, AdminUser, Customer, ReorderPoint
+from app import ml_models, inventory, rollups, pagination, bulk, jobs, reorder, identity, catalog, images, database, pos, invoicing, storetime
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+import gzip
+import io
+from datetime import datetime, timezone
 from decimal import Decimal
 
 admin = Blueprint('admin', __name__)
 
 def save_picture(form_picture):
-    """Saves a picture to the filesystem."""
-    filename = secure_filename(form_picture.filename)
-    picture_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    form_picture.save(picture_path)
-    return filename
+    """Stores an uploaded product picture under its content hash and queues its resized variants."""
+    return images.save_upload(form_picture)
 
 @admin.route('/dashboard')
 @login_required
+@database.read_only
 def dashboard():
-    today = datetime.now().date()
-    start_of_month = today.replace(day=1)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-
-    # --- Today's & Month's Profit ---
-    todays_bill_items = db.session.query(BillItem).join(Bill).filter(func.date(Bill.date) == today).all()
-    months_bill_items = db.session.query(BillItem).join(Bill).filter(Bill.date >= start_of_month).all()
-    todays_profit = sum((item.price_per_unit - item.cost_price_at_sale) * item.quantity for item in todays_bill_items)
-    months_profit = sum((item.price_per_unit - item.cost_price_at_sale) * item.quantity for item in months_bill_items)
-    
-    # --- Sales Chart ---
-    daily_sales = db.session.query(
-        func.date(Bill.date).label('sale_date'),
-        func.sum(Bill.final_amount).label('total_sales')
-    ).filter(Bill.date >= thirty_days_ago).group_by('sale_date').order_by('sale_date').all()
-    sales_chart_labels = [sale.sale_date.strftime('%b %d') for sale in daily_sales]
-    sales_chart_data = [round(float(sale.total_sales), 2) for sale in daily_sales]
-
-    # --- Top Products ---
-    top_products_by_revenue = db.session.query(BillItem.product_name, func.sum(BillItem.price_per_unit * BillItem.quantity).label('total_revenue')).group_by(BillItem.product_name).order_by(db.desc('total_revenue')).limit(5).all()
-    top_products_by_units = db.session.query(BillItem.product_name, func.sum(BillItem.quantity).label('total_units')).group_by(BillItem.product_name).order_by(db.desc('total_units')).limit(5).all()
-
-    # --- Customer Stats ---
-    all_customers = db.session.query(distinct(Bill.customer_email)).filter(Bill.customer_email.isnot(None)).count()
-    returning_customers = db.session.query(Bill.customer_email).filter(Bill.customer_email.isnot(None)).group_by(Bill.customer_email).having(func.count(Bill.id) > 1).count()
-    new_customers = all_customers - returning_customers
-
-    # --- Category Revenue ---
-    revenue_by_category = db.session.query(Product.category, func.sum(BillItem.price_per_unit * BillItem.quantity).label('total_revenue')).join(Product, BillItem.product_id == Product.id).group_by(Product.category).order_by(db.desc('total_revenue')).all()
-    category_chart_labels = [item.category for item in revenue_by_category]
-    category_chart_data = [round(float(item.total_revenue), 2) for item in revenue_by_category]
-
+    # All figures come from the daily rollup tables kept up to date by create_bill and checkout
+    summary = rollups.dashboard_summary(storetime.today())
     return render_template('admin/dashboard.html',
-                           todays_profit=todays_profit, months_profit=months_profit,
-                           sales_chart_labels=json.dumps(sales_chart_labels), sales_chart_data=json.dumps(sales_chart_data),
-                           top_products_by_revenue=top_products_by_revenue, top_products_by_units=top_products_by_units,
-                           new_customers=new_customers, returning_customers=returning_customers,
-                           category_chart_labels=json.dumps(category_chart_labels), category_chart_data=json.dumps(category_chart_data))
+                           todays_profit=summary['todays_profit'], months_profit=summary['months_profit'],
+                           sales_chart_labels=json.dumps(summary['sales_chart_labels']), sales_chart_data=json.dumps(summary['sales_chart_data']),
+                           top_products_by_revenue=summary['top_products_by_revenue'], top_products_by_units=summary['top_products_by_units'],
+                           new_customers=summary['new_customers'], returning_customers=summary['returning_customers'],
+                           category_chart_labels=json.dumps(summary['category_chart_labels']), category_chart_data=json.dumps(summary['category_chart_data']))
 
 @admin.route('/products', methods=['GET', 'POST'])
 @login_required
+@database.read_only
 def manage_products():
     if request.method == 'POST':
         name = request.form.get('name')
@@ -81,14 +51,17 @@ def manage_products():
             # CORRECTED: Use Decimal to maintain precision
             new_product = Product(name=name, cost_price=Decimal(cost_price), selling_price=Decimal(selling_price), description=description, category=category, image_file=image_filename)
             db.session.add(new_product)
+            db.session.flush()
+            catalog.index_products([new_product.id])
             db.session.commit()
+            cache.bump('catalog')
             flash('Product added successfully!', 'success')
         else:
             flash('Missing required fields.', 'danger')
         return redirect(url_for('admin.manage_products'))
     
-    products = Product.query.all()
-    return render_template('admin/products.html', products=products)
+    page = pagination.paginate(Product.query, [Product.name, Product.id], request.args.get('after'))
+    return render_template('admin/products.html', products=page.items, page=page)
 
 
 @admin.route('/product/edit/<int:id>', methods=['GET', 'POST'])
@@ -108,7 +81,9 @@ def edit_product(id):
             if file.filename != '':
                 product.image_file = save_picture(file)
 
+        catalog.index_products([product.id])
         db.session.commit()
+        cache.bump('catalog')
         flash('Product updated successfully!', 'success')
         return redirect(url_for('admin.manage_products'))
     
@@ -126,7 +101,10 @@ def delete_product(id):
     db.session.commit()
     
     db.session.delete(product_to_delete)
+    catalog.index_products([id])
+    pos.record_deletion(id)
     db.session.commit()
+    cache.bump('catalog', 'inventory')
     
     flash('Product deleted successfully! Sales records are preserved.', 'success')
     return redirect(url_for('admin.manage_products'))
@@ -134,115 +112,196 @@ def delete_product(id):
 @admin.route('/billing')
 @login_required
 def billing():
-    products_query = Product.query.order_by(Product.name).all()
-    # CORRECTED: Convert Decimal to float for JSON serialization
-    products_list = [{"id": p.id, "name": p.name, "price": float(p.selling_price), "stock": p.stock} for p in products_query]
-    return render_template('admin/billing.html', products_json=json.dumps(products_list))
+    # The product list comes from the terminal sync API below, so the page itself is static
+    return render_template('admin/billing.html', poll_seconds=current_app.config['POS_POLL_SECONDS'])
 
 @admin.route('/billing/create', methods=['POST'])
 @login_required
 def create_bill():
-    data = request.get_json()
+    data = request.get_json(silent=True)
     if not data:
         return {"error": "Invalid request"}, 400
-        
-    customer_name = data.get('customer_name')
-    items = data.get('items')
-    
-    # CORRECTED: Convert all incoming financial data to Decimal
-    tax_percentage = Decimal(data.get('tax_percentage', '0'))
-    discount_amount = Decimal(data.get('discount_amount', '0'))
-
-    if not items:
-        return {"error": "Cannot create an empty bill."}, 400
-
-    subtotal = Decimal('0.0') # Initialize as a Decimal
-    
-    # First pass: Check stock and calculate subtotal
-    for item in items:
-        product = Product.query.get(item['id'])
-        if not product or product.stock < int(item['quantity']):
-            return {"error": f"Not enough stock for {product.name if product else 'Unknown Product'}"}, 400
-        
-        subtotal += product.selling_price * int(item['quantity'])
-    
-    # CORRECTED: Perform all calculations using Decimal
-    tax_amount = subtotal * (tax_percentage / Decimal('100'))
-    final_amount = (subtotal + tax_amount) - discount_amount
-
-    new_bill = Bill(customer_name=customer_name, customer_email=data.get('customer_email'), 
-                    subtotal=float(subtotal), tax_percentage=float(tax_percentage), 
-                    discount_amount=float(discount_amount), final_amount=float(final_amount))
-    db.session.add(new_bill)
-    db.session.flush()
-
-    # Second pass: Create BillItems and deduct stock
-    for item in items:
-        product = Product.query.get(item['id'])
-        quantity_to_sell = int(item['quantity'])
-        
-        bill_item = BillItem(bill_id=new_bill.id, product_id=product.id, product_name=product.name,
-                             quantity=quantity_to_sell, price_per_unit=float(product.selling_price),
-                             cost_price_at_sale=float(product.cost_price))
-        db.session.add(bill_item)
-
-        # FIFO stock deduction
-        for batch in sorted(product.batches, key=lambda b: b.date_added):
-            if quantity_to_sell > 0:
-                sell_from_batch = min(quantity_to_sell, batch.quantity)
-                batch.quantity -= sell_from_batch
-                quantity_to_sell -= sell_from_batch
-    
-    db.session.commit()
-    return {"success": True, "bill_id": new_bill.id}
+    try:
+        bill_id, created = pos.create_bill(data)
+    except invoicing.InvoiceError as e:
+        return {"error": str(e)}, 400
+    return {"success": True, "bill_id": bill_id}
 
 @admin.route('/bill/<int:id>')
 @login_required
+@database.read_only
 def bill_detail(id):
     bill = Bill.query.get_or_404(id)
     return render_template('admin/bill_detail.html', bill=bill)
 
 @admin.route('/inventory', methods=['GET', 'POST'])
 @login_required
+@database.read_only
 def manage_inventory():
     if request.method == 'POST':
         product_id = request.form.get('product_id')
         quantity = request.form.get('quantity')
         if product_id and quantity and int(quantity) > 0:
-            new_batch = Batch(product_id=int(product_id), quantity=int(quantity))
-            db.session.add(new_batch)
+            inventory.add_batch(int(product_id), int(quantity))
+            reorder.refresh([int(product_id)])
             db.session.commit()
+            cache.bump('inventory', 'stock_status')
             flash('Inventory batch added!', 'success')
         else:
             flash('Invalid product or quantity.', 'danger')
         return redirect(url_for('admin.manage_inventory'))
         
-    batches = Batch.query.order_by(Batch.date_added.desc()).all()
-    products = Product.query.order_by(Product.name).all()
-    return render_template('admin/inventory.html', batches=batches, products=products)
+    page = pagination.paginate(_batch_listing_query(), [Batch.id], request.args.get('after'), descending=True)
+    # The product picker only needs ids and names, not full product rows
+    products = db.session.query(Product.id, Product.name).order_by(Product.name).all()
+    return render_template('admin/inventory.html', batches=page.items, page=page, products=products)
+
+def _batch_listing_query():
+    # Load each batch's product name in the same query instead of one lazy load per row
+    return Batch.query.options(joinedload(Batch.product).load_only(Product.name))
+
+@admin.route('/import', methods=['GET', 'POST'])
+@login_required
+def bulk_import():
+    report = None
+    if request.method == 'POST':
+        kind = request.form.get('kind')
+        file = request.files.get('file')
+        if kind not in ('products', 'batches') or not file or file.filename == '':
+            flash('Choose what to import and a CSV or JSON Lines file.', 'danger')
+            return redirect(url_for('admin.bulk_import'))
+        # Werkzeug spools large uploads to disk; rows are read from it chunk by chunk
+        stream = io.TextIOWrapper(file.stream, encoding='utf-8-sig')
+        importer = bulk.import_products if kind == 'products' else bulk.import_batches
+        report = importer(stream, bulk.format_for(file.filename), current_app.config['BULK_CHUNK_SIZE'])
+        if request.accept_mimetypes.best == 'application/json':
+            return report.as_dict(), 200 if report.ok else 422
+        flash(f'Imported {kind}: {report.inserted} inserted, {report.updated} updated, {len(report.errors)} rejected.',
+              'success' if report.ok else 'danger')
+    return render_template('admin/import.html', report=report,
+                           product_fields=bulk.PRODUCT_FIELDS, batch_fields=bulk.BATCH_FIELDS, exports=sorted(bulk.EXPORTS))
+
+@admin.route('/export/<kind>.<fmt>')
+@login_required
+@database.read_only
+def bulk_export(kind, fmt):
+    if kind not in bulk.EXPORTS or fmt not in ('csv', 'jsonl'):
+        abort(404)
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    rows = bulk.export_rows(kind, fmt, current_app.config['BULK_CHUNK_SIZE'])
+    return Response(stream_with_context(rows), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={kind}.{fmt}'})
+
+def _reorder_listing():
+    # Recalculate every product once a day so velocities slide with the window
+    refreshing = False
+    last = reorder.last_full_recompute()
+    if last is None or last.date() < datetime.now().date():
+        refreshing = jobs.is_active(jobs.submit('reorder-recompute', reorder.recompute_all))
+    query = reorder.at_risk_query().options(joinedload(ReorderPoint.product).load_only(Product.name))
+    page = pagination.paginate(query, [ReorderPoint.days_of_cover, ReorderPoint.product_id], request.args.get('after'))
+    return page, refreshing
+
+@admin.route('/reorder')
+@login_required
+@database.read_only
+def reorder_alerts():
+    page, refreshing = _reorder_listing()
+    window_days, lead_time_days, safety_days = reorder.settings()
+    return render_template('admin/reorder.html', points=page.items, page=page, refreshing=refreshing,
+                           window_days=window_days, lead_time_days=lead_time_days, safety_days=safety_days)
 
 @admin.route('/inventory/summary')
 @login_required
+@database.read_only
 def inventory_summary():
-    products_with_stock = Product.query.all()
-    return render_template('admin/inventory_summary.html', inventory=products_with_stock)
+    return render_template('admin/inventory_summary.html', inventory=inventory.stock_summary())
+
+def _forecast_settings():
+    config = current_app.config
+    return config['FORECAST_MODEL_DIR'], config['FORECAST_WORKERS'], config['FORECAST_HORIZON_DAYS']
+
+def train_forecast(full=False):
+    """Trains the demand models and returns the new version. Runs as a background job."""
+    model_dir, workers, horizon = _forecast_settings()
+    artifacts = ml_models.train_and_save_demand_model(database.read_engine(), model_dir, workers, full=full, horizon=horizon)
+    cache.bump('forecast')
+    return artifacts.version if artifacts is not None else None
+
+def _queue_training(artifacts):
+    # Retrain in the background when there is no model yet or the live one is too old
+    job = jobs.latest('train-forecast')
+    if jobs.is_active(job):
+        return job
+    if artifacts is not None:
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(artifacts.meta['trained_at'])
+        if age.total_seconds() < current_app.config['FORECAST_MAX_AGE_HOURS'] * 3600:
+            return job
+    elif job is not None and job['state'] == 'done' and job['result'] is None:
+        return job # Trained recently and there was not enough data; wait for the model to age out
+    return jobs.submit('train-forecast', train_forecast)
+
+@cache.memoize('forecast', depends_on=('catalog', 'forecast'))
+def cached_demand_forecast(version):
+    """Store total plus the products and categories with the highest predicted demand."""
+    model_dir, _, horizon = _forecast_settings()
+    artifacts = ml_models.get_artifacts(model_dir)
+    if artifacts is None or artifacts.version != version:
+        return None
+
+    predictions = artifacts.predict(horizon=horizon)
+    products = sorted(((int(key.split(':', 1)[1]), units) for key, units in predictions.items()
+                       if key.startswith('product:')), key=lambda item: -item[1])[:10]
+    names = dict(db.session.execute(
+        select(Product.id, Product.name).where(Product.id.in_([pid for pid, _ in products]))
+    ).all()) if products else {}
+    categories = sorted(((key.split(':', 1)[1], units) for key, units in predictions.items()
+                         if key.startswith('category:')), key=lambda item: -item[1])
+    return {
+        'total': predictions.get(ml_models.TOTAL, 0),
+        'products': [{'name': names.get(pid, f'#{pid} (deleted)'), 'units': units} for pid, units in products],
+        'categories': [{'name': name, 'units': units} for name, units in categories],
+        'version': artifacts.version,
+        'trained_at': artifacts.meta['trained_at'],
+        'watermark': artifacts.meta['watermark'],
+    }
 
 @admin.route('/forecasting')
 @login_required
+@database.read_only
 def forecasting():
-    predicted_demand = ml_models.predict_future_demand(db.engine)
-    return render_template('admin/forecasting.html', prediction=predicted_demand)
+    artifacts = ml_models.get_artifacts(current_app.config['FORECAST_MODEL_DIR'])
+    job = _queue_training(artifacts)
+    forecast = cached_demand_forecast(artifacts.version) if artifacts is not None else None
+    if forecast is not None:
+        prediction = forecast['total']
+    elif jobs.is_active(job):
+        prediction = 'Training in progress...'
+    else:
+        prediction = 'Not enough data to forecast.'
+    return render_template('admin/forecasting.html', prediction=prediction, forecast=forecast,
+                           job=job, training=jobs.is_active(job),
+                           horizon=current_app.config['FORECAST_HORIZON_DAYS'])
+
+@admin.route('/forecasting/status')
+@login_required
+def forecasting_status():
+    artifacts = ml_models.get_artifacts(current_app.config['FORECAST_MODEL_DIR'])
+    job = jobs.latest('train-forecast')
+    return {'version': artifacts.version if artifacts is not None else None,
+            'training': jobs.is_active(job), 'job': jobs.describe(job)}
 
 @admin.route('/train-model')
 @login_required
 def train_model_route():
-    ml_models.train_and_save_demand_model(db.engine)
-    flash('Demand forecasting model has been re-trained.', 'success')
+    jobs.submit('train-forecast', train_forecast)
+    flash('Demand forecasting model is being re-trained in the background.', 'success')
     return redirect(url_for('admin.forecasting'))
 
 # --- User Management Routes ---
 @admin.route('/users/admins', methods=['GET', 'POST'])
 @login_required
+@database.read_only
 def manage_admins():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -258,8 +317,8 @@ def manage_admins():
                 flash('Admin user created successfully.', 'success')
         return redirect(url_for('admin.manage_admins'))
 
-    admins = AdminUser.query.all()
-    return render_template('admin/manage_admins.html', admins=admins)
+    page = pagination.paginate(AdminUser.query, [AdminUser.id], request.args.get('after'))
+    return render_template('admin/manage_admins.html', admins=page.items, page=page)
 
 @admin.route('/users/admin/delete/<int:id>')
 @login_required
@@ -270,14 +329,16 @@ def delete_admin(id):
         admin_to_delete = AdminUser.query.get_or_404(id)
         db.session.delete(admin_to_delete)
         db.session.commit()
+        identity.forget('admin', id)
         flash('Admin user deleted successfully.', 'success')
     return redirect(url_for('admin.manage_admins'))
 
 @admin.route('/users/customers')
 @login_required
+@database.read_only
 def manage_customers():
-    customers = Customer.query.all()
-    return render_template('admin/manage_customers.html', customers=customers)
+    page = pagination.paginate(Customer.query, [Customer.id], request.args.get('after'))
+    return render_template('admin/manage_customers.html', customers=page.items, page=page)
 
 @admin.route('/users/customer/delete/<int:id>')
 @login_required
@@ -285,5 +346,128 @@ def delete_customer(id):
     customer_to_delete = Customer.query.get_or_404(id)
     db.session.delete(customer_to_delete)
     db.session.commit()
+    identity.forget('customer', id)
     flash('Customer account deleted successfully.', 'success')
-    return redirect(url_for('admin.manage_customers'))
\ No newline at end of file
+    return redirect(url_for('admin.manage_customers'))
+
+# --- JSON Listings (keyset pages for infinite scroll) ---
+# Each response carries next_cursor; pass it back as ?after= to get the next page.
+
+def _page_json(page, serialize):
+    return {"items": [serialize(item) for item in page.items], "next_cursor": page.next_cursor, "per_page": page.per_page}
+
+@admin.route('/api/products')
+@login_required
+@database.read_only
+def products_json():
+    page = pagination.paginate(Product.query, [Product.name, Product.id], request.args.get('after'))
+    return _page_json(page, lambda p: {"id": p.id, "name": p.name, "category": p.category,
+                                       "cost_price": str(p.cost_price), "selling_price": str(p.selling_price),
+                                       "stock": p.stock})
+
+@admin.route('/api/batches')
+@login_required
+@database.read_only
+def batches_json():
+    page = pagination.paginate(_batch_listing_query(), [Batch.id], request.args.get('after'), descending=True)
+    return _page_json(page, lambda b: {"id": b.id, "product_id": b.product_id, "product_name": b.product.name,
+                                       "quantity": b.quantity,
+                                       "date_added": b.date_added.isoformat() if b.date_added else None})
+
+@admin.route('/api/reorder')
+@login_required
+@database.read_only
+def reorder_json():
+    page, _ = _reorder_listing()
+    return _page_json(page, lambda r: {"product_id": r.product_id, "name": r.product.name,
+                                       "stock_on_hand": r.stock_on_hand, "velocity": round(r.velocity, 3),
+                                       "days_of_cover": round(r.days_of_cover, 2), "reorder_level": r.reorder_level,
+                                       "updated_at": r.updated_at.isoformat()})
+
+@admin.route('/api/customers')
+@login_required
+@database.read_only
+def customers_json():
+    page = pagination.paginate(Customer.query, [Customer.id], request.args.get('after'))
+    return _page_json(page, lambda c: {"id": c.id, "name": c.name, "email": c.email, "city": c.city})
+
+@admin.route('/api/admins')
+@login_required
+@database.read_only
+def admins_json():
+    page = pagination.paginate(AdminUser.query, [AdminUser.id], request.args.get('after'))
+    return _page_json(page, lambda a: {"id": a.id, "username": a.username})
+
+@admin.route('/api/bills')
+@login_required
+@database.read_only
+def bills_json():
+    page = pagination.paginate(Bill.query, [Bill.id], request.args.get('after'), descending=True)
+    return _page_json(page, lambda b: {"id": b.id, "customer_name": b.customer_name, "customer_email": b.customer_email,
+                                       "date": b.date.isoformat() if b.date else None,
+                                       "final_amount": str(b.final_amount)})
+
+
+# --- Billing Terminal Sync ---
+# A terminal fetches the snapshot once, then polls /changes with the version it
+# holds and sends bills (queued offline or not) to /bills. See app/pos.py.
+
+def _compressed_json(body, gzipped=False):
+    # Sent gzipped to clients that accept it (terminals on slow links); bodies are compact JSON
+    if 'gzip' in request.accept_encodings:
+        response = current_app.response_class(body if gzipped else gzip.compress(body), mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = current_app.response_class(gzip.decompress(body) if gzipped else body, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    return response
+
+@admin.route('/api/pos/snapshot')
+@login_required
+def pos_snapshot():
+    # Not routed to the replica: the snapshot's version must not be newer than its rows
+    etag, body = pos.snapshot()
+    if request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+    else:
+        response = _compressed_json(body, gzipped=True)
+    response.set_etag(etag)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+@admin.route('/api/pos/changes')
+@login_required
+def pos_changes():
+    # Not routed to the replica: versions are settled by the primary's clock, and a
+    # replica lagging further than POS_SYNC_OVERLAP_SECONDS would not have their rows yet
+    since = request.args.get('since', type=int)
+    if since is None:
+        return {"error": "since must be a version from the snapshot or an earlier response"}, 400
+    changed = pos.changes(since)
+    if changed is None:
+        return {"reset": True}
+    return _compressed_json(pos.encode(changed))
+
+@admin.route('/api/pos/bills', methods=['POST'])
+@login_required
+def pos_create_bills():
+    data = request.get_json(silent=True)
+    bills = data.get('bills') if isinstance(data, dict) else None
+    if not isinstance(bills, list) or not bills:
+        return {"error": "Expected a JSON object with a non-empty bills list"}, 400
+    if len(bills) > current_app.config['POS_MAX_BATCH']:
+        return {"error": f"At most {current_app.config['POS_MAX_BATCH']} bills per request"}, 400
+    results = []
+    for bill in bills:
+        # One transaction per bill, so a rejected bill doesn't hold back the rest
+        result = {"client_ref": bill.get('client_ref') if isinstance(bill, dict) else None}
+        try:
+            if not isinstance(bill, dict) or not bill.get('client_ref'):
+                raise invoicing.InvoiceError('Every bill needs a client_ref.')
+            bill_id, created = pos.create_bill(bill)
+            result.update(status="created" if created else "duplicate", bill_id=bill_id)
+        except invoicing.InvoiceError as e:
+            result.update(status="rejected", error=str(e))
+        results.append(result)
+    return {"results": results}
@@ -0,0 +1,287 @@
+# FILE: app/bulk.py
+import csv
+import io
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from sqlalchemy import case, insert, select, update
+from app import db, cache, reorder, catalog
+from app.models import Product, Batch, Bill, BillItem
+
+# Streaming bulk import/export of products, batches and bills.
+# Imports read CSV or JSON Lines one chunk at a time, validate the chunk, then
+# write it with executemany statements and commit, so memory use is bounded
+# by the chunk size rather than the file size. Exports stream rows off a
+# server-side cursor and never hold a whole table in memory.
+
+PRODUCT_FIELDS = ['id', 'name', 'description', 'category', 'cost_price', 'selling_price', 'image_file']
+BATCH_FIELDS = ['product_id', 'quantity', 'date_added']
+
+class ImportReport:
+    def __init__(self):
+        self.inserted = 0
+        self.updated = 0
+        self.errors = [] # (line number, message)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def as_dict(self):
+        return {'inserted': self.inserted, 'updated': self.updated,
+                'errors': [{'line': line, 'error': message} for line, message in self.errors]}
+
+class RowError(ValueError):
+    pass
+
+def format_for(filename, default='csv'):
+    """Guesses csv or jsonl from a file name."""
+    name = (filename or '').lower()
+    if name.endswith('.jsonl') or name.endswith('.ndjson') or name.endswith('.json'):
+        return 'jsonl'
+    if name.endswith('.csv'):
+        return 'csv'
+    return default
+
+def read_rows(stream, fmt):
+    """Yields (line_number, dict) from a text stream of CSV or JSON Lines."""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, row if isinstance(row, dict) else RowError('Expected a JSON object')
+    else:
+        raise ValueError(f'Unknown format: {fmt}')
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+# --- Validation ---
+
+def _text(row, field, max_length, required=False, default=None):
+    value = row.get(field)
+    value = str(value).strip() if value is not None else ''
+    if not value:
+        if required:
+            raise RowError(f'{field} is required')
+        return default
+    if len(value) > max_length:
+        raise RowError(f'{field} is longer than {max_length} characters')
+    return value
+
+def _money(row, field):
+    try:
+        value = Decimal(str(row.get(field, '')).strip())
+    except InvalidOperation:
+        raise RowError(f'{field} must be a number')
+    if not value.is_finite():
+        raise RowError(f'{field} must be a number')
+    if value < 0 or value >= Decimal('100000000'):
+        raise RowError(f'{field} is out of range')
+    return value.quantize(Decimal('0.01'))
+
+def _integer(row, field, required=True):
+    value = row.get(field)
+    if value is None or str(value).strip() == '':
+        if required:
+            raise RowError(f'{field} is required')
+        return None
+    try:
+        return int(str(value).strip())
+    except ValueError:
+        raise RowError(f'{field} must be a whole number')
+
+PRODUCT_DEFAULTS = {'description': None, 'category': 'Uncategorized', 'image_file': 'placeholder.jpg'}
+
+def _product_values(row):
+    # Only the columns present in the source are returned, so an update leaves
+    # the other columns of the product alone
+    parsers = {
+        'name': lambda: _text(row, 'name', 100, required=True),
+        'description': lambda: _text(row, 'description', 65535),
+        'category': lambda: _text(row, 'category', 100, default='Uncategorized'),
+        'cost_price': lambda: _money(row, 'cost_price'),
+        'selling_price': lambda: _money(row, 'selling_price'),
+        'image_file': lambda: _text(row, 'image_file', 100, default='placeholder.jpg'),
+    }
+    values = {field: parse() for field, parse in parsers.items() if field in row}
+    product_id = _integer(row, 'id', required=False)
+    if product_id is not None:
+        values['id'] = product_id
+    return values
+
+def _batch_values(row):
+    values = {'product_id': _integer(row, 'product_id'), 'quantity': _integer(row, 'quantity')}
+    if values['quantity'] <= 0:
+        raise RowError('quantity must be positive')
+    date_added = _text(row, 'date_added', 40)
+    if date_added:
+        try:
+            values['date_added'] = datetime.fromisoformat(date_added)
+        except ValueError:
+            raise RowError('date_added must be an ISO 8601 date/time')
+    return values
+
+def _validate(chunk, to_values, report):
+    # Returns [(line_number, values)] for the good rows and records the rest
+    valid = []
+    for line_number, row in chunk:
+        try:
+            if isinstance(row, Exception):
+                raise RowError(str(row))
+            valid.append((line_number, to_values(row)))
+        except RowError as e:
+            report.errors.append((line_number, str(e)))
+    return valid
+
+# --- Imports ---
+
+def _insert_products(rows):
+    # Inserts the rows and returns their ids, where the search tokens need them
+    if catalog.fulltext():
+        db.session.execute(insert(Product), rows)
+        return []
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        return db.session.scalars(insert(Product).returning(Product.id), rows).all()
+    # No RETURNING with executemany: one statement per row for its generated id
+    return [db.session.execute(insert(Product).values(**row)).inserted_primary_key[0] for row in rows]
+
+def import_products(stream, fmt='csv', chunk_size=1000):
+    """Upserts products: rows with an existing id are updated, rows without an id are inserted."""
+    report = ImportReport()
+    for chunk in _chunks(read_rows(stream, fmt), chunk_size):
+        rows = _validate(chunk, _product_values, report)
+        ids = [values['id'] for _, values in rows if 'id' in values]
+        known = set(db.session.scalars(select(Product.id).where(Product.id.in_(ids)))) if ids else set()
+        updates, inserts = [], []
+        new_ids = set()
+        for line_number, values in rows:
+            if values.get('id') in known:
+                updates.append(values)
+                continue
+            missing = [field for field in ('name', 'cost_price', 'selling_price') if field not in values]
+            if missing:
+                report.errors.append((line_number, f"new products need {', '.join(missing)}"))
+                continue
+            if 'id' in values:
+                # Would fail the whole chunk's INSERT
+                if values['id'] in new_ids:
+                    report.errors.append((line_number, f"id {values['id']} appears twice"))
+                    continue
+                new_ids.add(values['id'])
+            inserts.append({**PRODUCT_DEFAULTS, **values})
+        indexed = [values['id'] for values in updates]
+        if updates:
+            db.session.execute(update(Product), updates)
+        if inserts:
+            indexed += _insert_products(inserts)
+        catalog.index_products(indexed)
+        db.session.commit()
+        report.inserted += len(inserts)
+        report.updated += len(updates)
+    if report.inserted or report.updated:
+        cache.bump('catalog')
+    return report
+
+def import_batches(stream, fmt='csv', chunk_size=1000):
+    """Inserts batches and raises each product's stock counter once per chunk."""
+    report = ImportReport()
+    for chunk in _chunks(read_rows(stream, fmt), chunk_size):
+        rows = _validate(chunk, _batch_values, report)
+        product_ids = {values['product_id'] for _, values in rows}
+        known = set(db.session.scalars(select(Product.id).where(Product.id.in_(product_ids)))) if product_ids else set()
+        batches = []
+        added = {}
+        for line_number, values in rows:
+            if values['product_id'] not in known:
+                report.errors.append((line_number, f"unknown product_id {values['product_id']}"))
+                continue
+            batches.append(values)
+            added[values['product_id']] = added.get(values['product_id'], 0) + values['quantity']
+        if batches:
+            # Rows with and without an explicit date_added are inserted separately
+            # so the server default applies to the latter.
+            dated = [row for row in batches if 'date_added' in row]
+            undated = [row for row in batches if 'date_added' not in row]
+            if dated:
+                db.session.execute(insert(Batch), dated)
+            if undated:
+                db.session.execute(insert(Batch), undated)
+            db.session.execute(
+                update(Product)
+                .where(Product.id.in_(added))
+                .values(stock_on_hand=Product.stock_on_hand + case(added, value=Product.id))
+                .execution_options(synchronize_session=False)
+            )
+            reorder.refresh(added)
+        db.session.commit()
+        report.inserted += len(batches)
+    if report.inserted:
+        cache.bump('inventory', 'stock_status')
+    return report
+
+# --- Exports ---
+
+EXPORTS = {
+    'products': ['id', 'name', 'description', 'category', 'cost_price', 'selling_price', 'image_file', 'stock'],
+    'stock': ['product_id', 'name', 'stock_on_hand'],
+    'bills': ['bill_id', 'date', 'customer_name', 'customer_email', 'subtotal', 'tax_percentage', 'discount_amount',
+              'final_amount', 'product_id', 'product_name', 'quantity', 'price_per_unit', 'cost_price_at_sale'],
+}
+
+def _export_query(kind):
+    if kind == 'products':
+        return select(Product.id, Product.name, Product.description, Product.category, Product.cost_price,
+                      Product.selling_price, Product.image_file, Product.stock_on_hand).order_by(Product.id)
+    if kind == 'stock':
+        return select(Product.id, Product.name, Product.stock_on_hand).order_by(Product.id)
+    if kind == 'bills':
+        # One row per bill line, bill columns repeated
+        return select(Bill.id, Bill.date, Bill.customer_name, Bill.customer_email, Bill.subtotal, Bill.tax_percentage,
+                      Bill.discount_amount, Bill.final_amount, BillItem.product_id, BillItem.product_name,
+                      BillItem.quantity, BillItem.price_per_unit, BillItem.cost_price_at_sale) \
+            .join(BillItem, BillItem.bill_id == Bill.id).order_by(Bill.id, BillItem.id)
+    raise ValueError(f'Unknown export: {kind}')
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+def export_rows(kind, fmt='csv', chunk_size=1000):
+    """Yields the export as text chunks (CSV with a header row, or JSON Lines)."""
+    fields = EXPORTS[kind]
+    result = db.session.execute(_export_query(kind).execution_options(stream_results=True, yield_per=chunk_size))
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == 'csv':
+        writer.writerow(fields)
+    for partition in result.partitions():
+        for row in partition:
+            values = [_plain(value) for value in row]
+            if fmt == 'csv':
+                writer.writerow(values)
+            else:
+                buffer.write(json.dumps(dict(zip(fields, values))) + '\n')
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
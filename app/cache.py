@@ -0,0 +1,345 @@
+# FILE: app/cache.py
+import functools
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import g, has_app_context, has_request_context
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+# Two-tier result cache: a per-process LRU in front of an optional backend
+# shared by all workers. Cached results are keyed by the version numbers of
+# the data they depend on ("sales", "inventory", "catalog", ...). A write bumps
+# the version, so every later lookup builds a new key and recomputes; stale
+# entries are never read again and simply age out.
+#
+# That only holds if every worker process sees every bump, so the versions
+# live in the shared backend when there is one and in the database (the
+# cache_version table) otherwise, never in a single process. A write bumps
+# after it commits, or has bump_on_commit() do it for the transaction.
+
+class LRUCache:
+    """Thread-safe in-process LRU with per-entry TTL."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # Counters live outside the LRU: evicting a version would reset it and
+    # could make an old entry look current again.
+    def get_counter(self, key):
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+class SQLiteBackend:
+    """Shared cache in a local SQLite file.
+
+    Every worker process on the host sees the same entries and versions. It
+    stands in for Redis in development and tests.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_counter (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache_entry WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)',
+            (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        self._connect().execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                                (key, pickle.dumps(value), expires_at))
+
+    def delete(self, key):
+        self._connect().execute('DELETE FROM cache_entry WHERE key = ?', (key,))
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache_entry')
+
+    def get_counter(self, key):
+        row = self._connect().execute('SELECT value FROM cache_counter WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else 0
+
+    def incr(self, key):
+        conn = self._connect()
+        conn.execute('INSERT INTO cache_counter (key, value) VALUES (?, 1) '
+                     'ON CONFLICT(key) DO UPDATE SET value = value + 1', (key,))
+        return self.get_counter(key)
+
+class RedisBackend:
+    """Shared cache in Redis. Needs the optional `redis` package."""
+
+    def __init__(self, url):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._redis.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._redis.set(key, pickle.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        self._redis.delete(key)
+
+    def clear(self):
+        self._redis.flushdb()
+
+    def get_counter(self, key):
+        return int(self._redis.get(f'counter:{key}') or 0)
+
+    def incr(self, key):
+        return self._redis.incr(f'counter:{key}')
+
+class BackendVersions:
+    """Version counters in a cache backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def version(self, namespace):
+        return self.backend.get_counter(f'version:{namespace}')
+
+    def bump(self, namespace, now):
+        self.backend.incr(f'version:{namespace}')
+        self.backend.set(f'changed-at:{namespace}', now)
+
+    def changed_at(self, namespace):
+        value = self.backend.get(f'changed-at:{namespace}')
+        if value is None:
+            value = time.time()
+            self.backend.set(f'changed-at:{namespace}', value)
+        return value
+
+class DatabaseVersions:
+    """Version counters in the cache_version table, for deployments without a shared backend.
+
+    A request reads every counter with one SELECT at its first lookup and
+    reuses them until it bumps one. The SELECT runs on the session's own
+    connection, so a request never holds two from the pool; bumps, which
+    follow a commit, use a short transaction of their own. Both go to the
+    primary: a lagging replica would hand out old versions.
+    """
+
+    def _table(self):
+        from app.models import CacheVersion
+        return CacheVersion.__table__
+
+    def _engine(self):
+        from app import db
+        return db.engine
+
+    def _read(self):
+        from app import db
+        rows = db.session.execute(select(self._table()), bind_arguments={'bind': self._engine()})
+        return {row.namespace: row for row in rows}
+
+    def _rows(self):
+        if not has_request_context():
+            return self._read()
+        if '_cache_versions' not in g:
+            g._cache_versions = self._read()
+        return g._cache_versions
+
+    def _write(self, namespace, now, increment):
+        table = self._table()
+        values = {'version': table.c.version + 1} if increment else {}
+        for _ in range(2):
+            try:
+                with self._engine().begin() as conn:
+                    if conn.execute(update(table).where(table.c.namespace == namespace)
+                                    .values(changed_at=now, **values)).rowcount:
+                        break
+                    conn.execute(insert(table).values(namespace=namespace, version=int(increment), changed_at=now))
+                    break
+            except IntegrityError:
+                continue # Another process added the row first; update it instead
+        if has_app_context():
+            g.pop('_cache_versions', None)
+
+    def version(self, namespace):
+        row = self._rows().get(namespace)
+        return row.version if row else 0
+
+    def bump(self, namespace, now):
+        self._write(namespace, now, increment=True)
+
+    def changed_at(self, namespace):
+        row = self._rows().get(namespace)
+        if row is None:
+            self._write(namespace, time.time(), increment=False)
+            row = self._rows()[namespace]
+        return row.changed_at
+
+def make_backend(url):
+    """Builds the shared backend named by CACHE_SHARED_URL, or None to stay process-local."""
+    if not url:
+        return None
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisBackend(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported CACHE_SHARED_URL: {url}')
+
+class Cache:
+    """Flask extension wiring the two tiers together."""
+
+    def __init__(self, app=None):
+        self.local = LRUCache()
+        self.shared = None
+        self.versions = BackendVersions(self.local)
+        self.default_ttl = 300
+        self._listening = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.local = LRUCache(app.config.get('CACHE_MAX_ENTRIES', 1024))
+        self.shared = make_backend(app.config.get('CACHE_SHARED_URL'))
+        self.default_ttl = app.config.get('CACHE_DEFAULT_TTL', 300)
+        # Versions must agree across workers, so they never live in the local tier
+        self.versions = BackendVersions(self.shared) if self.shared is not None else DatabaseVersions()
+        app.extensions['cache'] = self
+        if not self._listening:
+            from app import db
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_rollback', self._after_rollback)
+            event.listen(db.session, 'after_transaction_end', self._after_transaction_end)
+            self._listening = True
+
+    def version(self, namespace):
+        return self.versions.version(namespace)
+
+    def bump(self, *namespaces):
+        """Invalidates every cached result that depends on any of the namespaces."""
+        now = time.time()
+        for namespace in namespaces:
+            self.versions.bump(namespace, now)
+
+    def bump_on_commit(self, *namespaces):
+        """Bumps the namespaces once the current database transaction commits; nothing if it rolls back.
+
+        The bumps are made after the session has given its connection back,
+        so they never hold the committing transaction's locks or a second
+        connection from the pool.
+        """
+        from app import db
+        db.session.info.setdefault('cache_bumps', set()).update(namespaces)
+
+    def _after_commit(self, session):
+        if 'cache_bumps' in session.info:
+            session.info['cache_bumps_committed'] = session.info.pop('cache_bumps')
+
+    def _after_rollback(self, session):
+        session.info.pop('cache_bumps', None)
+
+    def _after_transaction_end(self, session, transaction):
+        if transaction.parent is None and 'cache_bumps_committed' in session.info:
+            self.bump(*sorted(session.info.pop('cache_bumps_committed')))
+
+    def changed_at(self, namespace):
+        """Unix time of the namespace's last bump (or of the first time anyone asked, if it was never bumped)."""
+        return self.versions.changed_at(namespace)
+
+    # Small records that every worker must see the latest copy of (e.g. the
+    # status of a background job) skip the local tier when there is a shared one
+    def get_state(self, key):
+        return (self.shared or self.local).get(key)
+
+    def set_state(self, key, value, ttl=None):
+        (self.shared or self.local).set(key, value, ttl or self.default_ttl)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is None and self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self.local.set(key, value, self.default_ttl)
+        return value
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl or self.default_ttl
+        self.local.set(key, value, ttl)
+        if self.shared is not None:
+            self.shared.set(key, value, ttl)
+
+    def make_key(self, name, depends_on, ttl, args):
+        versions = ','.join(f'{ns}={self.version(ns)}' for ns in depends_on)
+        # Time bucket so every worker rolls over to fresh results at the same moment
+        bucket = int(time.time() // ttl)
+        return f'{name}:{versions}:{bucket}:{args!r}'
+
+    def memoize(self, name, depends_on=(), ttl=None):
+        """Caches a function's result until its TTL bucket ends or a dependency is bumped.
+
+        Arguments must have a stable repr and the result must be picklable.
+        None results are not cached.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args):
+                entry_ttl = ttl or self.default_ttl
+                key = self.make_key(name, depends_on, entry_ttl, args)
+                value = self.get(key)
+                if value is None:
+                    from app import database
+                    with database.primary(): # never cache replica reads under the primary's versions
+                        value = fn(*args)
+                    if value is not None:
+                        self.set(key, value, entry_ttl)
+                return value
+            wrapper.uncached = fn
+            return wrapper
+        return decorator
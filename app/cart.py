@@ -0,0 +1,328 @@
+# FILE: app/cart.py
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from decimal import Decimal
+from flask import current_app, session
+from flask_login import current_user
+from sqlalchemy import delete, select
+from sqlalchemy.orm import load_only
+from app import db
+from app.models import Product, Cart, CartLine
+from app.rollups import upsert
+
+# Shopping carts live in a server-side store; the session cookie only holds
+# the id of an anonymous cart. A signed-in customer's cart is keyed by their
+# customer id, so it follows them across devices, and the anonymous cart is
+# merged into it on login. A cart is a {product_id: quantity} mapping and
+# every change writes a single line.
+#
+# Resolving a cart loads every product on it with a single IN (...) query;
+# stock comes from the stock_on_hand counter on the same row, so nothing is
+# lazy-loaded afterwards.
+
+# --- Pricing ---
+
+# Columns the cart, checkout and billing code read from a product
+CART_COLUMNS = (Product.id, Product.name, Product.category, Product.selling_price, Product.cost_price,
+                Product.image_file, Product.stock_on_hand)
+
+def load_products(product_ids):
+    """Returns {id: Product} for the given ids in one query; unknown ids are left out."""
+    ids = {int(pid) for pid in product_ids}
+    if not ids:
+        return {}
+    products = db.session.scalars(select(Product).options(load_only(*CART_COLUMNS)).where(Product.id.in_(ids)))
+    return {product.id: product for product in products}
+
+def price_cart(cart, products):
+    """Prices a cart against already loaded products. Does no I/O.
+
+    Returns (items, total) where items is a list of
+    {'product', 'quantity', 'total'} in cart order. Lines whose product no
+    longer exists are dropped.
+    """
+    items = []
+    total = Decimal('0')
+    for product_id, quantity in cart.items():
+        product = products.get(int(product_id))
+        if product is None:
+            continue
+        line_total = Decimal(product.selling_price) * quantity
+        items.append({'product': product, 'quantity': quantity, 'total': line_total})
+        total += line_total
+    return items, total
+
+def resolve(cart):
+    """Loads and prices a cart: (items, total)."""
+    return price_cart(cart, load_products(cart.keys()))
+
+# --- Stores ---
+
+class CartStore:
+    """Interface of the cart backends. Quantities of 0 or less remove the line.
+
+    The database store writes in the caller's transaction and leaves the
+    commit to it; the others apply every write at once.
+    """
+
+    def get(self, cart_id):
+        raise NotImplementedError
+
+    def get_line(self, cart_id, product_id):
+        return self.get(cart_id).get(product_id, 0)
+
+    def set_line(self, cart_id, product_id, quantity):
+        raise NotImplementedError
+
+    def clear(self, cart_id):
+        raise NotImplementedError
+
+    def purge_expired(self):
+        """Drops abandoned carts; returns how many were removed where the backend can tell."""
+        return 0
+
+    def merge(self, source_id, target_id):
+        """Adds the lines of one cart to another and deletes the source."""
+        for product_id, quantity in self.get(source_id).items():
+            self.set_line(target_id, product_id, self.get_line(target_id, product_id) + quantity)
+        self.clear(source_id)
+
+class MemoryCartStore(CartStore):
+    """Process-local carts; for development and single-process deployments."""
+
+    def __init__(self, ttl, max_carts=10000):
+        self.ttl = ttl
+        self.max_carts = max_carts
+        self._carts = OrderedDict() # cart id -> (lines, last change)
+        self._lock = threading.Lock()
+
+    def _lines(self, cart_id, create=False):
+        entry = self._carts.get(cart_id)
+        if entry is not None and entry[1] < time.monotonic() - self.ttl:
+            del self._carts[cart_id]
+            entry = None
+        if entry is None:
+            if not create:
+                return None
+            entry = self._carts[cart_id] = ({}, time.monotonic())
+        return entry[0]
+
+    def get(self, cart_id):
+        with self._lock:
+            return dict(self._lines(cart_id) or {})
+
+    def get_line(self, cart_id, product_id):
+        with self._lock:
+            return (self._lines(cart_id) or {}).get(product_id, 0)
+
+    def set_line(self, cart_id, product_id, quantity):
+        with self._lock:
+            lines = self._lines(cart_id, create=True)
+            if quantity > 0:
+                lines[product_id] = quantity
+            else:
+                lines.pop(product_id, None)
+            self._carts[cart_id] = (lines, time.monotonic())
+            self._carts.move_to_end(cart_id)
+            # Evict the carts changed least recently
+            while len(self._carts) > self.max_carts:
+                self._carts.popitem(last=False)
+
+    def clear(self, cart_id):
+        with self._lock:
+            self._carts.pop(cart_id, None)
+
+    def purge_expired(self):
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [cart_id for cart_id, (_, changed) in self._carts.items() if changed < cutoff]
+            for cart_id in expired:
+                del self._carts[cart_id]
+        return len(expired)
+
+class DatabaseCartStore(CartStore):
+    """Carts in the application database (cart and cart_line tables)."""
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def get(self, cart_id):
+        rows = db.session.execute(
+            select(CartLine.product_id, CartLine.quantity).join(Cart, Cart.id == CartLine.cart_id)
+            .where(CartLine.cart_id == cart_id, Cart.updated_at >= datetime.now() - timedelta(seconds=self.ttl))
+        ).all()
+        return dict(rows)
+
+    def get_line(self, cart_id, product_id):
+        return db.session.scalar(
+            select(CartLine.quantity).join(Cart, Cart.id == CartLine.cart_id)
+            .where(CartLine.cart_id == cart_id, CartLine.product_id == product_id,
+                   Cart.updated_at >= datetime.now() - timedelta(seconds=self.ttl))
+        ) or 0
+
+    def set_line(self, cart_id, product_id, quantity):
+        now = datetime.now()
+        # An expired cart that wasn't purged yet starts over empty, as get() already shows it
+        expired = select(Cart.id).where(Cart.id == cart_id, Cart.updated_at < now - timedelta(seconds=self.ttl))
+        db.session.execute(delete(CartLine).where(CartLine.cart_id.in_(expired)))
+        upsert(Cart, [{'id': cart_id, 'updated_at': now}], ['id'], replace_columns=['updated_at'])
+        if quantity > 0:
+            upsert(CartLine, [{'cart_id': cart_id, 'product_id': product_id, 'quantity': quantity}],
+                   ['cart_id', 'product_id'], replace_columns=['quantity'])
+        else:
+            db.session.execute(delete(CartLine).where(CartLine.cart_id == cart_id, CartLine.product_id == product_id))
+
+    def clear(self, cart_id):
+        db.session.execute(delete(CartLine).where(CartLine.cart_id == cart_id))
+        db.session.execute(delete(Cart).where(Cart.id == cart_id))
+
+    def purge_expired(self):
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        db.session.execute(delete(CartLine).where(CartLine.cart_id.in_(select(Cart.id).where(Cart.updated_at < cutoff))))
+        return db.session.execute(delete(Cart).where(Cart.updated_at < cutoff)).rowcount
+
+class SQLiteCartStore(CartStore):
+    """Carts in a local SQLite file shared by the worker processes on one host."""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('CREATE TABLE IF NOT EXISTS cart_line (cart_id TEXT, product_id INTEGER, quantity INTEGER NOT NULL, '
+                     'PRIMARY KEY (cart_id, product_id))')
+        conn.execute('CREATE TABLE IF NOT EXISTS cart_touch (cart_id TEXT PRIMARY KEY, updated_at REAL NOT NULL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cart_touch_updated_at ON cart_touch (updated_at)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, cart_id):
+        rows = self._connect().execute(
+            'SELECT l.product_id, l.quantity FROM cart_line l JOIN cart_touch t ON t.cart_id = l.cart_id '
+            'WHERE l.cart_id = ? AND t.updated_at >= ?', (cart_id, time.time() - self.ttl)).fetchall()
+        return dict(rows)
+
+    def get_line(self, cart_id, product_id):
+        row = self._connect().execute(
+            'SELECT l.quantity FROM cart_line l JOIN cart_touch t ON t.cart_id = l.cart_id '
+            'WHERE l.cart_id = ? AND l.product_id = ? AND t.updated_at >= ?',
+            (cart_id, product_id, time.time() - self.ttl)).fetchone()
+        return row[0] if row else 0
+
+    def set_line(self, cart_id, product_id, quantity):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN')
+            now = time.time()
+            # An expired cart that wasn't purged yet starts over empty, as get() already shows it
+            conn.execute('DELETE FROM cart_line WHERE cart_id IN '
+                         '(SELECT cart_id FROM cart_touch WHERE cart_id = ? AND updated_at < ?)', (cart_id, now - self.ttl))
+            conn.execute('INSERT OR REPLACE INTO cart_touch (cart_id, updated_at) VALUES (?, ?)', (cart_id, now))
+            if quantity > 0:
+                conn.execute('INSERT OR REPLACE INTO cart_line (cart_id, product_id, quantity) VALUES (?, ?, ?)',
+                             (cart_id, product_id, quantity))
+            else:
+                conn.execute('DELETE FROM cart_line WHERE cart_id = ? AND product_id = ?', (cart_id, product_id))
+
+    def clear(self, cart_id):
+        conn = self._connect()
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute('DELETE FROM cart_line WHERE cart_id = ?', (cart_id,))
+            conn.execute('DELETE FROM cart_touch WHERE cart_id = ?', (cart_id,))
+
+    def purge_expired(self):
+        conn = self._connect()
+        cutoff = time.time() - self.ttl
+        with conn:
+            conn.execute('BEGIN')
+            conn.execute('DELETE FROM cart_line WHERE cart_id IN (SELECT cart_id FROM cart_touch WHERE updated_at < ?)',
+                         (cutoff,))
+            return conn.execute('DELETE FROM cart_touch WHERE updated_at < ?', (cutoff,)).rowcount
+
+class RedisCartStore(CartStore):
+    """Carts as Redis hashes that expire on their own. Needs the optional `redis` package."""
+
+    def __init__(self, url, ttl):
+        import redis
+        self._redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, cart_id):
+        return {int(pid): int(qty) for pid, qty in self._redis.hgetall(f'cart:{cart_id}').items()}
+
+    def get_line(self, cart_id, product_id):
+        return int(self._redis.hget(f'cart:{cart_id}', product_id) or 0)
+
+    def set_line(self, cart_id, product_id, quantity):
+        key = f'cart:{cart_id}'
+        pipe = self._redis.pipeline()
+        if quantity > 0:
+            pipe.hset(key, product_id, quantity)
+        else:
+            pipe.hdel(key, product_id)
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+
+    def clear(self, cart_id):
+        self._redis.delete(f'cart:{cart_id}')
+
+def make_store(url, ttl, max_carts=10000):
+    """Builds the cart store named by CART_STORE_URL."""
+    if url == 'database':
+        return DatabaseCartStore(ttl)
+    if url == 'memory://':
+        return MemoryCartStore(ttl, max_carts)
+    if url.startswith('sqlite:///'):
+        return SQLiteCartStore(url[len('sqlite:///'):], ttl)
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisCartStore(url, ttl)
+    raise ValueError(f'Unsupported CART_STORE_URL: {url}')
+
+# --- The current visitor's cart ---
+
+def store():
+    return current_app.extensions['cart_store']
+
+def customer_cart_id(customer_id):
+    return f'customer:{customer_id}'
+
+def current_cart_id(create=False):
+    """Id of the cart for this request, or None if an anonymous visitor has none yet."""
+    # Carts from before the server-side store were kept in the cookie itself
+    legacy = session.pop('cart', None)
+    create = create or bool(legacy)
+    if current_user.is_authenticated and session.get('user_type') == 'customer':
+        cart_id = customer_cart_id(current_user.id)
+    else:
+        cart_id = session.get('cart_id')
+        if cart_id is None and create:
+            cart_id = session['cart_id'] = secrets.token_urlsafe(16)
+    if legacy:
+        for product_id, quantity in legacy.items():
+            store().set_line(cart_id, int(product_id), store().get_line(cart_id, int(product_id)) + quantity)
+        # Views ask for the cart before they change anything, so only the moved lines are committed
+        db.session.commit()
+    return cart_id
+
+def current_cart():
+    """{product_id: quantity} of this request's cart."""
+    cart_id = current_cart_id()
+    return store().get(cart_id) if cart_id else {}
+
+def merge_on_login(customer_id):
+    """Moves the anonymous cart of this session into the customer's cart and commits. Call right after login_user."""
+    anonymous_id = session.pop('cart_id', None)
+    if anonymous_id:
+        store().merge(anonymous_id, customer_cart_id(customer_id))
+        db.session.commit()
@@ -0,0 +1,137 @@
+# FILE: app/catalog.py
+import re
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import delete, insert, select, and_
+from sqlalchemy.orm import load_only
+from app import db, cache, pagination
+from app.models import Product, ProductSearchToken
+
+# Storefront catalog queries. Every listing is a keyset page in (name, id)
+# order, so a page costs the same however large the catalog is:
+#   all products       -> ix_product_name
+#   one category       -> ix_product_category_name
+#   text search        -> FULLTEXT ix_product_fulltext on MySQL, otherwise the
+#                         product_search_token inverted index (word prefixes)
+# Price and in-stock filters are applied on top of those.
+#
+# Both text searches match every word of two or more characters as a prefix,
+# which on MySQL only holds with these server settings (my.cnf, then rebuild
+# the index with OPTIMIZE TABLE product or by dropping and re-adding it):
+#   innodb_ft_min_token_size = 2   (the default of 3 drops two-letter words)
+#   innodb_ft_enable_stopword = OFF (the default list drops words like "the")
+# Otherwise the same query finds fewer products on MySQL than elsewhere.
+
+# Columns a product card needs
+CARD_COLUMNS = (Product.id, Product.name, Product.category, Product.selling_price, Product.image_file,
+                Product.stock_on_hand)
+
+TOKEN_LENGTH = 50
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+def tokenize(*texts):
+    """Distinct lower-case words of at least two characters."""
+    words = set()
+    for text in texts:
+        for word in _WORD.findall((text or '').lower()):
+            if len(word) >= 2:
+                words.add(word[:TOKEN_LENGTH])
+    return words
+
+def fulltext():
+    """True where text search uses the FULLTEXT index rather than product_search_token."""
+    return db.session.get_bind().dialect.name == 'mysql'
+
+def index_products(product_ids):
+    """Rebuilds the search tokens of the given products (deleted ones just lose theirs).
+
+    Call in the same transaction as the product change. A no-op on MySQL,
+    which searches its FULLTEXT index instead.
+    """
+    product_ids = list(product_ids)
+    if not product_ids or fulltext():
+        return
+    db.session.execute(delete(ProductSearchToken).where(ProductSearchToken.product_id.in_(product_ids)))
+    rows = db.session.execute(
+        select(Product.id, Product.name, Product.description).where(Product.id.in_(product_ids))
+    ).all()
+    tokens = [{'token': token, 'product_id': row.id} for row in rows for token in tokenize(row.name, row.description)]
+    if tokens:
+        db.session.execute(insert(ProductSearchToken), tokens)
+
+def reindex_all(chunk_size=1000):
+    """Rebuilds the whole search token table. Returns the number of products indexed."""
+    if fulltext():
+        return 0
+    db.session.execute(delete(ProductSearchToken))
+    ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+    for i in range(0, len(ids), chunk_size):
+        index_products(ids[i:i + chunk_size])
+    db.session.commit()
+    return len(ids)
+
+def _text_filter(terms):
+    if fulltext():
+        from sqlalchemy.dialects.mysql import match
+        # Every word required, each as a prefix
+        against = ' '.join(f'+{term}*' for term in terms)
+        return match(Product.name, Product.description, against=against).in_boolean_mode()
+    # One range scan of the token primary key per word. The prefix match is
+    # spelled as word <= token < next word rather than LIKE 'word%', which
+    # SQLite can't serve from a case-sensitive index.
+    return and_(*(Product.id.in_(
+        select(ProductSearchToken.product_id)
+        .where(ProductSearchToken.token >= term, ProductSearchToken.token < term[:-1] + chr(ord(term[-1]) + 1))
+    ) for term in terms))
+
+def parse_price(value):
+    try:
+        price = Decimal(value)
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return price if price.is_finite() and price >= 0 else None
+
+class Filters:
+    """Catalog filters as read from a query string."""
+
+    def __init__(self, q=None, category=None, min_price=None, max_price=None, in_stock=False):
+        self.q = (q or '').strip()
+        self.category = category or None
+        self.min_price = min_price
+        self.max_price = max_price
+        self.in_stock = in_stock
+
+    @classmethod
+    def from_args(cls, args, category=None):
+        return cls(q=args.get('q'), category=category or args.get('category'),
+                   min_price=parse_price(args.get('min_price')), max_price=parse_price(args.get('max_price')),
+                   in_stock=args.get('in_stock') in ('1', 'on', 'true'))
+
+    def as_args(self):
+        """The filters as query string arguments, for building page links."""
+        args = {'q': self.q, 'category': self.category,
+                'min_price': self.min_price, 'max_price': self.max_price, 'in_stock': '1' if self.in_stock else None}
+        return {key: value for key, value in args.items() if value not in (None, '')}
+
+def search(filters, after=None, per_page=24):
+    """One page of products matching the filters, in name order."""
+    query = Product.query.options(load_only(*CARD_COLUMNS))
+    if filters.category:
+        query = query.filter(Product.category == filters.category)
+    if filters.min_price is not None:
+        query = query.filter(Product.selling_price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.filter(Product.selling_price <= filters.max_price)
+    if filters.in_stock:
+        query = query.filter(Product.stock_on_hand > 0)
+    terms = sorted(tokenize(filters.q))
+    if terms:
+        query = query.filter(_text_filter(terms))
+    elif filters.q:
+        # Only one-character words: nothing indexed can match
+        query = query.filter(db.false())
+    return pagination.paginate(query, [Product.name, Product.id], after, per_page)
+
+@cache.memoize('catalog_categories', depends_on=('catalog',))
+def categories():
+    """Distinct product categories, alphabetically."""
+    return db.session.scalars(select(Product.category).distinct().order_by(Product.category)).all()
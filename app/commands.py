@@ -0,0 +1,179 @@
+# FILE: app/commands.py
+import sys
+import click
+from flask import current_app
+from app import db, inventory, rollups, bulk, ml_models, cache, reorder, passwords, catalog, images, database, outbox, queryplans, pos, cart as carts
+from app.models import Product
+
+def register_commands(app):
+    """Registers the maintenance commands on the app's `flask` CLI."""
+
+    @app.cli.command('reconcile-stock')
+    @click.option('--fix', is_flag=True, help='Reset drifted counters to SUM(batch.quantity).')
+    def reconcile_stock_command(fix):
+        """Compare Product.stock_on_hand against the batch table."""
+        drift = inventory.reconcile_stock(fix=fix)
+        if not drift:
+            click.echo('Stock counters are in sync with batches.')
+            return
+        for row in drift:
+            click.echo(f'Product {row.id} ({row.name}): counter={row.stock_on_hand} batches={row.batch_total}')
+        if fix:
+            click.echo(f'Fixed {len(drift)} product(s).')
+        else:
+            click.echo(f'{len(drift)} product(s) drifted. Re-run with --fix to repair.')
+
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups_command():
+        """Recompute the dashboard rollup tables from the bill history."""
+        rollups.rebuild()
+        click.echo('Daily sales rollups rebuilt.')
+
+    @app.cli.command('recompute-reorder-points')
+    def recompute_reorder_points_command():
+        """Recalculate sales velocity and reorder levels for every product."""
+        at_risk = reorder.recompute_all()
+        click.echo(f'Reorder points recalculated; {at_risk} product(s) at risk of running out.')
+
+    @app.cli.command('purge-carts')
+    def purge_carts_command():
+        """Delete shopping carts untouched for CART_TTL_DAYS."""
+        removed = carts.store().purge_expired()
+        db.session.commit()
+        click.echo(f'Purged {removed} abandoned cart(s).')
+
+    @app.cli.command('purge-row-versions')
+    def purge_row_versions_command():
+        """Delete row versions that billing terminals can no longer be handed."""
+        removed = pos.purge_versions()
+        db.session.commit()
+        click.echo(f'Purged {removed} row version(s).')
+
+    @app.cli.command('process-outbox')
+    @click.option('--once', is_flag=True, help='Handle the events that are due now, then exit.')
+    @click.option('--retry-failed', is_flag=True, help='Queue events that ran out of attempts again first.')
+    def process_outbox_command(once, retry_failed):
+        """Handle post-commit events (sales rollups, reorder points) outside the web workers."""
+        if retry_failed:
+            click.echo(f'Re-queued {outbox.retry_failed()} failed event(s).')
+        if once:
+            handled = outbox.drain()
+            states = outbox.counts()
+            click.echo(f"Handled {handled} event(s); {states.get('pending', 0)} pending, {states.get('failed', 0)} failed.")
+            return
+        outbox.wake()
+        outbox.run_worker(current_app._get_current_object())
+
+    @app.cli.command('purge-outbox')
+    def purge_outbox_command():
+        """Delete outbox events handled more than OUTBOX_RETENTION_DAYS ago."""
+        removed = outbox.purge()
+        click.echo(f'Purged {removed} handled event(s).')
+
+    @app.cli.command('reindex-catalog')
+    def reindex_catalog_command():
+        """Rebuild the storefront search index (not needed on MySQL, which uses FULLTEXT)."""
+        indexed = catalog.reindex_all(current_app.config['BULK_CHUNK_SIZE'])
+        click.echo(f'Indexed {indexed} product(s) for search.')
+
+    @app.cli.command('process-images')
+    def process_images_command():
+        """Move product images to content-hashed names and render their resized variants."""
+        if not images.pillow_available():
+            click.echo('Pillow is not installed; images will be renamed but no variants rendered.')
+        renamed = images.process_existing(Product.query.all())
+        db.session.commit()
+        cache.bump('catalog')
+        click.echo(f'Renamed {len(renamed)} image(s); variants are up to date.')
+
+    @app.cli.command('bench-passwords')
+    @click.option('--method', 'methods', multiple=True, help='werkzeug hash method(s) to try (default PASSWORD_HASH_METHOD).')
+    @click.option('--seconds', type=float, default=3.0, show_default=True, help='Time spent on each measurement.')
+    @click.option('--threads', type=int, help='Parallel checkers (default PASSWORD_HASH_WORKERS).')
+    def bench_passwords_command(methods, seconds, threads):
+        """Report password checks (logins) per second per core for hashing settings."""
+        for hash_method in methods or [current_app.config['PASSWORD_HASH_METHOD']]:
+            result = passwords.benchmark(hash_method, seconds, threads or current_app.config['PASSWORD_HASH_WORKERS'])
+            click.echo(f"{result['method']}: {result['checks_per_second']:.1f}/s on one thread, "
+                       f"{result['parallel_checks_per_second']:.1f}/s on {result['threads']} threads "
+                       f"({result['cores']} cores) = {result['logins_per_second_per_core']:.1f} logins/s per core")
+
+    @app.cli.command('train-forecast')
+    @click.option('--full', is_flag=True, help='Ignore the watermark and refit every series from all history.')
+    @click.option('--workers', type=int, help='Worker processes for fitting (default FORECAST_WORKERS).')
+    def train_forecast_command(full, workers):
+        """Train the per-product and per-category demand models."""
+        config = current_app.config
+        artifacts = ml_models.train_and_save_demand_model(database.read_engine(), config['FORECAST_MODEL_DIR'],
+                                                          workers or config['FORECAST_WORKERS'], full=full,
+                                                          horizon=config['FORECAST_HORIZON_DAYS'])
+        if artifacts is None:
+            sys.exit(1)
+        cache.bump('forecast')
+
+    @app.cli.command('import-products')
+    @click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+    @click.option('--chunk-size', type=int, help='Rows validated and written per transaction.')
+    def import_products_command(source, fmt, chunk_size):
+        """Upsert products from a CSV or JSON Lines file ('-' for stdin)."""
+        report = bulk.import_products(source, fmt or bulk.format_for(source.name),
+                                      chunk_size or current_app.config['BULK_CHUNK_SIZE'])
+        _print_report(report)
+
+    @app.cli.command('import-batches')
+    @click.argument('source', type=click.File('r', encoding='utf-8-sig'))
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension.')
+    @click.option('--chunk-size', type=int, help='Rows validated and written per transaction.')
+    def import_batches_command(source, fmt, chunk_size):
+        """Add inventory batches from a CSV or JSON Lines file ('-' for stdin)."""
+        report = bulk.import_batches(source, fmt or bulk.format_for(source.name),
+                                     chunk_size or current_app.config['BULK_CHUNK_SIZE'])
+        _print_report(report)
+
+    @app.cli.command('export')
+    @click.argument('kind', type=click.Choice(sorted(bulk.EXPORTS)))
+    @click.option('--output', '-o', type=click.File('w', encoding='utf-8'), default='-', help='Defaults to stdout.')
+    @click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), help='Defaults to the file extension, else csv.')
+    def export_command(kind, output, fmt):
+        """Stream products, stock or bill lines out as CSV or JSON Lines."""
+        for chunk in bulk.export_rows(kind, fmt or bulk.format_for(output.name), current_app.config['BULK_CHUNK_SIZE']):
+            output.write(chunk)
+
+    @app.cli.command('index-advisor')
+    @click.option('--min-rows', type=int, default=1000, show_default=True,
+                  help='Full scans of smaller tables are listed but not flagged.')
+    @click.option('--verbose', '-v', is_flag=True, help='Print every statement and its plan, not just the full scans.')
+    def index_advisor_command(min_rows, verbose):
+        """Replay the hot queries, EXPLAIN them and flag full table scans; exits 1 if any are flagged."""
+        findings, rows, skipped = queryplans.advise(current_app._get_current_object())
+        flagged = 0
+        for finding in findings:
+            is_flagged = finding.flagged(rows, min_rows)
+            flagged += is_flagged
+            if not (finding.scanned or verbose):
+                continue
+            if is_flagged:
+                label = 'FULL SCAN'
+            elif finding.scanned:
+                label = 'scan (ends early under LIMIT)' if finding.stops_early else \
+                    'scan (reads every row by design)' if not finding.filtered else 'scan (small table)'
+            else:
+                label = 'ok'
+            scans = ', '.join(f'{table} ({rows[table]} rows)' for table in finding.scanned)
+            click.echo(f"{label}: {scans or '-'} | {finding.source} | {finding.executions}x")
+            click.echo('  ' + ' '.join(finding.statement.split())[:300])
+            for row in finding.plan:
+                click.echo('    ' + ' | '.join(str(value) for value in row))
+        for path in skipped:
+            click.echo(f'Skipped {path}', err=True)
+        click.echo(f'{len(findings)} distinct statement(s); {flagged} filter a table of {min_rows}+ rows without an index.')
+        if flagged:
+            sys.exit(1)
+
+def _print_report(report):
+    click.echo(f'Inserted {report.inserted}, updated {report.updated}, rejected {len(report.errors)} row(s).')
+    for line, message in report.errors:
+        click.echo(f'  line {line}: {message}', err=True)
+    if report.errors:
+        sys.exit(1)
@@ -0,0 +1,136 @@
+# FILE: app/database.py
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, has_app_context, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+
+# Connection pool tuning and read-replica routing.
+#
+# engine_options() turns the DB_* settings into SQLAlchemy engine options.
+# When DATABASE_REPLICA_URL is set it becomes the "replica" bind, and
+# RoutingSession sends the SELECTs of GET requests to views marked
+# @read_only there. Writes, and reads anywhere else, go to the primary.
+#
+# A replica that can't be reached is skipped for REPLICA_RETRY_SECONDS, and
+# reads fall back to the primary. It is probed again before traffic returns.
+# After a request that wrote, the same browser reads from the primary for
+# REPLICA_STICKY_SECONDS, so replication lag can't hide its own changes.
+# Reads that fill a version-keyed cache run under primary(): a lagging
+# replica would otherwise store old data under the primary's new version.
+
+REPLICA = 'replica'
+
+def engine_options(url, config):
+    """SQLAlchemy engine options for a database URL from the DB_* settings."""
+    url = make_url(url)
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING'], 'pool_recycle': config['DB_POOL_RECYCLE']}
+    if url.get_backend_name() != 'sqlite' or url.database not in (None, '', ':memory:'):
+        # In-memory SQLite uses a single-connection pool without these settings
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'])
+    timeout = config['DB_STATEMENT_TIMEOUT_MS']
+    if timeout:
+        if url.get_backend_name() == 'mysql':
+            # Applies to SELECTs, which are what can run away
+            options['connect_args'] = {'init_command': f'SET SESSION max_execution_time={timeout}'}
+        elif url.get_backend_name() == 'postgresql':
+            options['connect_args'] = {'options': f'-c statement_timeout={timeout}'}
+    return options
+
+# --- Replica health ---
+
+_down_until = None # None: not probed yet; 0: healthy; otherwise monotonic time to probe again
+_health_lock = threading.Lock()
+_watched = weakref.WeakSet()
+
+def _mark_down(engine):
+    global _down_until
+    with _health_lock:
+        already_down = bool(_down_until) and time.monotonic() < _down_until
+        _down_until = time.monotonic() + current_app.config['REPLICA_RETRY_SECONDS']
+    if not already_down:
+        current_app.logger.warning('Read replica %s unavailable; reading from the primary', engine.url.render_as_string())
+
+def _on_error(context):
+    # Lost or refused connections take the replica out; query errors don't
+    if (context.is_disconnect or context.connection is None) and has_app_context():
+        _mark_down(context.engine)
+
+def replica_engine():
+    """The replica engine if one is configured and reachable, else None."""
+    global _down_until
+    engine = current_app.extensions['sqlalchemy'].engines.get(REPLICA)
+    if engine is None:
+        return None
+    if engine not in _watched:
+        event.listen(engine, 'handle_error', _on_error)
+        _watched.add(engine)
+    if _down_until == 0:
+        return engine
+    if _down_until is not None and time.monotonic() < _down_until:
+        return None
+    try:
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+    except exc.DBAPIError:
+        _mark_down(engine)
+        return None
+    with _health_lock:
+        _down_until = 0
+    return engine
+
+def read_engine():
+    """Engine for bulk reads outside the ORM session (e.g. the forecast extract): the replica if usable."""
+    return replica_engine() or current_app.extensions['sqlalchemy'].engine
+
+# --- Routing ---
+
+def read_only(view):
+    """Marks a view whose GET requests may read from the replica."""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method in ('GET', 'HEAD') and session.get('db_primary_until', 0) < time.time():
+            g.read_replica = True
+        return view(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def primary():
+    """Sends the reads in the block to the primary, even inside @read_only views."""
+    if not has_request_context():
+        yield
+        return
+    previous = g.get('db_primary')
+    g.db_primary = True
+    try:
+        yield
+    finally:
+        g.db_primary = previous
+
+class RoutingSession(Session):
+    """Session that sends SELECTs to the replica inside @read_only views."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_request_context():
+            if self._flushing or (clause is not None and not getattr(clause, 'is_select', False)):
+                g.db_wrote = True
+            elif g.get('read_replica') and not g.get('db_primary'):
+                replica = replica_engine()
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+def init_app(app):
+    if not app.config.get('DATABASE_REPLICA_URL'):
+        return
+
+    @app.after_request
+    def stick_to_primary_after_write(response):
+        if g.get('db_wrote'):
+            session['db_primary_until'] = time.time() + app.config['REPLICA_STICKY_SECONDS']
+        return response
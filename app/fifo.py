@@ -0,0 +1,139 @@
+# FILE: app/fifo.py
+from collections import defaultdict
+from sqlalchemy import case, insert, select, update
+from app import db, cache
+from app.models import Product, Batch, BillItemBatch
+
+# FIFO stock allocation shared by admin billing and storefront checkout.
+# A whole order is handled with a fixed number of statements no matter how many
+# lines or batches it touches: one guarded UPDATE of the stock counters, one
+# locking SELECT of the non-empty batches, one UPDATE for all batch quantities
+# and one INSERT for the consumption records.
+#
+# The counter UPDATE comes first and only succeeds where stock_on_hand covers
+# the order, so it doubles as the lock: a concurrent order for the same product
+# waits on that row (or, on SQLite, on the database write lock) and then sees
+# the reduced counter. Two orders can therefore never both take the last units.
+#
+# A deduction bumps the "inventory" cache version when it commits, and
+# "stock_status" as well when it sells a product out, since storefront
+# listings only show whether a product is in stock.
+
+class InsufficientStock(Exception):
+    """Raised when the batches of a product cannot cover the requested quantity."""
+    def __init__(self, product_id, requested, available):
+        super().__init__(f'Product {product_id}: requested {requested}, only {available} available')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+def order_quantities(lines):
+    """Collapses (product_id, quantity) pairs into {product_id: total_quantity}."""
+    quantities = defaultdict(int)
+    for product_id, quantity in lines:
+        if int(quantity) <= 0:
+            raise ValueError(f'Quantity for product {product_id} must be positive')
+        quantities[int(product_id)] += int(quantity)
+    return dict(quantities)
+
+def _reserve_stock(quantities):
+    # Rows are updated in primary key order, which keeps lock order consistent
+    needed = case(quantities, value=Product.id)
+    result = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(quantities), Product.stock_on_hand >= needed)
+        .values(stock_on_hand=Product.stock_on_hand - needed)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == len(quantities):
+        return
+    available = dict(db.session.execute(
+        select(Product.id, Product.stock_on_hand).where(Product.id.in_(quantities))
+    ).all())
+    for product_id in sorted(quantities):
+        if available.get(product_id, 0) < quantities[product_id]:
+            raise InsufficientStock(product_id, quantities[product_id], available.get(product_id, 0))
+
+def _lock_open_batches(product_ids):
+    # Only batches with stock left are read; exhausted batches stay untouched.
+    # Rows come back in the order of ix_batch_fifo (product_id, date_added).
+    return db.session.execute(
+        select(Batch.id, Batch.product_id, Batch.quantity)
+        .where(Batch.product_id.in_(product_ids), Batch.quantity > 0)
+        .order_by(Batch.product_id, Batch.date_added, Batch.id)
+        .with_for_update()
+    ).all()
+
+def plan_allocation(quantities, open_batches):
+    """Walks the batches oldest-first and returns {product_id: [(batch_id, taken), ...]}.
+
+    Raises InsufficientStock if any product cannot be covered. Pure function, no I/O.
+    """
+    remaining = dict(quantities)
+    available = defaultdict(int)
+    allocations = defaultdict(list)
+    for batch_id, product_id, batch_quantity in open_batches:
+        available[product_id] += batch_quantity
+        needed = remaining.get(product_id, 0)
+        if needed > 0:
+            taken = min(needed, batch_quantity)
+            allocations[product_id].append((batch_id, taken))
+            remaining[product_id] = needed - taken
+    for product_id, needed in remaining.items():
+        if needed > 0:
+            raise InsufficientStock(product_id, quantities[product_id], available[product_id])
+    return dict(allocations)
+
+def allocate(quantities):
+    """Deducts {product_id: quantity} from the oldest batches first.
+
+    Raises InsufficientStock, leaving the caller to roll back, if the locked
+    counters cannot cover the order. Returns the allocation plan for
+    record_consumption().
+    """
+    if not quantities:
+        return {}
+    # Pending bill rows are flushed after the deduction, so the locks are taken
+    # as late as possible and held only until the caller commits.
+    with db.session.no_autoflush:
+        _reserve_stock(quantities)
+        open_batches = _lock_open_batches(sorted(quantities))
+        allocations = plan_allocation(quantities, open_batches)
+
+        taken_by_batch = {batch_id: taken for parts in allocations.values() for batch_id, taken in parts}
+        db.session.execute(
+            update(Batch)
+            .where(Batch.id.in_(taken_by_batch))
+            .values(quantity=Batch.quantity - case(taken_by_batch, value=Batch.id))
+            .execution_options(synchronize_session=False)
+        )
+    left = defaultdict(int)
+    for _, product_id, batch_quantity in open_batches:
+        left[product_id] += batch_quantity
+    sold_out = any(left[product_id] == quantity for product_id, quantity in quantities.items())
+    cache.bump_on_commit('inventory', *(['stock_status'] if sold_out else []))
+    return allocations
+
+def record_consumption(bill_items, allocations):
+    """Stores which batches each bill item was served from.
+
+    bill_items are inserted BillItems or rows with their id, product_id and
+    quantity. Several lines for the
+    same product share that product's allocation in line order.
+    """
+    pending = {product_id: list(parts) for product_id, parts in allocations.items()}
+    rows = []
+    for bill_item in bill_items:
+        parts = pending.get(bill_item.product_id, [])
+        still_needed = bill_item.quantity
+        while still_needed > 0 and parts:
+            batch_id, taken = parts[0]
+            used = min(still_needed, taken)
+            rows.append({'bill_item_id': bill_item.id, 'batch_id': batch_id, 'quantity': used})
+            still_needed -= used
+            if used == taken:
+                parts.pop(0)
+            else:
+                parts[0] = (batch_id, taken - used)
+    if rows:
+        db.session.execute(insert(BillItemBatch), rows)
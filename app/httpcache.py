@@ -0,0 +1,106 @@
+# FILE: app/httpcache.py
+import hashlib
+import os
+from datetime import datetime, timezone
+from functools import wraps
+from flask import current_app, request, session, make_response
+from flask_login import current_user
+from markupsafe import Markup
+from app import cache, database, images
+
+# HTTP caching for the storefront. Anonymous visitors all see the same page
+# for a URL until a product write bumps the "catalog" cache version, or a
+# product sells out or is restocked and bumps "stock_status". Listings show no
+# more of the stock than that, so an ordinary sale leaves them cached. The
+# versions are the same in every worker (see app/cache.py), so they make a
+# strong validator:
+#   ETag           hash of (templates, versions, URL, the validator's value)
+#   Last-Modified  time of the latest bump (left out when there is a validator)
+# A page that shows more, such as the product page's unit count, passes a
+# validator: a cheap function of the view's arguments whose value (read from
+# the primary) goes into the ETag as well.
+# A matching If-None-Match / If-Modified-Since gets a 304 without running the
+# view, and the rendered page is kept in the result cache under its ETag, so a
+# spike of anonymous traffic is answered without touching the database. A miss
+# renders from the primary, as the page is stored under the primary's versions.
+# Signed-in visitors and pages with flashed messages bypass all of this.
+#
+# Product cards are additionally cached as fragments keyed on the values they
+# display, so a page that has to be rendered reuses the cards of products
+# that didn't change.
+
+STOREFRONT_NAMESPACES = ('catalog', 'stock_status')
+
+_release = None
+
+def release():
+    """Hash of the templates and stylesheet, so a deploy that changes them changes every ETag."""
+    global _release
+    if _release is None:
+        digest = hashlib.sha256()
+        for folder in (os.path.join(current_app.root_path, 'templates'), current_app.static_folder):
+            for root, dirs, files in os.walk(folder):
+                dirs[:] = sorted(d for d in dirs if d != 'uploads')
+                for name in sorted(files):
+                    if name.endswith(('.html', '.css', '.js')):
+                        with open(os.path.join(root, name), 'rb') as f:
+                            digest.update(name.encode() + f.read())
+        _release = digest.hexdigest()[:16]
+    return _release
+
+def _cacheable():
+    return request.method in ('GET', 'HEAD') and not current_user.is_authenticated and '_flashes' not in session
+
+def _not_modified(etag, last_modified):
+    if request.if_none_match:
+        return request.if_none_match.contains(etag)
+    since = request.if_modified_since
+    return since is not None and last_modified is not None and int(last_modified) <= since.timestamp()
+
+def storefront_page(validator=None):
+    """Adds ETag/Last-Modified, 304s and a whole-page cache to an anonymous storefront view."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _cacheable():
+                return view(*args, **kwargs)
+            versions = ','.join(f'{ns}={cache.version(ns)}' for ns in STOREFRONT_NAMESPACES)
+            with database.primary():
+                extra = repr(validator(*args, **kwargs)) if validator else ''
+            etag = hashlib.sha256(f'{release()}|{versions}|{request.full_path}|{extra}'.encode()).hexdigest()[:32]
+            # The bump times say nothing about the validator's value, so such pages go without one
+            last_modified = None if validator else max(cache.changed_at(ns) for ns in STOREFRONT_NAMESPACES)
+
+            if _not_modified(etag, last_modified):
+                response = current_app.response_class(status=304)
+            else:
+                key = f'page:{etag}'
+                body = cache.get(key)
+                if body is None:
+                    with database.primary(): # the page is stored under the primary's versions
+                        response = make_response(view(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    cache.set(key, response.get_data(), current_app.config['STOREFRONT_PAGE_TTL'])
+                else:
+                    response = current_app.response_class(body, mimetype='text/html')
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+            response.cache_control.public = True
+            response.cache_control.max_age = current_app.config['STOREFRONT_MAX_AGE']
+            response.vary.add('Cookie')
+            return response
+        return wrapper
+    return decorator
+
+def product_card(product, lazy=True):
+    """Rendered product card (templates/_product_card.html), cached on everything it shows."""
+    shown = (release(), product.id, product.name, str(product.selling_price), product.image_file,
+             product.stock > 0, images.variants(product.image_file) is not None, lazy)
+    key = 'card:' + hashlib.sha256(repr(shown).encode()).hexdigest()
+    html = cache.get(key)
+    if html is None:
+        html = current_app.jinja_env.get_template('_product_card.html').render(product=product, lazy=lazy)
+        cache.set(key, html, current_app.config['STOREFRONT_PAGE_TTL'])
+    return Markup(html)
@@ -0,0 +1,44 @@
+# FILE: app/identity.py
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+from app.cache import LRUCache
+
+# Per-process cache of the signed-in user's row for the Flask-Login user
+# loader. Each request rebuilds the user from the cached column values and
+# attaches it to the session without a SELECT. Entries live for
+# IDENTITY_CACHE_TTL seconds; this process forgets a user at once on profile
+# edit, deletion and logout, other worker processes within the TTL.
+
+# Never cached; loaded on first access if something needs it
+UNCACHED_COLUMNS = ('password_hash',)
+
+_users = None
+
+def _cache():
+    global _users
+    if _users is None:
+        _users = LRUCache(current_app.config['IDENTITY_CACHE_MAX'])
+    return _users
+
+def load(user_type, model, user_id):
+    """Returns the user with this id, from the cache when possible."""
+    ttl = current_app.config['IDENTITY_CACHE_TTL']
+    if not ttl:
+        return db.session.get(model, user_id)
+    key = (user_type, user_id)
+    columns = _cache().get(key)
+    if columns is None:
+        user = db.session.get(model, user_id)
+        if user is not None:
+            _cache().set(key, {attr.key: getattr(user, attr.key) for attr in inspect(model).column_attrs
+                               if attr.key not in UNCACHED_COLUMNS}, ttl)
+        return user
+    user = model(**columns)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
+
+def forget(user_type, user_id):
+    """Drops a user from this process's cache, e.g. after it was changed or deleted."""
+    _cache().delete((user_type, user_id))
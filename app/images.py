@@ -0,0 +1,151 @@
+# FILE: app/images.py
+import glob
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import uuid
+from flask import current_app, request, url_for
+from werkzeug.utils import secure_filename
+from app import cache, jobs
+
+# Product image pipeline. An upload is stored once under a hash of its bytes,
+# so identical uploads share a file (whatever extension they came with) and a
+# name never changes what it points to. A background job then renders resized WebP/AVIF variants beside it:
+#   uploads/<digest>.<ext>              the original as uploaded
+#   uploads/<digest>-<width>.<format>   one per width and format
+#   uploads/<digest>.json               manifest, written once every variant exists
+# Content-hashed files are served with a far-future immutable Cache-Control.
+# Rendering variants needs the optional Pillow package; without it (or until
+# the job has run) pages fall back to the original.
+
+DIGEST_LENGTH = 32
+_HASHED = re.compile(r'^[0-9a-f]{%d}(-\d+)?\.[a-z0-9]+$' % DIGEST_LENGTH)
+IMMUTABLE_MAX_AGE = 365 * 86400
+
+# Complete manifests by original filename; they never change once written
+_manifests = {}
+
+def _path(filename):
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
+
+def _write(path, data):
+    # Write then rename, so other workers never serve a half-written file
+    tmp = f'{path}.{uuid.uuid4().hex}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+def is_hashed(filename):
+    return bool(_HASHED.match(filename))
+
+def _stored(digest):
+    # The original already stored under this digest, under whichever extension it was first uploaded with
+    for path in sorted(glob.glob(_path(glob.escape(digest) + '.*'))):
+        name = os.path.basename(path)
+        if is_hashed(name) and not name.endswith('.json'):
+            return name
+    return None
+
+def store(data, original_name):
+    """Saves image bytes under their content hash and returns the filename. Identical bytes are stored once."""
+    digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+    filename = _stored(digest)
+    if filename is None:
+        filename = digest + (os.path.splitext(secure_filename(original_name or ''))[1].lower() or '.img')
+        _write(_path(filename), data)
+    return filename
+
+def pillow_available():
+    return importlib.util.find_spec('PIL') is not None
+
+def queue_variants(filename):
+    """Starts a background job rendering the variants of an image, unless they exist already."""
+    if is_hashed(filename) and pillow_available() and variants(filename) is None:
+        jobs.submit(f'image-variants:{filename}', make_variants, filename)
+
+def save_upload(file_storage):
+    """Stores an uploaded image and queues its variants; returns the filename for Product.image_file."""
+    filename = store(file_storage.read(), file_storage.filename)
+    queue_variants(filename)
+    return filename
+
+def make_variants(filename):
+    """Renders every configured width and format of an image and writes its manifest."""
+    from PIL import Image, ImageOps, features
+    config = current_app.config
+    digest = os.path.splitext(filename)[0]
+    formats = [fmt for fmt in config['IMAGE_VARIANT_FORMATS'] if features.check(fmt)]
+    with Image.open(_path(filename)) as source:
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.has_transparency_data else 'RGB')
+    # Never upscale: widths beyond the original collapse into the original width
+    widths = sorted({min(width, image.width) for width in config['IMAGE_VARIANT_WIDTHS']})
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt in formats:
+            variant = _path(f'{digest}-{width}.{fmt}')
+            if not os.path.exists(variant):
+                tmp = f'{variant}.{uuid.uuid4().hex}.tmp'
+                resized.save(tmp, format=fmt.upper(), quality=config['IMAGE_QUALITY'])
+                os.replace(tmp, variant)
+    manifest = {'width': image.width, 'height': image.height, 'widths': widths, 'formats': formats}
+    _write(_path(f'{digest}.json'), json.dumps(manifest).encode())
+    # Pages rendered before the variants existed point at the original
+    cache.bump('catalog')
+    return manifest
+
+def variants(filename):
+    """The manifest of an image's variants, or None if there are none (yet)."""
+    manifest = _manifests.get(filename)
+    if manifest is None and is_hashed(filename):
+        try:
+            with open(_path(os.path.splitext(filename)[0] + '.json')) as f:
+                manifest = _manifests[filename] = json.load(f)
+        except FileNotFoundError:
+            return None
+    return manifest
+
+def srcset(filename, fmt):
+    """srcset attribute value listing every width of one format of an image."""
+    manifest = variants(filename)
+    if manifest is None:
+        return ''
+    digest = os.path.splitext(filename)[0]
+    return ', '.join(f"{url_for('static', filename=f'uploads/{digest}-{width}.{fmt}')} {width}w"
+                     for width in manifest['widths'])
+
+def cache_headers(response):
+    """after_request hook: content-hashed uploads can be cached forever."""
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        folder, _, name = (request.view_args or {}).get('filename', '').rpartition('/')
+        if folder == 'uploads' and is_hashed(name):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+    return response
+
+# --- Existing uploads ---
+
+def process_existing(products):
+    """Moves products' images to content-hashed names and renders their variants.
+
+    `products` are the products to process; returns {old filename: new filename}
+    for the images that were renamed. Files that are missing on disk are skipped.
+    """
+    renamed = {}
+    for product in products:
+        filename = product.image_file
+        if not is_hashed(filename):
+            if filename not in renamed:
+                if not os.path.exists(_path(filename)):
+                    continue
+                with open(_path(filename), 'rb') as f:
+                    renamed[filename] = store(f.read(), filename)
+            product.image_file = renamed[filename]
+        if pillow_available() and variants(product.image_file) is None:
+            make_variants(product.image_file)
+    return renamed
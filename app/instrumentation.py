@@ -0,0 +1,207 @@
+# FILE: app/instrumentation.py
+import bisect
+import threading
+import time
+from flask import current_app, g, has_app_context, has_request_context, request, abort
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Request-level performance instrumentation, cheap enough to leave on:
+#   - SQLAlchemy cursor events count the statements each request issues and
+#     the time spent in them; the ORM "load" event counts rows materialized
+#     as model instances.
+#   - Statements slower than SLOW_QUERY_MS are logged with their query plan,
+#     and with their parameters only if SLOW_QUERY_LOG_PARAMETERS is on.
+#     Requests issuing more than REQUEST_QUERY_WARN statements (usually an
+#     N+1) are logged too.
+#   - Per-route histograms of latency, statement count, SQL time and rows
+#     are served at /metrics in the Prometheus text format, to holders of
+#     METRICS_TOKEN (or to anyone in debug mode when there is no token).
+# Metrics are kept per worker process; scrape each worker, or run a single
+# worker behind the scrape address.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # the last slot is +Inf
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+
+class Metrics:
+    """Per-process aggregates, keyed by (route, method)."""
+
+    HISTOGRAMS = {
+        'http_request_duration_seconds': ('Request latency.', LATENCY_BUCKETS),
+        'http_request_sql_queries': ('SQL statements issued per request.', QUERY_BUCKETS),
+        'http_request_sql_duration_seconds': ('Time spent in SQL per request.', LATENCY_BUCKETS),
+        'http_request_rows_loaded': ('ORM rows loaded per request.', ROW_BUCKETS),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {name: {} for name in self.HISTOGRAMS}
+        self.requests = {} # (route, method, status) -> count
+        self.slow_queries = {} # route -> count
+
+    def record(self, route, method, status, values):
+        with self._lock:
+            for name, value in values.items():
+                series = self.histograms[name]
+                if (route, method) not in series:
+                    series[(route, method)] = Histogram(self.HISTOGRAMS[name][1])
+                series[(route, method)].observe(value)
+            key = (route, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def record_slow_query(self, route):
+        with self._lock:
+            self.slow_queries[route] = self.slow_queries.get(route, 0) + 1
+
+    def render(self):
+        """The metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP http_requests_total Requests handled.', '# TYPE http_requests_total counter']
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{route="{_escape(route)}",method="{method}",status="{status}"}} {count}')
+            for name, (help_text, _) in self.HISTOGRAMS.items():
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), histogram in sorted(self.histograms[name].items()):
+                    labels = f'route="{_escape(route)}",method="{method}"'
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                    cumulative += histogram.counts[-1]
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {cumulative}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {cumulative}')
+            lines += ['# HELP sql_slow_queries_total Statements slower than SLOW_QUERY_MS.',
+                      '# TYPE sql_slow_queries_total counter']
+            for route, count in sorted(self.slow_queries.items()):
+                lines.append(f'sql_slow_queries_total{{route="{_escape(route)}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+metrics = Metrics()
+
+def _route():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+def _stats():
+    # The current request's counters, or None outside an instrumented request
+    return g.get('_perf') if has_request_context() else None
+
+# --- SQL events ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_start
+    stats = _stats()
+    if stats is not None:
+        stats['queries'] += 1
+        stats['sql_time'] += elapsed
+    if has_app_context() and elapsed * 1000 >= current_app.config['SLOW_QUERY_MS']:
+        _log_slow_query(conn, cursor, statement, parameters, executemany, elapsed)
+
+def _on_load(target, context):
+    stats = _stats()
+    if stats is not None:
+        stats['rows'] += 1
+
+def explain(conn, statement, parameters):
+    """(column names, rows) of the database's plan for a statement issued on conn.
+
+    Runs on a separate cursor of the same DBAPI connection, so the plan is
+    taken in the same session and doesn't re-enter these listeners.
+    """
+    prefix = 'EXPLAIN QUERY PLAN ' if conn.dialect.name == 'sqlite' else 'EXPLAIN '
+    cursor = conn.connection.dbapi_connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [column[0] for column in cursor.description], cursor.fetchall()
+    finally:
+        cursor.close()
+
+def _explain(conn, statement, parameters):
+    _, rows = explain(conn, statement, parameters)
+    return '\n'.join(' | '.join(str(value) for value in row) for row in rows)
+
+def _log_slow_query(conn, cursor, statement, parameters, executemany, elapsed):
+    route = _route() if has_request_context() else 'background'
+    metrics.record_slow_query(route)
+    plan = ''
+    if not executemany and statement.lstrip().upper().startswith(('SELECT', 'WITH')):
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception as e: # the plan is a nice-to-have; never fail the request for it
+            plan = f'(EXPLAIN failed: {e})'
+    shown = f'{parameters!r:.500}' if current_app.config['SLOW_QUERY_LOG_PARAMETERS'] else '(not logged)'
+    current_app.logger.warning('Slow query (%.1f ms) in %s:\n%s\nParameters: %s\nPlan:\n%s',
+                               elapsed * 1000, route, statement, shown, plan or '(not a SELECT)')
+
+# --- Request hooks ---
+
+def _start_request():
+    g._perf = {'start': time.perf_counter(), 'queries': 0, 'sql_time': 0.0, 'rows': 0, 'status': 500}
+
+def _note_status(response):
+    stats = _stats()
+    if stats is not None:
+        stats['status'] = response.status_code
+    return response
+
+def _finish_request(exc):
+    stats = g.pop('_perf', None)
+    if stats is None:
+        return
+    latency = time.perf_counter() - stats['start']
+    route = _route()
+    metrics.record(route, request.method, stats['status'], {
+        'http_request_duration_seconds': latency,
+        'http_request_sql_queries': stats['queries'],
+        'http_request_sql_duration_seconds': stats['sql_time'],
+        'http_request_rows_loaded': stats['rows'],
+    })
+    if stats['queries'] > current_app.config['REQUEST_QUERY_WARN']:
+        current_app.logger.warning('%s %s issued %d SQL statements (%.1f ms in SQL, %d rows loaded, %.1f ms total)',
+                                   request.method, route, stats['queries'], stats['sql_time'] * 1000,
+                                   stats['rows'], latency * 1000)
+
+def metrics_view():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        abort(403)
+    if not token and not current_app.debug:
+        abort(404)
+    return metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+_listening = False
+
+def init_app(app, db):
+    """Hooks the instrumentation into an app; a no-op when INSTRUMENTATION_ENABLED is off."""
+    global _listening
+    if not app.config['INSTRUMENTATION_ENABLED']:
+        return
+    if not _listening:
+        # Listeners are global, so engines of every app (and the replica bind) are covered once
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(db.Model, 'load', _on_load, propagate=True)
+        _listening = True
+    app.before_request(_start_request)
+    app.after_request(_note_status)
+    app.teardown_request(_finish_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
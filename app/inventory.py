@@ -0,0 +1,58 @@
+# FILE: app/inventory.py
+from sqlalchemy import func, select, update
+from app import db, cache
+from app.models import Product, Batch
+
+# Product.stock_on_hand must always equal SUM(batch.quantity) for that product.
+# Every write that touches batch quantities goes through the helpers below so the
+# counter is changed in the same transaction as the batches themselves.
+
+def adjust_stock(product_id, delta):
+    """Adds delta (negative to deduct) to a product's stock counter."""
+    db.session.execute(
+        update(Product)
+        .where(Product.id == product_id)
+        .values(stock_on_hand=Product.stock_on_hand + delta)
+    )
+
+def add_batch(product_id, quantity):
+    """Records a new batch and raises the product's stock counter to match."""
+    batch = Batch(product_id=product_id, quantity=quantity)
+    db.session.add(batch)
+    adjust_stock(product_id, quantity)
+    return batch
+
+@cache.memoize('inventory_summary', depends_on=('inventory', 'catalog'))
+def stock_summary():
+    """Name, category and stock of every product for the inventory summary page."""
+    rows = db.session.execute(
+        select(Product.name, Product.category, Product.stock_on_hand).order_by(Product.name)
+    ).all()
+    return [{'name': row.name, 'category': row.category, 'stock': row.stock_on_hand} for row in rows]
+
+def find_stock_drift():
+    """Returns (product_id, name, stock_on_hand, batch_total) for every product whose counter is out of step."""
+    batch_totals = (
+        select(Batch.product_id, func.sum(Batch.quantity).label('total'))
+        .group_by(Batch.product_id)
+        .subquery()
+    )
+    batch_total = func.coalesce(batch_totals.c.total, 0)
+    return db.session.execute(
+        select(Product.id, Product.name, Product.stock_on_hand, batch_total.label('batch_total'))
+        .outerjoin(batch_totals, batch_totals.c.product_id == Product.id)
+        .where(Product.stock_on_hand != batch_total)
+        .order_by(Product.id)
+    ).all()
+
+def reconcile_stock(fix=False):
+    """Detects counter drift and, if fix is set, resets each drifted counter to its batch total."""
+    drift = find_stock_drift()
+    if fix and drift:
+        db.session.execute(
+            update(Product),
+            [{'id': row.id, 'stock_on_hand': row.batch_total} for row in drift]
+        )
+        db.session.commit()
+        cache.bump('inventory', 'stock_status')
+    return drift
@@ -0,0 +1,182 @@
+# FILE: app/invoicing.py
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db, fifo, transactions, outbox
+from app.models import Product, Bill, BillItem
+
+# Pricing and recording of bills, shared by the billing screen, the billing
+# terminals and storefront checkout.
+#
+# Every amount is a Decimal rounded to paise (half up) and stored in a Numeric
+# column. A bill is recorded in a single pass with a fixed number of
+# statements however many lines it has: one SELECT for all of its products,
+# the FIFO allocator's statements, one INSERT for the bill and one bulk INSERT
+# for its items.
+
+MONEY = Decimal('0.01')
+
+class InvoiceError(Exception):
+    """A bill that can't be recorded; the message is meant for the cashier or customer."""
+
+def money(value):
+    """Rounds to paise, half up."""
+    return Decimal(value).quantize(MONEY, rounding=ROUND_HALF_UP)
+
+def parse_amount(value, field):
+    """A non-negative amount from a form or JSON field; blank means 0. Raises InvoiceError."""
+    try:
+        amount = Decimal(str(value or '0'))
+    except InvalidOperation:
+        raise InvoiceError(f'{field} must be a number.')
+    if not amount.is_finite() or amount < 0:
+        raise InvoiceError(f'{field} must be a number of at least 0.')
+    return money(amount)
+
+def _whole(value):
+    # An int, a digit string or a float with nothing after the point (as JSON may send it); else None
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float):
+        return int(value) if value.is_integer() else None
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value)
+    return None
+
+class Invoice:
+    """A priced bill. lines is a list of BillItem column dicts in order."""
+
+    def __init__(self, lines, subtotal, tax_percentage, tax_amount, discount_amount, final_amount):
+        self.lines = lines
+        self.subtotal = subtotal
+        self.tax_percentage = tax_percentage
+        self.tax_amount = tax_amount
+        self.discount_amount = discount_amount
+        self.final_amount = final_amount
+
+    def quantities(self):
+        return fifo.order_quantities((line['product_id'], line['quantity']) for line in self.lines)
+
+def load_products(product_ids):
+    """{id: row of id, name, selling_price, cost_price} for the given ids in one query."""
+    ids = {int(product_id) for product_id in product_ids}
+    if not ids:
+        return {}
+    rows = db.session.execute(select(Product.id, Product.name, Product.selling_price, Product.cost_price)
+                              .where(Product.id.in_(ids)))
+    return {row.id: row for row in rows}
+
+def price(lines, products, tax_percentage=Decimal('0'), discount_amount=Decimal('0'), skip_missing=False):
+    """Prices (product_id, quantity) lines against already loaded products. Does no I/O.
+
+    Lines of unknown products raise InvoiceError, or are dropped with
+    skip_missing (a storefront cart may still hold a deleted product).
+    """
+    if tax_percentage > 100:
+        raise InvoiceError('tax_percentage must be at most 100.')
+    priced = []
+    subtotal = Decimal('0')
+    for product_id, quantity in lines:
+        product_id, quantity = _whole(product_id), _whole(quantity)
+        if product_id is None:
+            raise InvoiceError('Unknown product id.')
+        if quantity is None:
+            raise InvoiceError('Quantities must be whole numbers.')
+        if quantity <= 0:
+            raise InvoiceError('Quantities must be positive.')
+        product = products.get(product_id)
+        if product is None:
+            if skip_missing:
+                continue
+            raise InvoiceError(f'Product {product_id} does not exist.')
+        priced.append({'product_id': product.id, 'product_name': product.name, 'quantity': quantity,
+                       'price_per_unit': money(product.selling_price),
+                       'cost_price_at_sale': money(product.cost_price)})
+        subtotal += priced[-1]['price_per_unit'] * quantity
+    if not priced:
+        raise InvoiceError('Cannot create an empty bill.')
+    tax_amount = money(subtotal * tax_percentage / 100)
+    final_amount = subtotal + tax_amount - discount_amount
+    if final_amount < 0:
+        raise InvoiceError('The discount is larger than the bill.')
+    return Invoice(priced, subtotal, tax_percentage, tax_amount, discount_amount, final_amount)
+
+def quote(lines, tax_percentage=Decimal('0'), discount_amount=Decimal('0'), skip_missing=False):
+    """Loads the products of (product_id, quantity) lines and prices them. Raises InvoiceError."""
+    lines = list(lines)
+    try:
+        products = load_products(product_id for product_id, _ in lines)
+    except (TypeError, ValueError):
+        raise InvoiceError('Unknown product id.')
+    return price(lines, products, tax_percentage, discount_amount, skip_missing)
+
+def _insert_items(bill_id, lines):
+    # One statement for all lines; returns their (id, product_id, quantity) rows.
+    # Row order isn't kept: asking for it makes SQLite insert one row at a time,
+    # and record_consumption() only needs each row's product.
+    rows = [dict(line, bill_id=bill_id) for line in lines]
+    if db.session.get_bind().dialect.insert_executemany_returning:
+        return db.session.execute(insert(BillItem).returning(BillItem.id, BillItem.product_id, BillItem.quantity),
+                                  rows).all()
+    # No RETURNING with executemany (MySQL): read the new rows back
+    db.session.execute(insert(BillItem), rows)
+    return db.session.execute(select(BillItem.id, BillItem.product_id, BillItem.quantity)
+                              .where(BillItem.bill_id == bill_id)).all()
+
+def record(invoice, customer, client_ref=None):
+    """Writes a priced bill in the current transaction and deducts its stock. Returns the bill id.
+
+    customer holds the customer_* columns of the bill. Raises
+    fifo.InsufficientStock; the caller commits or rolls back.
+    """
+    allocations = fifo.allocate(invoice.quantities())
+    bill_id = db.session.execute(insert(Bill).values(
+        client_ref=client_ref, subtotal=invoice.subtotal, tax_percentage=invoice.tax_percentage,
+        discount_amount=invoice.discount_amount, final_amount=invoice.final_amount, **customer
+    )).inserted_primary_key[0]
+    fifo.record_consumption(_insert_items(bill_id, invoice.lines), allocations)
+    # Rollups and reorder points follow from the outbox event, outside this transaction
+    outbox.bill_created(bill_id)
+    return bill_id
+
+def _existing(client_ref):
+    return db.session.scalar(select(Bill.id).where(Bill.client_ref == client_ref)) if client_ref else None
+
+def create_bill(lines, customer, tax_percentage=Decimal('0'), discount_amount=Decimal('0'), client_ref=None,
+                skip_missing=False):
+    """Prices and records a bill of (product_id, quantity) lines and commits. Returns (bill_id, created).
+
+    Prices are read in the same transaction that deducts the stock, so a
+    retry after a deadlock sees fresh ones. When client_ref was recorded
+    before, nothing is written and the earlier bill's id comes back with
+    created=False. Raises InvoiceError.
+    """
+    existing = _existing(client_ref)
+    if existing is not None:
+        return existing, False
+    lines = list(lines)
+
+    def write_bill():
+        invoice = quote(lines, tax_percentage, discount_amount, skip_missing)
+        bill_id = record(invoice, customer, client_ref)
+        db.session.commit()
+        return bill_id
+
+    try:
+        return transactions.run_with_retry(write_bill), True
+    except InvoiceError:
+        db.session.rollback()
+        raise
+    except fifo.InsufficientStock as e:
+        db.session.rollback()
+        name = db.session.scalar(select(Product.name).where(Product.id == e.product_id))
+        raise InvoiceError(f"Not enough stock for {name or 'an item on the bill'}.")
+    except IntegrityError:
+        # The same client_ref was recorded concurrently (e.g. a terminal retrying a slow request)
+        db.session.rollback()
+        existing = _existing(client_ref)
+        if existing is None:
+            raise
+        return existing, False
@@ -0,0 +1,84 @@
+# FILE: app/jobs.py
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import current_app
+from app import cache
+
+# Background jobs for slow work (e.g. model training) that must not run inside
+# a request. Jobs run on a small thread pool in the submitting process. Their
+# status is kept in the cache's shared tier when there is one, so any worker
+# can answer a poll for it.
+
+_executor = None
+_executor_lock = threading.Lock()
+_submit_lock = threading.Lock()
+
+ACTIVE = ('queued', 'running')
+
+def _pool():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=current_app.config['JOB_WORKERS'], thread_name_prefix='job')
+        return _executor
+
+def _save(job):
+    cache.set_state(f"job:{job['id']}", job, current_app.config['JOB_RESULT_TTL'])
+
+def status(job_id):
+    """The job record (id, name, state, submitted_at, finished_at, result, error), or None."""
+    return cache.get_state(f'job:{job_id}')
+
+def latest(name):
+    """The most recently submitted job with this name, or None."""
+    job_id = cache.get_state(f'job-latest:{name}')
+    return status(job_id) if job_id else None
+
+def is_active(job):
+    # A job whose process died never finishes; stop waiting for it after JOB_TIMEOUT
+    return (job is not None and job['state'] in ACTIVE
+            and time.time() - job['submitted_at'] < current_app.config['JOB_TIMEOUT'])
+
+def _run(app, job, fn, args):
+    with app.app_context():
+        job.update(state='running', started_at=time.time())
+        _save(job)
+        try:
+            job['result'] = fn(*args)
+            job['state'] = 'done'
+        except Exception as e:
+            app.logger.exception('Background job %s failed', job['name'])
+            job['state'] = 'failed'
+            job['error'] = str(e)
+        job['finished_at'] = time.time()
+        _save(job)
+
+def submit(name, fn, *args):
+    """Runs fn(*args) in the background inside an app context and returns its job record.
+
+    If a job with the same name is still queued or running, that job is returned
+    instead of starting another. fn's return value must be picklable.
+    """
+    with _submit_lock:
+        current = latest(name)
+        if is_active(current):
+            return current
+        job = {'id': uuid.uuid4().hex, 'name': name, 'state': 'queued', 'submitted_at': time.time(),
+               'started_at': None, 'finished_at': None, 'result': None, 'error': None}
+        _save(job)
+        cache.set_state(f'job-latest:{name}', job['id'], current_app.config['JOB_RESULT_TTL'])
+    _pool().submit(_run, current_app._get_current_object(), job, fn, args)
+    return job
+
+def describe(job):
+    """JSON-friendly copy of a job record with ISO timestamps."""
+    if job is None:
+        return None
+    described = dict(job)
+    for field in ('submitted_at', 'started_at', 'finished_at'):
+        if described.get(field) is not None:
+            described[field] = datetime.fromtimestamp(described[field]).isoformat(timespec='seconds')
+    return described
@@ -1,25 +1,50 @@
 # FILE: app/main/routes.py
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, abort, current_app
 from flask_login import login_user, logout_user, login_required, current_user
-from app import db
-from app.models import Product, Customer, AdminUser, Bill, BillItem
+from app import db, invoicing, identity, passwords, catalog, httpcache, database, transactions, cart as carts
+from app.models import Product, Customer, AdminUser, Bill
+from sqlalchemy import select
 
 main = Blueprint('main', __name__)
 
 # --- Storefront Routes ---
 
 @main.route('/')
+@httpcache.storefront_page()
+@database.read_only
 def home():
-    products = Product.query.order_by(Product.name).all()
-    return render_template('home.html', products=products)
+    return _catalog_page(catalog.Filters.from_args(request.args))
+
+@main.route('/category/<name>')
+@httpcache.storefront_page()
+@database.read_only
+def category(name):
+    return _catalog_page(catalog.Filters.from_args(request.args, category=name))
+
+def _catalog_page(filters):
+    page = catalog.search(filters, request.args.get('after'), current_app.config['CATALOG_PAGE_SIZE'])
+    args = {**filters.as_args(), **request.view_args}
+    if 'name' in request.view_args:
+        del args['category'] # already in the path
+    first_url = url_for(request.endpoint, **args) if request.args.get('after') else None
+    next_url = url_for(request.endpoint, **args, after=page.next_cursor) if page.has_next else None
+    return render_template('home.html', products=page.items, filters=filters, categories=catalog.categories(),
+                           first_url=first_url, next_url=next_url)
+
+def _stock_on_hand(id):
+    return db.session.scalar(select(Product.stock_on_hand).where(Product.id == id))
 
 @main.route('/product/<int:id>')
+@httpcache.storefront_page(validator=_stock_on_hand)
+@database.read_only
 def product_detail(id):
     product = Product.query.get_or_404(id)
     return render_template('product_detail.html', product=product)
 
 # --- Authentication Routes ---
 
+BUSY_MESSAGE = 'We are handling a lot of sign-ins right now. Please try again in a moment.'
+
 @main.route('/register', methods=['GET', 'POST'])
 def customer_register():
     if current_user.is_authenticated:
@@ -35,13 +60,18 @@ def customer_register():
             return redirect(url_for('main.customer_register'))
             
         new_customer = Customer(email=email, name=name)
-        new_customer.set_password(password)
+        try:
+            new_customer.set_password(password)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'danger')
+            return render_template('register.html'), 503
         db.session.add(new_customer)
         db.session.commit()
         
         # Log in the new customer immediately
         login_user(new_customer)
         session['user_type'] = 'customer'
+        carts.merge_on_login(new_customer.id)
         flash('Registration successful! Welcome.', 'success')
         return redirect(url_for('main.home'))
         
@@ -56,10 +86,16 @@ def customer_login():
         email = request.form.get('email')
         password = request.form.get('password')
         customer = Customer.query.filter_by(email=email).first()
-        
-        if customer and customer.check_password(password):
+        try:
+            authenticated = customer is not None and passwords.authenticate(customer, password)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'danger')
+            return render_template('customer_login.html'), 503
+
+        if authenticated:
             login_user(customer)
             session['user_type'] = 'customer'
+            carts.merge_on_login(customer.id)
             return redirect(url_for('main.home'))
         else:
             flash('Login failed. Please check your email and password.', 'danger')
@@ -75,8 +111,13 @@ def admin_login():
         username = request.form.get('username')
         password = request.form.get('password')
         admin = AdminUser.query.filter_by(username=username).first()
-        
-        if admin and admin.check_password(password):
+        try:
+            authenticated = admin is not None and passwords.authenticate(admin, password)
+        except passwords.HashingBusy:
+            flash(BUSY_MESSAGE, 'danger')
+            return render_template('login.html'), 503
+
+        if authenticated:
             login_user(admin)
             session['user_type'] = 'admin'
             return redirect(url_for('admin.dashboard'))
@@ -89,6 +130,7 @@ def admin_login():
 @main.route('/logout')
 @login_required
 def logout():
+    identity.forget(session.get('user_type'), current_user.id)
     logout_user()
     session.clear()
     flash('You have been logged out.', 'info')
@@ -98,57 +140,40 @@ def logout():
 
 @main.route('/cart/add/<int:id>', methods=['POST'])
 def add_to_cart(id):
-    product = Product.query.get_or_404(id)
+    product = carts.load_products([id]).get(id) or abort(404)
     quantity = int(request.form.get('quantity', 1))
-    
-    # Initialize cart in session if it doesn't exist
-    if 'cart' not in session:
-        session['cart'] = {}
-        
-    cart = session['cart']
-    product_id_str = str(product.id)
+    cart_id = carts.current_cart_id(create=True)
 
     # Add or update quantity
-    current_quantity = cart.get(product_id_str, 0)
+    current_quantity = carts.store().get_line(cart_id, product.id)
     new_quantity = current_quantity + quantity
     
     if new_quantity > product.stock:
         flash(f'Cannot add {quantity} units. Only {product.stock - current_quantity} more available.', 'danger')
     else:
-        cart[product_id_str] = new_quantity
+        carts.store().set_line(cart_id, product.id, new_quantity)
+        db.session.commit()
         flash(f'Added {quantity} x {product.name} to your cart.', 'success')
         
-    session.modified = True
     return redirect(request.referrer or url_for('main.home'))
 
 @main.route('/cart')
 def view_cart():
-    cart_items = []
-    total = 0
-    if 'cart' in session:
-        for product_id, quantity in session['cart'].items():
-            product = Product.query.get(product_id)
-            if product:
-                item_total = product.selling_price * quantity
-                cart_items.append({'product': product, 'quantity': quantity, 'total': item_total})
-                total += item_total
-                
+    cart_items, total = carts.resolve(carts.current_cart())
     return render_template('cart.html', cart_items=cart_items, total=total)
 
 @main.route('/cart/update/<int:id>', methods=['POST'])
 def update_cart(id):
     quantity = int(request.form.get('quantity', 0))
-    product_id_str = str(id)
+    cart_id = carts.current_cart_id()
 
-    if 'cart' in session:
-        cart = session['cart']
+    if cart_id:
+        carts.store().set_line(cart_id, id, quantity)
+        db.session.commit()
         if quantity > 0:
-            cart[product_id_str] = quantity
             flash('Cart updated.', 'success')
-        else: # If quantity is 0, remove the item
-            cart.pop(product_id_str, None)
+        else: # If quantity is 0, the line is removed
             flash('Item removed from cart.', 'success')
-        session.modified = True
 
     return redirect(url_for('main.view_cart'))
     
@@ -157,62 +182,33 @@ def update_cart(id):
 @main.route('/checkout', methods=['GET', 'POST'])
 @login_required
 def checkout():
-    if 'cart' not in session or not session['cart']:
+    cart = carts.current_cart()
+    if not cart:
         flash('Your cart is empty.', 'info')
         return redirect(url_for('main.home'))
 
-    # Prepare cart details for display
-    cart_items = []
-    subtotal = 0
-    for product_id, quantity in session['cart'].items():
-        product = Product.query.get(product_id)
-        if product:
-            item_total = product.selling_price * quantity
-            cart_items.append({'product': product, 'quantity': quantity, 'total': item_total})
-            subtotal += item_total
-
     if request.method == 'POST':
-        # Create a new Bill from the checkout form and cart
-        new_bill = Bill(
-            customer_id=current_user.id,
-            customer_name=request.form.get('name'),
-            customer_email=request.form.get('email'),
-            customer_address=request.form.get('address'),
-            customer_city=request.form.get('city'),
-            subtotal=subtotal,
-            final_amount=subtotal # Assuming no tax/discount from storefront for now
-        )
-        db.session.add(new_bill)
-        db.session.flush() # Get the new bill's ID
-
-        # Create BillItems and deduct stock
-        for item in cart_items:
-            product = item['product']
-            quantity_to_sell = item['quantity']
-
-            bill_item = BillItem(
-                bill_id=new_bill.id,
-                product_id=product.id,
-                product_name=product.name,
-                quantity=quantity_to_sell,
-                price_per_unit=product.selling_price,
-                cost_price_at_sale=product.cost_price
-            )
-            db.session.add(bill_item)
-            
-            # Deduct stock (same logic as admin panel)
-            for batch in sorted(product.batches, key=lambda b: b.date_added):
-                if quantity_to_sell > 0:
-                    sell_from_batch = min(quantity_to_sell, batch.quantity)
-                    batch.quantity -= sell_from_batch
-                    quantity_to_sell -= sell_from_batch
-        
-        db.session.commit()
-        
-        # Clear the cart and redirect to success page
-        session.pop('cart', None)
-        return redirect(url_for('main.order_success', bill_id=new_bill.id))
-        
+        customer = {'customer_id': current_user.id, 'customer_name': request.form.get('name'),
+                    'customer_email': request.form.get('email'), 'customer_address': request.form.get('address'),
+                    'customer_city': request.form.get('city')}
+        try:
+            # No tax or discount on the storefront; lines whose product was deleted are dropped, as on the cart page
+            bill_id, _ = invoicing.create_bill(cart.items(), customer, skip_missing=True)
+        except invoicing.InvoiceError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('main.view_cart'))
+
+        # Clear the cart and redirect to success page; the order is already placed, so ride out lock conflicts
+        cart_id = carts.current_cart_id()
+
+        def clear_cart():
+            carts.store().clear(cart_id)
+            db.session.commit()
+
+        transactions.run_with_retry(clear_cart)
+        return redirect(url_for('main.order_success', bill_id=bill_id))
+
+    cart_items, subtotal = carts.resolve(cart)
     return render_template('checkout.html', cart_items=cart_items, total=subtotal)
 
 @main.route('/order_success/<int:bill_id>')
@@ -234,6 +230,7 @@ def profile():
         user.address = request.form.get('address')
         user.city = request.form.get('city')
         db.session.commit()
+        identity.forget('customer', user.id)
         flash('Your profile has been updated.', 'success')
         return redirect(url_for('main.profile'))
 
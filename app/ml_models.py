@@ -1,65 +1,304 @@
 # FILE: app/ml_models.py
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timezone
+
+import numpy as np
 import pandas as pd
 from sklearn.linear_model import LinearRegression
-import joblib
+from sqlalchemy import text
+
+# Demand forecasting: one linear trend model per series, where a series is the
+# whole store ("total"), a product ("product:<id>") or a category
+# ("category:<name>").
+#
+# Trained models are stored as versioned artifact sets under a model directory:
+#
+#   <model_dir>/CURRENT              name of the live version
+#   <model_dir>/<version>/meta.json  series keys, training window, watermark
+#   <model_dir>/<version>/coef.npy   (n_series, 2) intercept and slope
+#   <model_dir>/<version>/predictions.npy  units over the default horizon,
+#                                          computed at train time
+#   <model_dir>/<version>/history_*.npy  daily units per series, for the next
+#                                        incremental run
+#
+# The .npy files are opened with mmap_mode='r', so loading a version costs next
+# to nothing and worker processes share the pages. get_artifacts() keeps the
+# live version loaded in process and only reopens it when CURRENT changes, so
+# serving a forecast never touches the database. Training is incremental:
+# only days from the stored watermark onwards are read from the database.
+#
+# A series is fitted on every day from its first sale to the watermark, with
+# 0 units on the days it sold nothing, so a product that sells now and then
+# is not forecast at its level on the days it did sell. A day without sales
+# is data too: when the watermark moves every series is refitted, so one that
+# has gone quiet trends down; otherwise only series with new sales are.
+
+TOTAL = 'total'
+KEEP_VERSIONS = 3
+# Below this many series a serial fit beats starting worker processes
+PARALLEL_MIN_SERIES = 5000
+
+logger = logging.getLogger(__name__)
+
+def product_key(product_id):
+    return f'product:{product_id}'
 
-# CORRECTED: Removed imports for sqlalchemy and flask
+def category_key(category):
+    return f'category:{category}'
+
+def sales_query(since=None):
+    """(SQL, parameters) of the units sold per product and store day, from `since` (a date, inclusive) onwards."""
+    query = (
+        "SELECT b.sale_date AS ds, bi.product_id, p.category, SUM(bi.quantity) AS y "
+        "FROM bill b JOIN bill_item bi ON b.id = bi.bill_id "
+        "LEFT OUTER JOIN product p ON p.id = bi.product_id "
+        + ("WHERE b.sale_date >= :since " if since is not None else "")
+        + "GROUP BY b.sale_date, bi.product_id, p.category"
+    )
+    return query, ({'since': since} if since is not None else {})
+
+def get_sales_data(engine, since=None): # CORRECTED: Accepts the database engine as a parameter
+    """Fetches units sold per product and day, from `since` (a date, inclusive) onwards.
+
+    A full scan of the sales tables without `since`; callers pass the read
+    replica's engine when there is one.
+    """
+    query, params = sales_query(since)
+    df = pd.read_sql(text(query), engine, params=params)
 
-def get_sales_data(engine): # CORRECTED: Accepts the database engine as a parameter
-    """Fetches sales data and aggregates it by day."""
-    # CORRECTED: Uses the provided engine
-    query = "SELECT b.date, bi.quantity FROM bill b JOIN bill_item bi ON b.id = bi.bill_id;"
-    df = pd.read_sql(query, engine)
-    
     if df.empty:
-        return pd.DataFrame(columns=['ds', 'y'])
-
-    df['date'] = pd.to_datetime(df['date'])
-    daily_sales = df.groupby(df['date'].dt.date)['quantity'].sum().reset_index()
-    daily_sales.columns = ['ds', 'y'] 
-    return daily_sales
-
-def train_and_save_demand_model(engine): # CORRECTED: Accepts the engine
-    """Trains a simple regression model and saves it to a file."""
-    df = get_sales_data(engine) # CORRECTED: Passes the engine along
-    
-    if len(df) < 2: 
-        print("Not enough data to train a demand model.")
+        return pd.DataFrame(columns=['ds', 'product_id', 'category', 'y'])
+
+    # Already a date on MySQL; SQLite returns ISO strings
+    if not isinstance(df['ds'].iloc[0], date):
+        df['ds'] = pd.to_datetime(df['ds']).dt.date
+    df['category'] = df['category'].fillna('Uncategorized')
+    return df
+
+def build_series(daily, origin):
+    """Turns per-product daily rows into (series, day, units) points for every series.
+
+    day is the number of days since origin. Only days with sales get a point;
+    _daily_units() fills in the rest.
+    """
+    day = (pd.to_datetime(daily['ds']) - pd.Timestamp(origin)).dt.days
+    frame = daily.assign(day=day)
+    parts = [frame.groupby('day', as_index=False)['y'].sum().assign(series=TOTAL)]
+    by_product = frame.dropna(subset=['product_id'])
+    if not by_product.empty:
+        grouped = by_product.groupby(['product_id', 'day'], as_index=False)['y'].sum()
+        parts.append(grouped.assign(series=grouped['product_id'].astype(int).map(product_key)).drop(columns='product_id'))
+    grouped = frame.groupby(['category', 'day'], as_index=False)['y'].sum()
+    parts.append(grouped.assign(series=grouped['category'].map(category_key)).drop(columns='category'))
+    points = pd.concat(parts, ignore_index=True).rename(columns={'y': 'units'})
+    return points[['series', 'day', 'units']].astype({'day': 'int32', 'units': 'float64'})
+
+def _daily_units(group, end):
+    # (days, units) of one series from its first sale to day `end`, 0 on days without sales
+    days = np.arange(group['day'].iloc[0], end + 1)
+    return days, group.set_index('day')['units'].reindex(days, fill_value=0).to_numpy(dtype='float64')
+
+def fit_series(batch):
+    """Fits one LinearRegression per series. Runs inside worker processes.
+
+    batch is a list of (key, days, units); returns a list of (key, intercept, slope).
+    """
+    fitted = []
+    for key, days, units in batch:
+        if len(days) < 2:
+            # One point gives no trend; forecast a flat line at that level
+            fitted.append((key, float(np.mean(units)) if len(units) else 0.0, 0.0))
+            continue
+        model = LinearRegression()
+        model.fit(np.asarray(days, dtype=float).reshape(-1, 1), np.asarray(units, dtype=float))
+        fitted.append((key, float(model.intercept_), float(model.coef_[0])))
+    return fitted
+
+def _fit_all(work, workers):
+    if workers <= 1 or len(work) < PARALLEL_MIN_SERIES:
+        return fit_series(work)
+    size = -(-len(work) // (workers * 4))
+    batches = [work[i:i + size] for i in range(0, len(work), size)]
+    # spawn, not fork: the web process has threads and open database connections
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        return [row for result in pool.map(fit_series, batches) for row in result]
+
+def _forecast(coef, start, horizon):
+    # Sum of the predicted daily units over days start..start+horizon-1, per row of coef
+    future = np.arange(start, start + horizon, dtype=float)
+    totals = (coef[:, :1] + coef[:, 1:] * future).sum(axis=1)
+    # Same clipping as before: a series never forecasts negative demand
+    return np.maximum(0, totals)
+
+class ForecastArtifacts:
+    """A loaded (memory-mapped) model version."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.version = self.meta['version']
+        self.keys = self.meta['keys']
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.origin = date.fromisoformat(self.meta['origin'])
+        self.watermark = date.fromisoformat(self.meta['watermark'])
+        self.coef = np.load(os.path.join(path, 'coef.npy'), mmap_mode='r')
+        self.history_series = np.load(os.path.join(path, 'history_series.npy'), mmap_mode='r')
+        self.history_day = np.load(os.path.join(path, 'history_day.npy'), mmap_mode='r')
+        self.history_units = np.load(os.path.join(path, 'history_units.npy'), mmap_mode='r')
+        # Versions trained before predictions were precomputed have neither
+        self.horizon = self.meta.get('horizon')
+        predictions = os.path.join(path, 'predictions.npy')
+        self.predictions = np.load(predictions, mmap_mode='r') if os.path.exists(predictions) else None
+
+    def history(self):
+        return pd.DataFrame({
+            'series': np.asarray(self.keys, dtype=object)[np.asarray(self.history_series)],
+            'day': np.asarray(self.history_day),
+            'units': np.asarray(self.history_units),
+        })
+
+    def predict(self, keys=None, horizon=30):
+        """Total predicted units over the `horizon` days after the watermark, per series key."""
+        keys = self.keys if keys is None else [k for k in keys if k in self.index]
+        if not keys:
+            return {}
+        rows = np.array([self.index[k] for k in keys])
+        if self.predictions is not None and horizon == self.horizon:
+            totals = self.predictions[rows]
+        else:
+            totals = _forecast(np.asarray(self.coef[rows]), (self.watermark - self.origin).days + 1, horizon)
+        return {key: int(total) for key, total in zip(keys, totals)}
+
+def current_version(model_dir):
+    try:
+        with open(os.path.join(model_dir, 'CURRENT')) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def load_artifacts(model_dir, version=None):
+    """Opens the given (default: live) model version, or returns None if there is none."""
+    version = version or current_version(model_dir)
+    if not version or not os.path.isdir(os.path.join(model_dir, version)):
         return None
+    return ForecastArtifacts(os.path.join(model_dir, version))
+
+_warm = {} # model_dir -> (CURRENT mtime, ForecastArtifacts)
+_warm_lock = threading.Lock()
+
+def get_artifacts(model_dir):
+    """The live version, kept loaded in this process; None if nothing has been trained yet.
 
-    df['ds'] = pd.to_datetime(df['ds'])
-    df['time_index'] = (df['ds'] - df['ds'].min()).dt.days
-    
-    X = df[['time_index']]
-    y = df['y']
-    
-    model = LinearRegression()
-    model.fit(X, y)
-    
-    joblib.dump(model, 'demand_model.pkl')
-    print("Demand model trained and saved as demand_model.pkl")
-    return model
-
-def predict_future_demand(engine): # CORRECTED: Accepts the engine
-    """Loads the model and predicts demand for the next 30 days."""
+    Costs one stat() of the CURRENT pointer per call. A new version published by
+    any process is picked up on the next call.
+    """
     try:
-        model = joblib.load('demand_model.pkl')
+        stamp = os.stat(os.path.join(model_dir, 'CURRENT')).st_mtime_ns
     except FileNotFoundError:
-        print("Model not found. Training a new one.")
-        model = train_and_save_demand_model(engine) # CORRECTED: Passes the engine
-        if model is None:
-            return "Not enough data to forecast."
+        return None
+    warm = _warm.get(model_dir)
+    if warm is not None and warm[0] == stamp:
+        return warm[1]
+    with _warm_lock:
+        artifacts = load_artifacts(model_dir)
+        _warm[model_dir] = (stamp, artifacts)
+    return artifacts
 
-    df = get_sales_data(engine) # CORRECTED: Passes the engine
-    if df.empty:
-        last_time_index = -1
+def _save_artifacts(model_dir, meta, coef, predictions, history):
+    version = meta['version']
+    path = os.path.join(model_dir, version)
+    os.makedirs(path)
+    index = {key: i for i, key in enumerate(meta['keys'])}
+    np.save(os.path.join(path, 'coef.npy'), coef)
+    np.save(os.path.join(path, 'predictions.npy'), predictions)
+    np.save(os.path.join(path, 'history_series.npy'), history['series'].map(index).to_numpy(dtype='int32'))
+    np.save(os.path.join(path, 'history_day.npy'), history['day'].to_numpy(dtype='int32'))
+    np.save(os.path.join(path, 'history_units.npy'), history['units'].to_numpy(dtype='float64'))
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    # Switch the live version atomically, then drop old ones
+    pointer = os.path.join(model_dir, 'CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(model_dir, 'CURRENT'))
+    versions = sorted(d for d in os.listdir(model_dir) if os.path.isdir(os.path.join(model_dir, d)))
+    for old in versions[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(model_dir, old), ignore_errors=True)
+
+def train_and_save_demand_model(engine, model_dir, workers=1, full=False, horizon=30): # CORRECTED: Accepts the engine
+    """Trains or updates the per-series models and publishes them as a new version.
+
+    Unless full is set, only sales from the previous watermark day onwards are
+    read and only the series they touch are refitted. Predictions over
+    `horizon` days are stored with the models. Returns the new
+    ForecastArtifacts, or None if there is not enough data.
+    """
+    os.makedirs(model_dir, exist_ok=True)
+    previous = None if full else load_artifacts(model_dir)
+
+    if previous is None:
+        daily = get_sales_data(engine)
+        if daily.empty or daily['ds'].nunique() < 2:
+            logger.info('Not enough data to train a demand model.')
+            return None
+        origin = min(daily['ds'])
+        history = build_series(daily, origin)
+        touched = set(history['series'])
+        coefficients = {}
     else:
-        df['ds'] = pd.to_datetime(df['ds'])
-        last_time_index = (df['ds'].max() - df['ds'].min()).days
-
-    future_indices = pd.DataFrame({'time_index': range(last_time_index + 1, last_time_index + 31)})
-    
-    predictions = model.predict(future_indices)
-    
-    total_predicted_demand = max(0, int(sum(predictions)))
-    return total_predicted_demand
\ No newline at end of file
+        # The watermark day may have been incomplete last time, so it is read again
+        origin = previous.origin
+        daily = get_sales_data(engine, since=previous.watermark)
+        new_points = build_series(daily, origin) if not daily.empty else pd.DataFrame(columns=['series', 'day', 'units'])
+        kept = previous.history()
+        kept = kept[kept['day'] < (previous.watermark - origin).days]
+        history = pd.concat([kept, new_points], ignore_index=True)
+        touched = set(new_points['series'])
+        coefficients = {key: tuple(previous.coef[i]) for i, key in enumerate(previous.keys)}
+
+    watermark = max(daily['ds']) if not daily.empty else previous.watermark
+    if previous is not None:
+        watermark = max(watermark, previous.watermark)
+        if watermark > previous.watermark:
+            touched = set(history['series']) # Every series has new days, with or without sales
+
+    history = history.sort_values(['series', 'day'], ignore_index=True)
+    end = (watermark - origin).days
+    work = [(key, *_daily_units(group, end))
+            for key, group in history[history['series'].isin(touched)].groupby('series', sort=False)]
+    for key, intercept, slope in _fit_all(work, workers):
+        coefficients[key] = (intercept, slope)
+
+    keys = sorted(coefficients)
+    meta = {
+        'version': datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S%fZ'),
+        'trained_at': datetime.now(timezone.utc).isoformat(),
+        'origin': origin.isoformat(),
+        'watermark': watermark.isoformat(),
+        'keys': keys,
+        'horizon': horizon,
+        'series_refitted': len(work),
+        'previous_version': previous.version if previous is not None else None,
+    }
+    coef = np.array([coefficients[key] for key in keys], dtype='float64').reshape(-1, 2)
+    predictions = _forecast(coef, (watermark - origin).days + 1, horizon)
+    _save_artifacts(model_dir, meta, coef, predictions, history)
+    logger.info('Demand models trained: %d of %d series refitted, version %s', len(work), len(keys), meta['version'])
+    return load_artifacts(model_dir, meta['version'])
+
+def predict_future_demand(model_dir, horizon=30):
+    """Predicted total store demand for the next `horizon` days, or None if no model has been trained.
+
+    Served from the warm, precomputed model; training is left to the caller.
+    """
+    artifacts = get_artifacts(model_dir)
+    if artifacts is None:
+        return None
+    return artifacts.predict([TOTAL], horizon).get(TOTAL, 0)
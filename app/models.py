@@ -1,19 +1,31 @@
-from . import db, login_manager
+from . import db, login_manager, identity, passwords, storetime
 from sqlalchemy.sql import func
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask import session
 
 # The user_loader checks whether we are loading an admin or a customer
+# (served from the per-process identity cache, see app/identity.py)
 @login_manager.user_loader
 def load_user(user_id):
     user_type = session.get('user_type')
     if user_type == 'admin':
-        return AdminUser.query.get(int(user_id))
+        return identity.load('admin', AdminUser, int(user_id))
     elif user_type == 'customer':
-        return Customer.query.get(int(user_id))
+        return identity.load('customer', Customer, int(user_id))
     return None
 
+def new_row_version(context):
+    # The id of a new row_version row, taken once per transaction and stamped
+    # on every row it writes. The insert holds no lock past the statement, so
+    # versions can commit out of order; app/pos.py allows for that.
+    conn = context.connection
+    transaction = conn.get_transaction()
+    taken = conn.info.get('row_version')
+    if taken is None or taken[0] is not transaction:
+        taken = (transaction, conn.execute(RowVersion.__table__.insert()).inserted_primary_key[0])
+        conn.info['row_version'] = taken
+    return taken[1]
+
 # Admin user model
 class AdminUser(db.Model, UserMixin):
     __tablename__ = 'admin_user'
@@ -22,10 +34,10 @@ class AdminUser(db.Model, UserMixin):
     password_hash = db.Column(db.String(256), nullable=False)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check(self.password_hash, password)
 
 # Customer user model
 class Customer(db.Model, UserMixin):
@@ -38,10 +50,10 @@ class Customer(db.Model, UserMixin):
     bills = db.relationship('Bill', backref='customer', lazy=True)
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = passwords.hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return passwords.check(self.password_hash, password)
 
 # Product model
 class Product(db.Model):
@@ -64,13 +76,47 @@ class Product(db.Model):
     # Added relationship to Batch for the 'stock' property to work correctly
     batches = db.relationship('Batch', backref='product', lazy=True, cascade="all, delete-orphan")
 
+    # Running total of all batch quantities, kept in step by app/inventory.py
+    # so that reading stock never has to load the batch rows.
+    stock_on_hand = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+    reorder_point = db.relationship('ReorderPoint', backref='product', uselist=False, cascade="all, delete-orphan")
+
+    # Set on every INSERT and UPDATE of the row, including the bulk and counter
+    # UPDATEs, so billing terminals can fetch just what changed (see app/pos.py)
+    row_version = db.Column(db.BigInteger, nullable=False, default=new_row_version, onupdate=new_row_version,
+                            server_default='0')
+
+    # Storefront listings walk these in name order (see app/catalog.py). Text
+    # search uses a FULLTEXT index on MySQL and the product_search_token table
+    # everywhere else.
+    __table_args__ = (
+        db.Index('ix_product_name', 'name'),
+        db.Index('ix_product_category_name', 'category', 'name'),
+        db.Index('ix_product_fulltext', 'name', 'description', mysql_prefix='FULLTEXT').ddl_if(dialect='mysql'),
+        db.Index('ix_product_row_version', 'row_version'),
+    )
+
     def __repr__(self):
         return f'<Product {self.name}>'
 
     @property
     def stock(self):
-        # This property calculates the total stock from all batches for this product
-        return sum(batch.quantity for batch in self.batches)
+        # Total stock across all batches, read from the maintained counter
+        return self.stock_on_hand
+
+# Inverted index of product name and description words, for text search where
+# the database has no FULLTEXT index. Maintained by app/catalog.py.
+class ProductSearchToken(db.Model):
+    __tablename__ = 'product_search_token'
+    token = db.Column(db.String(50), primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True, index=True)
+
+# Deleted products, so billing terminals syncing changes drop them too (see app/pos.py)
+class ProductTombstone(db.Model):
+    __tablename__ = 'product_tombstone'
+    product_id = db.Column(db.Integer, primary_key=True) # Not a foreign key; the product is gone
+    row_version = db.Column(db.BigInteger, nullable=False, default=new_row_version, onupdate=new_row_version, index=True)
 
 # Batch model for inventory tracking
 class Batch(db.Model):
@@ -79,6 +125,13 @@ class Batch(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     date_added = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
+    # FIFO lookups read a product's open batches oldest-first (see app/fifo.py).
+    # Where the database supports partial indexes, exhausted batches are left out.
+    __table_args__ = (
+        db.Index('ix_batch_fifo', 'product_id', 'date_added',
+                 sqlite_where=db.text('quantity > 0'), postgresql_where=db.text('quantity > 0')),
+    )
+
 # Billing model
 class Bill(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -87,13 +140,26 @@ class Bill(db.Model):
     customer_email = db.Column(db.String(150), nullable=True)
     customer_address = db.Column(db.Text, nullable=True)
     customer_city = db.Column(db.String(100), nullable=True)
+    # Set by billing terminals so a bill queued offline and sent twice is only recorded once
+    client_ref = db.Column(db.String(64), nullable=True, unique=True)
     date = db.Column(db.DateTime(timezone=True), server_default=func.now())
-    subtotal = db.Column(db.Float, nullable=False)
-    tax_percentage = db.Column(db.Float, nullable=False, default=0)
-    discount_amount = db.Column(db.Float, nullable=False, default=0)
-    final_amount = db.Column(db.Float, nullable=False)
+    # The store's calendar day of the sale (see app/storetime.py); reports filter and group on it
+    sale_date = db.Column(db.Date, nullable=False, default=storetime.today)
+    # Amounts are priced and rounded by app/invoicing.py
+    subtotal = db.Column(db.Numeric(12, 2), nullable=False)
+    tax_percentage = db.Column(db.Numeric(5, 2), nullable=False, default=0)
+    discount_amount = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    final_amount = db.Column(db.Numeric(12, 2), nullable=False)
     items = db.relationship('BillItem', backref='bill', lazy=True, cascade="all, delete-orphan")
 
+    # A customer's order history, day-range reads (forecast extract, rollup
+    # rebuild) and the per-email order counts; see `flask index-advisor`
+    __table_args__ = (
+        db.Index('ix_bill_customer_date', 'customer_id', 'date'),
+        db.Index('ix_bill_sale_date', 'sale_date'),
+        db.Index('ix_bill_customer_email', 'customer_email'),
+    )
+
 # Items associated with a bill
 class BillItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -101,5 +167,112 @@ class BillItem(db.Model):
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=True) # Nullable in case product is deleted
     product_name = db.Column(db.String(100), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    price_per_unit = db.Column(db.Float, nullable=False)
-    cost_price_at_sale = db.Column(db.Float, nullable=False, default=0)
+    price_per_unit = db.Column(db.Numeric(10, 2), nullable=False)
+    cost_price_at_sale = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    consumed_batches = db.relationship('BillItemBatch', backref='bill_item', lazy=True, cascade="all, delete-orphan")
+
+    # A bill's lines (bill detail, outbox handler, joins from bill), and a
+    # product's sales, with product_name for the lines of deleted products
+    __table_args__ = (
+        db.Index('ix_bill_item_bill_product', 'bill_id', 'product_id'),
+        db.Index('ix_bill_item_product_name', 'product_id', 'product_name'),
+    )
+
+# Which batches each bill item was served from, written by the FIFO allocator
+class BillItemBatch(db.Model):
+    __tablename__ = 'bill_item_batch'
+    id = db.Column(db.Integer, primary_key=True)
+    bill_item_id = db.Column(db.Integer, db.ForeignKey('bill_item.id'), nullable=False, index=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('batch.id', ondelete='SET NULL'), nullable=True) # Nullable in case the batch is deleted
+    quantity = db.Column(db.Integer, nullable=False)
+
+
+# Per-day sales totals for each product, maintained by app/rollups.py
+class DailySalesRollup(db.Model):
+    __tablename__ = 'daily_sales_rollup'
+    id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, nullable=True) # Not a foreign key so history survives product deletion
+    product_name = db.Column(db.String(100), nullable=False)
+    category = db.Column(db.String(100), nullable=False, default='Uncategorized')
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    cost = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('day', 'product_id', 'category', name='uq_daily_sales_rollup_key'),
+        # Sales velocity reads one product's recent days (see app/reorder.py)
+        db.Index('ix_daily_sales_rollup_product_day', 'product_id', 'day'),
+    )
+
+# Number of bills per customer email, for the new vs. returning customer chart
+class CustomerOrderCount(db.Model):
+    __tablename__ = 'customer_order_count'
+    email = db.Column(db.String(150), primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+
+# Sales velocity, days of cover and reorder point per product, maintained by app/reorder.py
+class ReorderPoint(db.Model):
+    __tablename__ = 'reorder_point'
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    units_sold = db.Column(db.Integer, nullable=False, default=0) # Over the velocity window
+    velocity = db.Column(db.Float, nullable=False, default=0) # Units per day
+    stock_on_hand = db.Column(db.Integer, nullable=False, default=0)
+    days_of_cover = db.Column(db.Float, nullable=True) # Null when the product is not selling
+    reorder_level = db.Column(db.Integer, nullable=False, default=0)
+    at_risk = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, nullable=False)
+
+    # The at-risk listing reads the products running out soonest first
+    __table_args__ = (
+        db.Index('ix_reorder_point_risk', 'at_risk', 'days_of_cover', 'product_id'),
+    )
+
+# Server-side shopping carts for the "database" cart store (see app/cart.py)
+class Cart(db.Model):
+    __tablename__ = 'cart'
+    id = db.Column(db.String(64), primary_key=True) # Random token, or customer:<id> for a signed-in customer
+    updated_at = db.Column(db.DateTime, nullable=False, index=True) # Carts untouched for CART_TTL_DAYS are purged
+    lines = db.relationship('CartLine', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+
+class CartLine(db.Model):
+    __tablename__ = 'cart_line'
+    cart_id = db.Column(db.String(64), db.ForeignKey('cart.id', ondelete='CASCADE'), primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True) # Not a foreign key; lines of deleted products are skipped when pricing
+    quantity = db.Column(db.Integer, nullable=False)
+
+# Result cache versions when there is no shared cache backend (see app/cache.py)
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+    namespace = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False)
+    changed_at = db.Column(db.Float, nullable=False) # Unix time of the last bump
+
+# Row versions handed out to writing transactions (see new_row_version), with
+# the database's time of issue. Pruned by `flask purge-row-versions`.
+class RowVersion(db.Model):
+    __tablename__ = 'row_version'
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    issued_at = db.Column(db.DateTime, nullable=False, server_default=func.now())
+
+# Work that follows a committed change (e.g. a new bill), written in the same
+# transaction and handled afterwards by app/outbox.py
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_event'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)
+    key = db.Column(db.String(150), nullable=False, unique=True) # Idempotency key, e.g. bill_created:<bill id>
+    payload = db.Column(db.Text, nullable=False) # JSON
+    state = db.Column(db.String(10), nullable=False, default='pending') # pending, done or failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False) # Not picked up before this: retry backoff or a worker's claim
+    claimed_by = db.Column(db.String(32), nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False)
+    processed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    # Workers poll for pending events that are due
+    __table_args__ = (
+        db.Index('ix_outbox_event_due', 'state', 'available_at'),
+    )
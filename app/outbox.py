@@ -0,0 +1,232 @@
+# FILE: app/outbox.py
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import delete, event, func, select, update
+from app import db, cache, rollups, reorder
+from app.models import OutboxEvent, Bill, BillItem, Product
+
+# Transactional outbox for the work that follows a committed change but does
+# not have to hold up the request that made it.
+#
+# publish() adds an event row in the caller's transaction, so the event exists
+# exactly when the change committed. Worker threads (OUTBOX_WORKERS per
+# process, started by the first request; or `flask process-outbox` on its
+# own) claim due events in batches and run the handler for each one's kind.
+# The handlers' writes and the events' "done" marks commit together, and the
+# marks only succeed while the worker still holds its claim, so an event whose
+# claim expired and was taken over by another worker is never applied twice.
+#
+# A batch whose handlers fail is retried one event at a time; a failing event
+# is retried with exponential backoff, up to OUTBOX_MAX_ATTEMPTS, then marked
+# failed and logged.
+
+HANDLERS = {} # kind -> (fn, cache namespaces to bump after it commits)
+
+def handler(kind, invalidates=()):
+    """Registers fn(payloads) as the handler for events of this kind.
+
+    The handler gets the payloads of every claimed event of its kind at once,
+    so it can do their work in a few set-based statements.
+    """
+    def register(fn):
+        HANDLERS[kind] = (fn, tuple(invalidates))
+        return fn
+    return register
+
+def publish(kind, payload, key):
+    """Adds an event to the current transaction. `key` is unique across all events."""
+    now = datetime.now()
+    db.session.add(OutboxEvent(kind=kind, key=key, payload=json.dumps(payload), state='pending', attempts=0,
+                               available_at=now, created_at=now))
+    db.session.info['outbox_published'] = True
+
+# --- Processing ---
+
+def _claim(limit):
+    # Claims up to `limit` due events by pushing them OUTBOX_LEASE_SECONDS into the
+    # future under a fresh token; a worker that dies leaves them due again after that
+    config = current_app.config
+    now = datetime.now()
+    token = uuid.uuid4().hex
+    due = select(OutboxEvent.id).where(OutboxEvent.state == 'pending', OutboxEvent.available_at <= now) \
+        .order_by(OutboxEvent.id).limit(limit)
+    ids = db.session.scalars(due).all()
+    if not ids:
+        db.session.rollback()
+        return token, []
+    db.session.execute(update(OutboxEvent).where(
+        OutboxEvent.id.in_(ids), OutboxEvent.state == 'pending', OutboxEvent.available_at <= now
+    ).values(claimed_by=token, attempts=OutboxEvent.attempts + 1,
+             available_at=now + timedelta(seconds=config['OUTBOX_LEASE_SECONDS'])))
+    db.session.commit()
+    claimed = db.session.execute(select(OutboxEvent.id, OutboxEvent.kind, OutboxEvent.payload, OutboxEvent.attempts)
+                                 .where(OutboxEvent.claimed_by == token).order_by(OutboxEvent.id)).all()
+    db.session.rollback()
+    return token, claimed
+
+def _handle(claimed, token):
+    # Runs the handlers of the claimed events and marks them done, all in one transaction
+    by_kind = {}
+    for row in claimed:
+        by_kind.setdefault(row.kind, []).append(json.loads(row.payload))
+    invalidates = set()
+    for kind, payloads in by_kind.items():
+        fn, namespaces = HANDLERS[kind]
+        fn(payloads)
+        invalidates.update(namespaces)
+    ids = [row.id for row in claimed]
+    done = db.session.execute(update(OutboxEvent).where(
+        OutboxEvent.id.in_(ids), OutboxEvent.claimed_by == token, OutboxEvent.state == 'pending'
+    ).values(state='done', processed_at=datetime.now(), last_error=None))
+    if done.rowcount != len(ids):
+        # Our claim expired and another worker has the events; drop what the handlers did
+        db.session.rollback()
+        return
+    db.session.commit()
+    if invalidates:
+        cache.bump(*sorted(invalidates))
+
+def _fail(claimed, token, error):
+    config = current_app.config
+    if claimed.attempts >= config['OUTBOX_MAX_ATTEMPTS']:
+        current_app.logger.error('Outbox event %s (%s) failed for good after %d attempts: %s',
+                                 claimed.id, claimed.kind, claimed.attempts, error)
+        values = {'state': 'failed'}
+    else:
+        current_app.logger.warning('Outbox event %s (%s) failed, attempt %d: %s',
+                                   claimed.id, claimed.kind, claimed.attempts, error)
+        backoff = config['OUTBOX_RETRY_SECONDS'] * 2 ** (claimed.attempts - 1)
+        values = {'available_at': datetime.now() + timedelta(seconds=random.uniform(backoff / 2, backoff))}
+    db.session.execute(update(OutboxEvent).where(
+        OutboxEvent.id == claimed.id, OutboxEvent.claimed_by == token, OutboxEvent.state == 'pending'
+    ).values(last_error=str(error)[:2000], **values))
+    db.session.commit()
+
+def process_pending(limit=None):
+    """Claims and handles one batch of due events. Returns how many were claimed."""
+    token, claimed = _claim(limit or current_app.config['OUTBOX_BATCH_SIZE'])
+    if not claimed:
+        return 0
+    try:
+        _handle(claimed, token)
+    except Exception as e:
+        db.session.rollback()
+        if len(claimed) == 1:
+            _fail(claimed[0], token, e)
+        else:
+            # Find the culprit: one transaction per event, so the others still go through
+            for row in claimed:
+                try:
+                    _handle([row], token)
+                except Exception as e:
+                    db.session.rollback()
+                    _fail(row, token, e)
+    return len(claimed)
+
+def drain():
+    """Handles due events until there are none left. Returns how many were claimed."""
+    total = 0
+    while True:
+        claimed = process_pending()
+        if not claimed:
+            return total
+        total += claimed
+
+def purge(older_than_days=None):
+    """Deletes events handled more than OUTBOX_RETENTION_DAYS ago. Returns how many."""
+    days = current_app.config['OUTBOX_RETENTION_DAYS'] if older_than_days is None else older_than_days
+    result = db.session.execute(delete(OutboxEvent).where(
+        OutboxEvent.state == 'done', OutboxEvent.processed_at < datetime.now() - timedelta(days=days)))
+    db.session.commit()
+    return result.rowcount
+
+def retry_failed():
+    """Puts failed events back in the queue with a fresh set of attempts. Returns how many."""
+    result = db.session.execute(update(OutboxEvent).where(OutboxEvent.state == 'failed')
+                                .values(state='pending', attempts=0, available_at=datetime.now()))
+    db.session.commit()
+    return result.rowcount
+
+def counts():
+    """{state: number of events}."""
+    return dict(db.session.execute(select(OutboxEvent.state, func.count()).group_by(OutboxEvent.state)).all())
+
+# --- Workers ---
+
+_wake = threading.Event()
+_start_lock = threading.Lock()
+_started_pid = None
+_listening = False
+
+def wake():
+    """Tells idle workers to look for events now rather than at their next poll."""
+    _wake.set()
+
+def run_worker(app, stop=None):
+    """Handles events as they arrive until `stop` (a threading.Event) is set."""
+    while stop is None or not stop.is_set():
+        if _wake.wait(app.config['OUTBOX_POLL_SECONDS']):
+            # Let events from a burst of requests gather into one batch
+            time.sleep(app.config['OUTBOX_BATCH_DELAY_SECONDS'])
+        _wake.clear()
+        with app.app_context():
+            try:
+                drain()
+            except Exception:
+                app.logger.exception('Outbox worker failed; retrying at the next poll')
+            finally:
+                db.session.remove()
+
+def start(app):
+    """Starts this process's worker threads, once (again after a fork)."""
+    global _started_pid
+    if _started_pid == os.getpid() or not app.config['OUTBOX_WORKERS']:
+        return
+    with _start_lock:
+        if _started_pid == os.getpid():
+            return
+        for i in range(app.config['OUTBOX_WORKERS']):
+            threading.Thread(target=run_worker, args=(app,), name=f'outbox-{i}', daemon=True).start()
+        _started_pid = os.getpid()
+    wake() # Events left over from before a restart
+
+def _after_commit(session):
+    if session.info.pop('outbox_published', False):
+        wake()
+
+def _after_rollback(session):
+    session.info.pop('outbox_published', None)
+
+def init_app(app):
+    global _listening
+    if not _listening:
+        event.listen(db.session, 'after_commit', _after_commit)
+        event.listen(db.session, 'after_rollback', _after_rollback)
+        _listening = True
+    app.before_request(lambda: start(app))
+
+# --- Handlers ---
+
+def bill_created(bill_id):
+    """Queues the post-sale bookkeeping of a bill written in the current transaction."""
+    publish('bill_created', {'bill_id': bill_id}, key=f'bill_created:{bill_id}')
+
+@handler('bill_created', invalidates=('sales',))
+def finalize_bills(payloads):
+    # Dashboard rollups and reorder points; the bills, their items and the
+    # stock deduction were committed by the requests
+    ids = [payload['bill_id'] for payload in payloads]
+    bills = db.session.execute(select(Bill.id, Bill.sale_date, Bill.customer_email).where(Bill.id.in_(ids))).all()
+    items = db.session.execute(
+        select(BillItem.bill_id, BillItem.product_id, BillItem.product_name, BillItem.quantity,
+               BillItem.price_per_unit, BillItem.cost_price_at_sale, Product.category)
+        .outerjoin(Product, BillItem.product_id == Product.id).where(BillItem.bill_id.in_(ids))
+    ).all()
+    rollups.record_bills(bills, items)
+    reorder.refresh([item.product_id for item in items if item.product_id is not None])
@@ -0,0 +1,83 @@
+# FILE: app/pagination.py
+import base64
+import json
+from datetime import date, datetime
+from flask import current_app, request
+from sqlalchemy import and_, or_
+
+# Keyset (seek) pagination: each page continues after the sort key of the last
+# row of the previous page, so the database seeks straight to it through the
+# index instead of counting past OFFSET rows. Cost per page does not depend on
+# how deep into the table the page is.
+
+class Page:
+    def __init__(self, items, next_cursor, per_page):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.per_page = per_page
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+def _decode_value(python_type, value):
+    # Raises TypeError or ValueError when the value doesn't fit the column
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    if python_type is float and type(value) is int:
+        return float(value)
+    if type(value) is not python_type:
+        raise TypeError(f'expected {python_type.__name__}, got {type(value).__name__}')
+    return value
+
+def decode_cursor(cursor, columns):
+    """Turns a cursor back into typed sort key values, or None if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except ValueError:
+        return None
+    if not isinstance(values, list) or len(values) != len(columns):
+        return None
+    try:
+        return [_decode_value(column.type.python_type, value) for column, value in zip(columns, values)]
+    except (TypeError, ValueError):
+        return None
+
+def _after(columns, values, descending):
+    # (a, b) > (x, y) spelled out as a > x OR (a = x AND b > y), which every
+    # backend can turn into an index range scan
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        step = column < values[i] if descending else column > values[i]
+        clauses.append(and_(*equal, step))
+    return or_(*clauses)
+
+def page_size():
+    """Page size from ?per_page=, clamped to the configured maximum."""
+    default = current_app.config['ADMIN_PAGE_SIZE']
+    requested = request.args.get('per_page', default, type=int)
+    return max(1, min(requested, current_app.config['ADMIN_MAX_PAGE_SIZE']))
+
+def paginate(query, columns, cursor=None, per_page=None, descending=False):
+    """Returns one Page of query ordered by columns (the last one must be unique, e.g. the id)."""
+    per_page = per_page or page_size()
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        if values is not None:
+            query = query.filter(_after(columns, values, descending))
+    ordering = [c.desc() for c in columns] if descending else list(columns)
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor([getattr(rows[-1], c.key) for c in columns])
+    return Page(rows, next_cursor, per_page)
@@ -0,0 +1,101 @@
+# FILE: app/passwords.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import db
+
+# Password hashing with a configurable cost (PASSWORD_HASH_METHOD, in
+# werkzeug's format, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000").
+#
+# Hashes are computed on a bounded thread pool rather than on the request
+# thread. hashlib's scrypt and pbkdf2 release the GIL, so the pool's threads
+# run on separate cores. Both limits are per worker process:
+# PASSWORD_HASH_WORKERS caps the hashes one process computes at once (the
+# deployment's total is that times the number of processes), and when more
+# than PASSWORD_HASH_QUEUE hashes are waiting in a process, new ones fail fast
+# with HashingBusy instead of piling up behind a login storm. Only a process
+# that serves several requests at once (threaded workers) can queue; a sync
+# worker hashes one password at a time, and these limits never bind there.
+#
+# A successful login whose stored hash was made with other parameters is
+# rehashed with the current ones.
+
+class HashingBusy(Exception):
+    """Raised when too many password hashes are already queued."""
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+_prefixes = {}
+
+def _submit(fn, *args):
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is None:
+            config = current_app.config
+            _pool = ThreadPoolExecutor(max_workers=config['PASSWORD_HASH_WORKERS'], thread_name_prefix='password')
+            _slots = threading.BoundedSemaphore(config['PASSWORD_HASH_WORKERS'] + config['PASSWORD_HASH_QUEUE'])
+    if not _slots.acquire(blocking=False):
+        raise HashingBusy()
+    future = _pool.submit(fn, *args)
+    future.add_done_callback(lambda _: _slots.release())
+    return future.result()
+
+def method():
+    return current_app.config['PASSWORD_HASH_METHOD']
+
+def _prefix(hash_method):
+    # "scrypt" and "scrypt:32768:8:1" describe the same parameters; compare what werkzeug writes
+    if hash_method not in _prefixes:
+        _prefixes[hash_method] = generate_password_hash('', hash_method).split('$', 1)[0]
+    return _prefixes[hash_method]
+
+def hash_password(password):
+    """Hashes a password with the configured method."""
+    return _submit(generate_password_hash, password, method())
+
+def check(password_hash, password):
+    return _submit(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    return password_hash.split('$', 1)[0] != _prefix(method())
+
+def authenticate(user, password):
+    """Checks a login and upgrades the stored hash if the hashing parameters changed.
+
+    Returns True if the password is right. May raise HashingBusy.
+    """
+    if not check(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+        db.session.commit()
+    return True
+
+def benchmark(hash_method, seconds=3.0, threads=None):
+    """Measures password checks per second with one thread and with `threads` in parallel."""
+    threads = threads or os.cpu_count() or 1
+    stored = generate_password_hash('benchmark-password', hash_method)
+
+    def run(stop_at, counter):
+        while time.perf_counter() < stop_at:
+            check_password_hash(stored, 'benchmark-password')
+            counter.append(1)
+
+    results = {}
+    for label, count in (('single', 1), ('parallel', threads)):
+        counters = [[] for _ in range(count)]
+        stop_at = time.perf_counter() + seconds
+        workers = [threading.Thread(target=run, args=(stop_at, counters[i])) for i in range(count)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        results[label] = sum(len(c) for c in counters) / seconds
+    cores = os.cpu_count() or 1
+    return {'method': _prefix(hash_method), 'threads': threads, 'cores': cores,
+            'checks_per_second': results['single'], 'parallel_checks_per_second': results['parallel'],
+            'logins_per_second_per_core': results['parallel'] / min(threads, cores)}
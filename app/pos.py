@@ -0,0 +1,127 @@
+# FILE: app/pos.py
+import gzip
+import hashlib
+import json
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import delete, func, select
+from app import db, cache, invoicing
+from app.models import Product, ProductTombstone, RowVersion
+
+# Catalog sync and bill entry for billing terminals (POS).
+#
+# A terminal downloads the catalog once as a compact snapshot (id, name,
+# price and stock rows, gzipped, with an ETag) and then polls for changes.
+# Every product row carries a row_version, and a deleted product leaves a
+# tombstone with one. Versions are ids from the row_version table, one per
+# writing transaction (see app/models.py); they follow the database's order of
+# issue, whatever the servers' clocks say, and taking one locks nothing. Each
+# response hands the terminal a version, and changes(since) returns only the
+# rows and tombstones written after it.
+#
+# A transaction can commit after others that took later versions. So the
+# version handed out is the newest one issued at least
+# POS_SYNC_OVERLAP_SECONDS ago by the database clock, and the changes of
+# newer transactions are sent again on the next poll. Terminals apply rows by
+# id, so receiving one twice is harmless. A transaction that stays open
+# longer than the overlap can still be missed.
+#
+# Bills rung up while a terminal was offline are queued with a client_ref and
+# sent in batches; a client_ref that was already recorded returns its bill.
+# Pricing and recording are left to app/invoicing.py.
+
+FIELDS = ['id', 'name', 'price', 'stock']
+
+_COLUMNS = (Product.id, Product.name, Product.selling_price, Product.stock_on_hand)
+
+def _row(product):
+    return [product.id, product.name, str(product.selling_price), product.stock_on_hand]
+
+def encode(payload):
+    return json.dumps(payload, separators=(',', ':')).encode()
+
+@cache.memoize('pos_snapshot', depends_on=('catalog', 'inventory'))
+def snapshot():
+    """(etag, gzipped JSON body) of every product, for a terminal's first sync.
+
+    The ETag hashes the rows only, so a rebuild that finds nothing changed
+    still answers the terminal's revalidation with a 304.
+    """
+    version = _version()
+    products = [_row(row) for row in db.session.execute(select(*_COLUMNS).order_by(Product.id))]
+    etag = hashlib.sha256(encode(products)).hexdigest()[:32]
+    return etag, gzip.compress(encode({'version': version, 'fields': FIELDS, 'products': products}))
+
+def changes(since):
+    """Products changed and deleted after version `since`.
+
+    Returns None when more than POS_SYNC_MAX_CHANGES products changed; the
+    terminal should fetch the snapshot again instead.
+    """
+    version = _version()
+    limit = current_app.config['POS_SYNC_MAX_CHANGES']
+    rows = db.session.execute(select(*_COLUMNS).where(Product.row_version > since)
+                              .order_by(Product.row_version).limit(limit + 1)).all()
+    if len(rows) > limit:
+        return None
+    deleted = db.session.scalars(select(ProductTombstone.product_id).where(ProductTombstone.row_version > since)).all()
+    # Terminals apply `deleted` before `products`, in case a deleted id was reused
+    return {'version': version, 'fields': FIELDS, 'products': [_row(row) for row in rows], 'deleted': list(deleted)}
+
+def _settled():
+    # The newest version issued at least POS_SYNC_OVERLAP_SECONDS ago, or None
+    cutoff = db.session.scalar(select(func.now())) - timedelta(seconds=current_app.config['POS_SYNC_OVERLAP_SECONDS'])
+    return db.session.scalar(select(func.max(RowVersion.id)).where(RowVersion.issued_at <= cutoff.replace(microsecond=0)))
+
+def _version():
+    # Read before the rows, so it is never newer than them
+    settled = _settled()
+    if settled is None: # Every version was issued within the overlap
+        settled = (db.session.scalar(select(func.min(RowVersion.id))) or 1) - 1
+    return settled
+
+def purge_versions():
+    """Deletes the row_version rows that _version() can no longer return. Returns how many."""
+    settled = _settled()
+    if settled is None:
+        return 0
+    return db.session.execute(delete(RowVersion).where(RowVersion.id < settled)).rowcount
+
+def record_deletion(product_id):
+    """Leaves a tombstone for a product deleted in the current transaction."""
+    # Replaced rather than updated, so a reused id deleted again gets a new version
+    db.session.execute(delete(ProductTombstone).where(ProductTombstone.product_id == product_id))
+    db.session.add(ProductTombstone(product_id=product_id))
+
+# --- Bills ---
+
+def create_bill(data):
+    """Records a bill sent by the billing screen or a terminal. Returns (bill_id, created).
+
+    When data['client_ref'] was recorded before, nothing is written and the
+    earlier bill's id comes back with created=False. Raises
+    invoicing.InvoiceError.
+    """
+    if not isinstance(data, dict):
+        raise invoicing.InvoiceError('Expected a JSON object.')
+    client_ref = data.get('client_ref') or None
+    if client_ref is not None and (not isinstance(client_ref, str) or len(client_ref) > 64):
+        raise invoicing.InvoiceError('client_ref must be a string of at most 64 characters.')
+    customer_name = data.get('customer_name')
+    items = data.get('items')
+    if not customer_name:
+        raise invoicing.InvoiceError('Customer name is required.')
+    if items is not None and not isinstance(items, list):
+        raise invoicing.InvoiceError('items must be a list.')
+    if not items:
+        raise invoicing.InvoiceError('Cannot create an empty bill.')
+    try:
+        lines = [(item['id'], item['quantity']) for item in items]
+    except (KeyError, TypeError):
+        raise invoicing.InvoiceError('Every item needs an id and a quantity.')
+    return invoicing.create_bill(
+        lines, {'customer_name': customer_name, 'customer_email': data.get('customer_email')},
+        tax_percentage=invoicing.parse_amount(data.get('tax_percentage'), 'tax_percentage'),
+        discount_amount=invoicing.parse_amount(data.get('discount_amount'), 'discount_amount'),
+        client_ref=client_ref,
+    )
@@ -0,0 +1,223 @@
+# FILE: app/queryplans.py
+import re
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from sqlalchemy import event, func, select
+from sqlalchemy.engine import Engine
+from app import db, cache, fifo, outbox, ml_models, database, instrumentation, storetime
+from app.cache import LRUCache
+from app.models import Product, Bill, AdminUser
+
+# Index advisor (`flask index-advisor`): replays the hot query paths against
+# the configured database, EXPLAINs every statement they issue and flags the
+# ones that read a whole table.
+#
+# Routes are requested through the test client, signed in as an admin or a
+# customer where needed, with ids sampled from the data. Cached results would
+# hide the queries behind them, so the replay runs on an empty private cache.
+# The write paths (FIFO stock deduction, the bill_created outbox handler) run
+# inside a transaction that is rolled back afterwards, so nothing changes.
+#
+# A full scan is flagged when the statement filters (an index could narrow
+# it down), doesn't stop early under a LIMIT, and the table has at least
+# --min-rows rows; on a smaller table a scan is what a planner should choose.
+# Other full scans, such as the dashboard's all-time totals, are listed only.
+
+# (who is signed in, path); {placeholders} are filled from sample()
+ROUTES = [
+    (None, '/'),
+    (None, '/?q={word}'),
+    (None, '/category/{category}'),
+    (None, '/product/{product_id}'),
+    ('customer', '/cart'),
+    ('customer', '/profile'),
+    ('customer', '/order/{bill_id}'),
+    ('admin', '/admin/dashboard'),
+    ('admin', '/admin/bill/{bill_id}'),
+    ('admin', '/admin/inventory'),
+    ('admin', '/admin/inventory/summary'),
+    ('admin', '/admin/reorder'),
+    ('admin', '/admin/api/bills'),
+    ('admin', '/admin/api/batches'),
+    ('admin', '/admin/api/pos/changes?since=0'),
+]
+
+EXPLAINED = ('SELECT', 'WITH', 'UPDATE', 'DELETE')
+
+# Words that can follow a table name in FROM/JOIN without being its alias
+_NOT_ALIASES = {'where', 'join', 'inner', 'left', 'right', 'outer', 'cross', 'on', 'group', 'order', 'limit',
+                'having', 'union', 'set', 'using', 'for', 'natural', 'window'}
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+[`"]?(\w+)[`"]?(?:\s+(?:AS\s+)?[`"]?(\w+)[`"]?)?', re.IGNORECASE)
+
+class Finding:
+    """A distinct statement, where it first ran, how often, and its plan."""
+
+    def __init__(self, source, dialect, statement, columns, plan):
+        self.source = source
+        self.statement = statement
+        self.columns = columns
+        self.plan = plan
+        self.executions = 1
+        self.scanned = full_scans(dialect, statement, columns, plan)
+        words = ' '.join(statement.split()).upper()
+        # Only a statement that filters can be helped by an index; one that
+        # reads rows in order under a LIMIT stops early anyway
+        self.filtered = ' WHERE ' in words
+        self.stops_early = ' LIMIT ' in words and not sorts(dialect, columns, plan)
+
+    def flagged(self, rows, min_rows):
+        """True if the statement filters but reads a table of min_rows or more in full."""
+        return self.filtered and not self.stops_early and any(rows[table] >= min_rows for table in self.scanned)
+
+def sample():
+    """Ids and values for the ROUTES placeholders, taken from the data; None where there is none."""
+    product = db.session.execute(select(Product.id, Product.name, Product.category)
+                                 .order_by(Product.id).limit(1)).first()
+    bill = db.session.execute(select(Bill.id, Bill.customer_id).where(Bill.customer_id.isnot(None))
+                              .order_by(Bill.id.desc()).limit(1)).first()
+    return {
+        'product_id': product.id if product else None,
+        'word': product.name.split()[0] if product and product.name.split() else None,
+        'category': product.category if product and product.category else None,
+        'bill_id': bill.id if bill else None,
+        'customer_id': bill.customer_id if bill else None,
+        'admin_id': db.session.scalar(select(AdminUser.id).order_by(AdminUser.id).limit(1)),
+    }
+
+def aliases(statement):
+    """{alias or table name: table name} for the tables a statement reads, as far as a regex can tell."""
+    tables = {}
+    for table, alias in _TABLE_REF.findall(statement):
+        if table.lower() not in db.metadata.tables:
+            continue
+        tables[table.lower()] = table.lower()
+        if alias and alias.lower() not in _NOT_ALIASES:
+            tables[alias.lower()] = table.lower()
+    return tables
+
+def full_scans(dialect, statement, columns, plan):
+    """Names of the tables the plan reads in full, without an index."""
+    names = aliases(statement)
+    scanned = []
+    for row in plan:
+        if dialect == 'sqlite':
+            # e.g. "SCAN bill" but not "SCAN bill USING COVERING INDEX ix_..." or "SEARCH bill USING ..."
+            match = re.match(r'SCAN (?:TABLE )?(\w+)(.*)$', str(row[-1]))
+            if match and 'USING' not in match.group(2).upper():
+                scanned.append(match.group(1))
+        else:
+            record = dict(zip(columns, row))
+            if str(record.get('type') or '').upper() == 'ALL' and record.get('table'):
+                scanned.append(record['table'])
+    # Derived tables and subqueries aren't tables of ours
+    return [names[name.lower()] for name in scanned if name.lower() in names]
+
+def sorts(dialect, columns, plan):
+    """True if the plan sorts rows itself rather than reading them in index order."""
+    if dialect == 'sqlite':
+        return any('TEMP B-TREE FOR ORDER BY' in str(row[-1]) for row in plan)
+    return any('filesort' in str(dict(zip(columns, row)).get('Extra') or '') for row in plan)
+
+@contextmanager
+def _cold_cache():
+    # Cached results would hide the queries behind them
+    saved = cache.local, cache.shared
+    cache.local, cache.shared = LRUCache(), None
+    try:
+        yield
+    finally:
+        cache.local, cache.shared = saved
+
+class _Recorder:
+    # EXPLAINs each distinct statement the replaying thread issues, the first time it runs
+
+    def __init__(self):
+        self.source = None
+        self.thread = threading.get_ident()
+        self.findings = {} # statement -> Finding
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() != self.thread or executemany \
+                or not statement.lstrip().upper().startswith(EXPLAINED):
+            return
+        if statement in self.findings:
+            self.findings[statement].executions += 1
+            return
+        try:
+            columns, plan = instrumentation.explain(conn, statement, parameters)
+        except Exception as e: # e.g. a statement the database can't EXPLAIN
+            columns, plan = ['error'], [(f'EXPLAIN failed: {e}',)]
+        self.findings[statement] = Finding(self.source, conn.dialect.name, statement, columns, plan)
+
+def _get(app, client, url):
+    # In a fresh app context: a request would otherwise share the command's
+    # `g`, and with it the user Flask-Login loaded for the previous request
+    with app.app_context():
+        return client.get(url)
+
+def _replay_routes(app, values, skipped):
+    for user_type, path in ROUTES:
+        try:
+            url = path.format(**{key: value for key, value in values.items() if value is not None})
+        except KeyError as e:
+            skipped.append(f'{path} (no {e.args[0]} in the data)')
+            continue
+        user_id = values['admin_id'] if user_type == 'admin' else values['customer_id']
+        if user_type and user_id is None:
+            skipped.append(f'{path} (no {user_type} in the data)')
+            continue
+        client = app.test_client()
+        if user_type:
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['user_type'] = user_type
+        yield f'GET {url}', lambda: _get(app, client, url)
+
+def _replay_jobs(values, skipped):
+    # Write paths, each in a transaction that is rolled back
+    if values['product_id'] is not None:
+        yield 'FIFO stock deduction', lambda: fifo.allocate({values['product_id']: 1})
+    else:
+        skipped.append('FIFO stock deduction (no products)')
+    if values['bill_id'] is not None:
+        yield 'outbox: bill_created handler', lambda: outbox.HANDLERS['bill_created'][0]([{'bill_id': values['bill_id']}])
+    else:
+        skipped.append('outbox: bill_created handler (no bills)')
+    yield 'forecast: incremental sales extract', \
+        lambda: ml_models.get_sales_data(database.read_engine(), since=storetime.today() - timedelta(days=7))
+
+def table_rows(tables):
+    """{table: row count}."""
+    return {table: db.session.scalar(select(func.count()).select_from(db.metadata.tables[table]))
+            for table in sorted(tables)}
+
+def advise(app):
+    """Replays the hot paths. Returns (findings in order of first execution, {scanned table: rows}, skipped paths)."""
+    recorder = _Recorder()
+    skipped = []
+    values = sample()
+    db.session.rollback()
+    workers = app.config['OUTBOX_WORKERS']
+    app.config['OUTBOX_WORKERS'] = 0 # The replayed requests shouldn't start outbox workers in this process
+    event.listen(Engine, 'after_cursor_execute', recorder.after_cursor_execute)
+    try:
+        with _cold_cache():
+            for source, replay in _replay_routes(app, values, skipped):
+                recorder.source = source
+                status = replay().status_code
+                if status >= 400:
+                    skipped.append(f'{source} (answered {status})')
+            for source, replay in _replay_jobs(values, skipped):
+                recorder.source = source
+                try:
+                    replay()
+                except fifo.InsufficientStock:
+                    pass # The statements were issued all the same
+                finally:
+                    db.session.rollback()
+    finally:
+        event.remove(Engine, 'after_cursor_execute', recorder.after_cursor_execute)
+        app.config['OUTBOX_WORKERS'] = workers
+    findings = list(recorder.findings.values())
+    return findings, table_rows({table for finding in findings for table in finding.scanned}), skipped
@@ -0,0 +1,93 @@
+# FILE: app/reorder.py
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import delete, func, insert, select
+from app import db, storetime
+from app.models import Product, DailySalesRollup, ReorderPoint
+from app.rollups import upsert
+
+# Reorder points from sales velocity.
+#
+#   velocity      = units sold over the last REORDER_WINDOW_DAYS / window length
+#   days of cover = stock on hand / velocity
+#   reorder level = velocity * (REORDER_LEAD_TIME_DAYS + REORDER_SAFETY_DAYS), rounded up
+#
+# A product is at risk when it is selling and its stock is at or below its
+# reorder level. Sales come from the daily rollup table, so a refresh reads at
+# most window-length rows per product and never scans the bill history. Each
+# bill and batch refreshes just the products it touched; recompute_all() runs
+# the same arithmetic over every product at once (e.g. nightly, so velocities
+# of products that stopped selling decay too).
+
+def settings():
+    config = current_app.config
+    return config['REORDER_WINDOW_DAYS'], config['REORDER_LEAD_TIME_DAYS'], config['REORDER_SAFETY_DAYS']
+
+def compute(product_ids, units_sold, stock, window_days, lead_time_days, safety_days, now):
+    """Reorder rows for parallel sequences of product ids, units sold in the window and stock on hand."""
+    units = np.asarray(units_sold, dtype=float)
+    on_hand = np.asarray(stock, dtype=float)
+    velocity = units / window_days
+    selling = velocity > 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(selling, np.maximum(on_hand, 0) / velocity, np.nan)
+    level = np.ceil(velocity * (lead_time_days + safety_days))
+    at_risk = selling & (on_hand <= level)
+    return [
+        {'product_id': int(pid), 'units_sold': int(u), 'velocity': v, 'stock_on_hand': int(s),
+         'days_of_cover': None if np.isnan(c) else c, 'reorder_level': int(l), 'at_risk': bool(r), 'updated_at': now}
+        for pid, u, v, s, c, l, r in zip(product_ids, units.tolist(), velocity.tolist(), on_hand.tolist(),
+                                         cover.tolist(), level.tolist(), at_risk.tolist())
+    ]
+
+def _window_units(today, window_days, product_ids=None):
+    start = today - timedelta(days=window_days - 1)
+    query = select(DailySalesRollup.product_id, func.sum(DailySalesRollup.units)) \
+        .where(DailySalesRollup.day >= start, DailySalesRollup.day <= today, DailySalesRollup.product_id.isnot(None)) \
+        .group_by(DailySalesRollup.product_id)
+    if product_ids is not None:
+        query = query.where(DailySalesRollup.product_id.in_(product_ids))
+    return dict(db.session.execute(query).all())
+
+def refresh(product_ids, today=None):
+    """Recomputes the reorder rows of the given products in the current transaction."""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+    today = today or storetime.today()
+    window_days, lead_time_days, safety_days = settings()
+    units = _window_units(today, window_days, product_ids)
+    stock = db.session.execute(
+        select(Product.id, Product.stock_on_hand).where(Product.id.in_(product_ids)).order_by(Product.id)
+    ).all()
+    if not stock:
+        return
+    ids = [row.id for row in stock]
+    rows = compute(ids, [units.get(pid, 0) for pid in ids], [row.stock_on_hand for row in stock],
+                   window_days, lead_time_days, safety_days, datetime.now())
+    upsert(ReorderPoint, rows, ['product_id'],
+           replace_columns=['units_sold', 'velocity', 'stock_on_hand', 'days_of_cover', 'reorder_level', 'at_risk', 'updated_at'])
+
+def recompute_all(today=None, chunk_size=1000):
+    """Rebuilds the reorder table for every product. Returns the number of products at risk."""
+    today = today or storetime.today()
+    window_days, lead_time_days, safety_days = settings()
+    units = _window_units(today, window_days)
+    stock = np.array(db.session.execute(select(Product.id, Product.stock_on_hand).order_by(Product.id)).all(),
+                     dtype=np.int64).reshape(-1, 2)
+    ids = stock[:, 0]
+    sold = np.array([units.get(pid, 0) for pid in ids.tolist()], dtype=np.int64)
+    rows = compute(ids.tolist(), sold, stock[:, 1], window_days, lead_time_days, safety_days, datetime.now())
+    db.session.execute(delete(ReorderPoint))
+    for i in range(0, len(rows), chunk_size):
+        db.session.execute(insert(ReorderPoint), rows[i:i + chunk_size])
+    db.session.commit()
+    return sum(row['at_risk'] for row in rows)
+
+def last_full_recompute():
+    """Oldest updated_at in the table, i.e. when every row was last refreshed at the latest."""
+    return db.session.scalar(select(func.min(ReorderPoint.updated_at)))
+
+def at_risk_query():
+    return ReorderPoint.query.filter(ReorderPoint.at_risk.is_(True))
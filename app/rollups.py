@@ -0,0 +1,140 @@
+# FILE: app/rollups.py
+from datetime import timedelta
+from decimal import Decimal
+from sqlalchemy import delete, func, insert, select, update, and_
+from app import db, cache
+from app.models import Bill, BillItem, Product, DailySalesRollup, CustomerOrderCount
+
+# The admin dashboard reads only these rollup tables. Bills are added by their
+# bill_created outbox events (see app/outbox.py) shortly after they commit;
+# rebuild() recomputes the tables from the bill history the same way.
+
+def record_bills(bills, items):
+    """Adds bills to the rollups.
+
+    bills are rows with id, sale_date and customer_email; items are rows with the
+    bill item columns bill_id, product_id, product_name, quantity,
+    price_per_unit and cost_price_at_sale, plus the product's category (None
+    for a deleted product).
+    """
+    days = {bill.id: bill.sale_date for bill in bills}
+    totals = {}
+    for item in items:
+        key = (days[item.bill_id], item.product_id, item.category or 'Uncategorized')
+        row = totals.setdefault(key, {'day': key[0], 'product_id': item.product_id, 'product_name': item.product_name,
+                                      'category': key[2], 'revenue': Decimal('0'), 'cost': Decimal('0'),
+                                      'units': 0, 'bill_count': set()})
+        row['revenue'] += Decimal(str(item.price_per_unit)) * item.quantity
+        row['cost'] += Decimal(str(item.cost_price_at_sale)) * item.quantity
+        row['units'] += item.quantity
+        row['bill_count'].add(item.bill_id)
+    # Sorted so concurrent writers always lock rollup rows in the same order
+    rows = [dict(totals[key], bill_count=len(totals[key]['bill_count']))
+            for key in sorted(totals, key=lambda key: (key[0], key[1] or 0, key[2]))]
+    if rows:
+        upsert(DailySalesRollup, rows, ['day', 'product_id', 'category'], ['revenue', 'cost', 'units', 'bill_count'])
+    orders = {}
+    for bill in bills:
+        if bill.customer_email:
+            orders[bill.customer_email] = orders.get(bill.customer_email, 0) + 1
+    if orders:
+        upsert(CustomerOrderCount, [{'email': email, 'bill_count': orders[email]} for email in sorted(orders)],
+               ['email'], ['bill_count'])
+
+def upsert(model, rows, key_columns, increment_columns=(), replace_columns=()):
+    """One multi-row INSERT ... ON CONFLICT / ON DUPLICATE KEY for rows keyed by key_columns.
+
+    On a conflict, increment_columns are added to the existing row and
+    replace_columns are overwritten with the new values.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as mysql_insert
+        stmt = mysql_insert(table).values(rows)
+        changes = {name: table.c[name] + stmt.inserted[name] for name in increment_columns}
+        changes.update({name: stmt.inserted[name] for name in replace_columns})
+        db.session.execute(stmt.on_duplicate_key_update(changes))
+    elif dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as conflict_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as conflict_insert
+        stmt = conflict_insert(table).values(rows)
+        changes = {name: table.c[name] + stmt.excluded[name] for name in increment_columns}
+        changes.update({name: stmt.excluded[name] for name in replace_columns})
+        db.session.execute(stmt.on_conflict_do_update(index_elements=key_columns, set_=changes))
+    else:
+        for row in rows:
+            match = and_(*(table.c[name] == row[name] for name in key_columns))
+            changes = {name: table.c[name] + row[name] for name in increment_columns}
+            changes.update({name: row[name] for name in replace_columns})
+            result = db.session.execute(update(table).where(match).values(changes))
+            if result.rowcount == 0:
+                db.session.execute(insert(table).values(row))
+
+def rebuild():
+    """Recomputes both rollup tables from the full bill history."""
+    day = Bill.sale_date
+    category = func.coalesce(Product.category, 'Uncategorized')
+    revenue = func.sum(BillItem.price_per_unit * BillItem.quantity)
+    cost = func.sum(BillItem.cost_price_at_sale * BillItem.quantity)
+    units = func.sum(BillItem.quantity)
+    bill_count = func.count(func.distinct(Bill.id))
+    base = select().select_from(BillItem).join(Bill, BillItem.bill_id == Bill.id).outerjoin(Product, BillItem.product_id == Product.id)
+    columns = ['day', 'product_id', 'product_name', 'category', 'revenue', 'cost', 'units', 'bill_count']
+
+    db.session.execute(delete(DailySalesRollup))
+    db.session.execute(delete(CustomerOrderCount))
+    # Items of existing products, one row per product and day
+    db.session.execute(insert(DailySalesRollup).from_select(columns, base.add_columns(
+        day, BillItem.product_id, func.max(BillItem.product_name), category, revenue, cost, units, bill_count
+    ).where(BillItem.product_id.isnot(None)).group_by(day, BillItem.product_id, category)))
+    # Items of deleted products, kept apart by the name recorded on the bill
+    db.session.execute(insert(DailySalesRollup).from_select(columns, base.add_columns(
+        day, BillItem.product_id, BillItem.product_name, category, revenue, cost, units, bill_count
+    ).where(BillItem.product_id.is_(None)).group_by(day, BillItem.product_id, BillItem.product_name, category)))
+    db.session.execute(insert(CustomerOrderCount).from_select(['email', 'bill_count'], select(
+        Bill.customer_email, func.count(Bill.id)
+    ).where(Bill.customer_email.isnot(None), Bill.customer_email != '').group_by(Bill.customer_email)))
+    db.session.commit()
+    cache.bump('sales')
+
+@cache.memoize('dashboard', depends_on=('sales',))
+def dashboard_summary(today):
+    """Everything the admin dashboard shows, read from the rollup tables only."""
+    start_of_month = today.replace(day=1)
+    thirty_days_ago = today - timedelta(days=30)
+    profit = func.coalesce(func.sum(DailySalesRollup.revenue - DailySalesRollup.cost), 0)
+    revenue = func.sum(DailySalesRollup.revenue)
+
+    todays_profit = db.session.query(profit).filter(DailySalesRollup.day == today).scalar()
+    months_profit = db.session.query(profit).filter(DailySalesRollup.day >= start_of_month).scalar()
+
+    daily_sales = db.session.query(DailySalesRollup.day, revenue.label('total_sales')) \
+        .filter(DailySalesRollup.day >= thirty_days_ago) \
+        .group_by(DailySalesRollup.day).order_by(DailySalesRollup.day).all()
+
+    top_products_by_revenue = db.session.query(DailySalesRollup.product_name.label('name'), revenue.label('total_revenue')) \
+        .group_by(DailySalesRollup.product_name).order_by(db.desc('total_revenue')).limit(5).all()
+    top_products_by_units = db.session.query(DailySalesRollup.product_name.label('name'), func.sum(DailySalesRollup.units).label('total_units')) \
+        .group_by(DailySalesRollup.product_name).order_by(db.desc('total_units')).limit(5).all()
+
+    returning_customers = CustomerOrderCount.query.filter(CustomerOrderCount.bill_count > 1).count()
+    new_customers = CustomerOrderCount.query.filter(CustomerOrderCount.bill_count == 1).count()
+
+    revenue_by_category = db.session.query(DailySalesRollup.category, revenue.label('total_revenue')) \
+        .group_by(DailySalesRollup.category).order_by(db.desc('total_revenue')).all()
+
+    return {
+        'todays_profit': float(todays_profit),
+        'months_profit': float(months_profit),
+        'sales_chart_labels': [sale.day.strftime('%b %d') for sale in daily_sales],
+        'sales_chart_data': [round(float(sale.total_sales), 2) for sale in daily_sales],
+        'top_products_by_revenue': [{'name': p.name, 'total_revenue': float(p.total_revenue)} for p in top_products_by_revenue],
+        'top_products_by_units': [{'name': p.name, 'total_units': int(p.total_units)} for p in top_products_by_units],
+        'new_customers': new_customers,
+        'returning_customers': returning_customers,
+        'category_chart_labels': [item.category for item in revenue_by_category],
+        'category_chart_data': [round(float(item.total_revenue), 2) for item in revenue_by_category],
+    }
@@ -0,0 +1,35 @@
+# FILE: app/storetime.py
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from flask import current_app
+
+# The store's calendar. Sales are reported by the day they happened where the
+# store is (STORE_TIMEZONE), which the database can't work out from a
+# timestamp on its own: SQLite has no time zones, and a generated column can't
+# follow a configurable one. So each bill stores its day in bill.sale_date
+# when it is written, and reports filter and group on that plain, indexed
+# column instead of on DATE(bill.date).
+#
+# bill.date is written by the database's now(), as a naive timestamp in
+# DATABASE_TIMEZONE.
+
+@lru_cache(maxsize=None)
+def _zone(name):
+    return ZoneInfo(name)
+
+def store_zone():
+    return _zone(current_app.config['STORE_TIMEZONE'])
+
+def database_zone():
+    return _zone(current_app.config['DATABASE_TIMEZONE'])
+
+def today():
+    """The store's current calendar day."""
+    return datetime.now(store_zone()).date()
+
+def sale_date(moment):
+    """The store's calendar day of a timestamp; naive ones are taken to be in DATABASE_TIMEZONE."""
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=database_zone())
+    return moment.astimezone(store_zone()).date()
@@ -0,0 +1,33 @@
+# FILE: app/transactions.py
+import random
+import time
+from flask import current_app
+from sqlalchemy.exc import OperationalError
+from app import db
+
+# MySQL error codes for "deadlock found" and "lock wait timeout exceeded"
+RETRYABLE_MYSQL_ERRORS = {1205, 1213}
+
+def is_retryable(error):
+    """True if the database aborted the transaction because of a lock conflict."""
+    orig = getattr(error, 'orig', None)
+    if orig is not None and orig.args and orig.args[0] in RETRYABLE_MYSQL_ERRORS:
+        return True
+    message = str(orig or error).lower()
+    return 'database is locked' in message or 'deadlock' in message or 'could not serialize' in message
+
+def run_with_retry(work, attempts=None):
+    """Runs work() (which must commit) and re-runs it after a deadlock or serialization failure.
+
+    The session is rolled back before each retry, so work() has to rebuild any
+    objects it adds. Backoff is short and jittered to keep competing writers apart.
+    """
+    attempts = attempts or current_app.config['ORDER_RETRY_ATTEMPTS']
+    for attempt in range(1, attempts + 1):
+        try:
+            return work()
+        except OperationalError as e:
+            db.session.rollback()
+            if attempt == attempts or not is_retryable(e):
+                raise
+            time.sleep(random.uniform(0, 0.02 * 2 ** attempt))
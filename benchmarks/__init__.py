@@ -0,0 +1,2 @@
+# FILE: benchmarks/__init__.py
+# Benchmark suite for the core routes; see __main__.py for usage.
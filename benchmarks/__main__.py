@@ -0,0 +1,167 @@
+# FILE: benchmarks/__main__.py
+# Repeatable benchmarks for the core routes. Generates a deterministic dataset,
+# times each scenario and writes p50/p95/p99 latency, throughput and SQL
+# statements per request as JSON that can be compared between runs. In-process
+# runs also record the query plans and timings of the bill analytics queries
+# (see plans.py).
+#
+#   python -m benchmarks run --scale small --out before.json
+#   python -m benchmarks run --scale small --out after.json --compare-to before.json
+#   python -m benchmarks compare before.json after.json --threshold 10
+#
+#   # Against a running server (e.g. gunicorn on the same database):
+#   python -m benchmarks generate --scale medium --database-url mysql+pymysql://root:pw@localhost/bench_db
+#   python -m benchmarks run --scale medium --url http://127.0.0.1:8000 --concurrency 16
+#
+# The target database is dropped and refilled, so never point it at a real one.
+
+import argparse
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+def _add_dataset_arguments(parser):
+    from benchmarks.datagen import SCALES
+    parser.add_argument('--database-url', help='Scratch database (default: a temporary SQLite file).')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='small', help='Dataset size preset.')
+    parser.add_argument('--seed', type=int, default=42, help='Seed for the data and the request mix.')
+    for key in ('products', 'customers', 'bills', 'items_per_bill', 'days'):
+        parser.add_argument('--' + key.replace('_', '-'), type=int, help=f'Override the preset {key} count.')
+
+def _scale(args):
+    from benchmarks.datagen import SCALES
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key, None) is not None:
+            scale[key] = getattr(args, key)
+    return scale
+
+def _create_app(args):
+    # Must run before the app is imported: the configuration is read from the environment
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('FORECAST_MODEL_DIR', os.path.join(workdir, 'forecast_models'))
+    from app import create_app
+    return create_app()
+
+def _generate(app, args, scale):
+    from app.admin.routes import train_forecast
+    from benchmarks import datagen
+    with app.app_context():
+        counts = datagen.generate(scale, seed=args.seed)
+        print('Generated ' + ', '.join(f'{count} {table}' for table, count in counts.items()))
+        if not args.no_train:
+            # So /admin/forecasting serves a trained model instead of queueing training
+            print('Trained forecast model' if train_forecast() else 'Forecast training produced no model')
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def generate_command(args):
+    _generate(_create_app(args), args, _scale(args))
+
+def run_command(args):
+    from benchmarks import drivers, plans, report, scenarios
+    selected = scenarios.select(args.scenarios.split(',') if args.scenarios else [])
+    scale = _scale(args)
+    if args.concurrency > scale['customers']:
+        sys.exit(f'--concurrency {args.concurrency} needs at least as many customers (have {scale["customers"]}).')
+
+    if args.url:
+        driver, dialect = drivers.HttpDriver(args.url), None
+    else:
+        app = _create_app(args)
+        if not args.skip_generate:
+            _generate(app, args, scale)
+        driver = drivers.TestClientDriver(app)
+        with app.app_context():
+            from app import db
+            dialect = db.engine.dialect.name
+
+    results = {}
+    for scenario in selected:
+        before = driver.queries_snapshot()
+        samples, busy = drivers.run_scenario(driver, scenario, scale, args.requests, args.concurrency, args.warmup,
+                                             args.seed)
+        summary = report.summarize(samples, busy)
+        after = driver.queries_snapshot()
+        if summary['queries_per_request'] is None and before is not None and after is not None:
+            # Over HTTP, take the server's own count for the route (includes the warm-up requests)
+            statements, requests = (a - b for a, b in zip(after.get(scenario.route, (0, 0)), before.get(scenario.route, (0, 0))))
+            if requests:
+                summary['queries_per_request'] = round(statements / requests, 3)
+        results[scenario.name] = summary
+        print(f"{scenario.name:<20} p50 {summary['p50_ms']:>9} ms  p95 {summary['p95_ms']:>9} ms  "
+              f"p99 {summary['p99_ms']:>9} ms  {summary['throughput_rps']:>9} req/s  "
+              f"{summary['queries_per_request']} queries/req  {summary['errors']} errors")
+
+    analytics = None
+    if not args.url and not args.no_plans:
+        with app.app_context():
+            analytics = plans.measure()
+        print('\n'.join(plans.describe(analytics)))
+
+    meta = {
+        'scale': args.scale, 'dataset': scale, 'seed': args.seed, 'driver': 'http' if args.url else 'test_client',
+        'url': args.url, 'dialect': dialect, 'requests': args.requests, 'concurrency': args.concurrency,
+        'warmup': args.warmup, 'commit': _git_commit(), 'python': platform.python_version(),
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    }
+    if args.out:
+        report.save(args.out, meta, results, analytics)
+        print(f'Wrote {args.out}')
+    if args.compare_to:
+        _compare(report.load(args.compare_to), {'meta': meta, 'results': results, 'plans': analytics}, args.threshold)
+
+def _compare(old, new, threshold):
+    from benchmarks import report
+    lines, regressions = report.compare(old, new, threshold)
+    print('\n'.join(lines))
+    if any(old['meta'].get(key) != new['meta'].get(key) for key in ('dataset', 'driver', 'concurrency', 'dialect')):
+        print('Warning: the runs differ in dataset, driver, concurrency or database; the numbers are not directly comparable.')
+    if regressions:
+        print(f'{len(regressions)} metric(s) regressed by more than {threshold}%.')
+        sys.exit(1)
+
+def compare_command(args):
+    from benchmarks import report
+    _compare(report.load(args.old), report.load(args.new), args.threshold)
+
+parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks for the core routes.')
+commands = parser.add_subparsers(dest='command', required=True)
+
+generate_parser = commands.add_parser('generate', help='Fill a database with a synthetic dataset.')
+_add_dataset_arguments(generate_parser)
+generate_parser.add_argument('--no-train', action='store_true', help='Skip training the forecast model.')
+generate_parser.set_defaults(handler=generate_command)
+
+run_parser = commands.add_parser('run', help='Time the scenarios and report the results.')
+_add_dataset_arguments(run_parser)
+run_parser.add_argument('--url', help='Benchmark a running server instead of an in-process app.')
+run_parser.add_argument('--skip-generate', action='store_true', help='Reuse the data already in --database-url.')
+run_parser.add_argument('--no-train', action='store_true', help='Skip training the forecast model.')
+run_parser.add_argument('--no-plans', action='store_true', help='Skip the analytics query plans and timings.')
+run_parser.add_argument('--scenarios', help='Comma-separated scenario names (default: all).')
+run_parser.add_argument('--requests', type=int, default=200, help='Timed requests per scenario.')
+run_parser.add_argument('--concurrency', type=int, default=1, help='Concurrent workers per scenario.')
+run_parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per worker before timing.')
+run_parser.add_argument('--out', help='Write the results to this JSON file.')
+run_parser.add_argument('--compare-to', help='Compare against an earlier results file; exits 1 on regressions.')
+run_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent.')
+run_parser.set_defaults(handler=run_command)
+
+compare_parser = commands.add_parser('compare', help='Compare two results files; exits 1 on regressions.')
+compare_parser.add_argument('old')
+compare_parser.add_argument('new')
+compare_parser.add_argument('--threshold', type=float, default=10.0, help='Regression threshold in percent.')
+compare_parser.set_defaults(handler=compare_command)
+
+args = parser.parse_args()
+args.handler(args)
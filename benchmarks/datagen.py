@@ -0,0 +1,100 @@
+# FILE: benchmarks/datagen.py
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from app import db, rollups, reorder, catalog, storetime
+from app.models import Product, Batch, Customer, AdminUser, Bill, BillItem
+
+# Deterministic synthetic datasets for the benchmarks. The same scale and seed
+# always produce the same rows, so runs against different commits compare
+# like with like. Rows go in with bulk INSERTs and explicit ids; the derived
+# tables (sales rollups, reorder points, search tokens) are then rebuilt the
+# way the app's own maintenance commands do it.
+
+SCALES = {
+    'tiny': {'products': 50, 'batches_per_product': 2, 'customers': 20, 'bills': 300, 'items_per_bill': 3, 'days': 60},
+    'small': {'products': 500, 'batches_per_product': 3, 'customers': 200, 'bills': 5000, 'items_per_bill': 3, 'days': 180},
+    'medium': {'products': 5000, 'batches_per_product': 4, 'customers': 2000, 'bills': 50000, 'items_per_bill': 4, 'days': 365},
+    'large': {'products': 50000, 'batches_per_product': 5, 'customers': 20000, 'bills': 500000, 'items_per_bill': 5, 'days': 730},
+}
+
+CATEGORIES = ['Electronics', 'Grocery', 'Clothing', 'Footwear', 'Home', 'Garden', 'Toys', 'Books', 'Sports', 'Beauty',
+              'Stationery', 'Kitchen']
+WORDS = ['classic', 'premium', 'compact', 'wireless', 'organic', 'steel', 'cotton', 'leather', 'portable', 'smart',
+         'deluxe', 'mini', 'ultra', 'eco', 'vintage', 'sport', 'travel', 'family', 'pro', 'lite', 'bamboo', 'glass']
+NOUNS = ['lamp', 'kettle', 'shirt', 'shoe', 'speaker', 'backpack', 'notebook', 'bottle', 'chair', 'blender',
+         'jacket', 'watch', 'mug', 'pan', 'towel', 'ball', 'puzzle', 'cream', 'pen', 'tent']
+
+BENCH_PASSWORD = 'benchmark'
+ADMIN_USERNAME = 'bench-admin'
+CHUNK_SIZE = 5000
+
+def customer_email(index):
+    return f'customer{index}@bench.example.com'
+
+def _insert(model, rows):
+    for i in range(0, len(rows), CHUNK_SIZE):
+        db.session.execute(insert(model), rows[i:i + CHUNK_SIZE])
+
+def generate(scale, seed=42, now=None, password_method=None):
+    """Drops and recreates every table, then fills them. Returns row counts.
+
+    `scale` is a dict with the keys of SCALES entries. Run inside an app context.
+    """
+    rng = random.Random(seed)
+    now = (now or datetime.now()).replace(microsecond=0)
+    db.drop_all(bind_key=None)
+    db.create_all(bind_key=None)
+
+    # One hash shared by every account; hashing per row would dominate generation time
+    password_hash = generate_password_hash(BENCH_PASSWORD, password_method or 'scrypt')
+    _insert(AdminUser, [{'id': 1, 'username': ADMIN_USERNAME, 'password_hash': password_hash}])
+    _insert(Customer, [{'id': i, 'name': f'Customer {i}', 'email': customer_email(i), 'password_hash': password_hash,
+                        'address': f'{i} Bench Street', 'city': rng.choice(['Pune', 'Delhi', 'Mumbai', 'Chennai'])}
+                       for i in range(1, scale['customers'] + 1)])
+
+    products, batches = [], []
+    for pid in range(1, scale['products'] + 1):
+        cost = Decimal(rng.randint(100, 50000)) / 100
+        name = f'{rng.choice(WORDS).title()} {rng.choice(NOUNS)} {pid}'
+        stock = 0
+        for _ in range(scale['batches_per_product']):
+            quantity = rng.randint(20, 200)
+            stock += quantity
+            batches.append({'id': len(batches) + 1, 'product_id': pid, 'quantity': quantity,
+                            'date_added': now - timedelta(days=rng.randint(0, scale['days']), seconds=rng.randint(0, 86399))})
+        products.append({'id': pid, 'name': name, 'description': ' '.join(rng.choices(WORDS + NOUNS, k=8)),
+                         'category': rng.choice(CATEGORIES), 'cost_price': cost,
+                         'selling_price': (cost * Decimal(rng.choice(['1.2', '1.35', '1.5', '2']))).quantize(Decimal('0.01')),
+                         'image_file': 'placeholder.jpg', 'stock_on_hand': stock})
+    _insert(Product, products)
+    _insert(Batch, batches)
+
+    bills, items = [], []
+    for bill_id in range(1, scale['bills'] + 1):
+        customer_id = rng.randint(1, scale['customers'])
+        subtotal = Decimal('0')
+        for product in rng.sample(products, min(scale['items_per_bill'], len(products))):
+            quantity = rng.randint(1, 5)
+            subtotal += product['selling_price'] * quantity
+            items.append({'id': len(items) + 1, 'bill_id': bill_id, 'product_id': product['id'],
+                          'product_name': product['name'], 'quantity': quantity,
+                          'price_per_unit': product['selling_price'], 'cost_price_at_sale': product['cost_price']})
+        tax = Decimal(rng.choice(['0', '5', '12', '18']))
+        sold_at = now - timedelta(days=rng.randint(0, scale['days']), seconds=rng.randint(0, 86399))
+        bills.append({'id': bill_id, 'customer_id': customer_id, 'customer_name': f'Customer {customer_id}',
+                      'customer_email': customer_email(customer_id), 'date': sold_at,
+                      'sale_date': storetime.sale_date(sold_at),
+                      'subtotal': subtotal, 'tax_percentage': tax, 'discount_amount': Decimal('0'),
+                      'final_amount': (subtotal * (1 + tax / 100)).quantize(Decimal('0.01'))})
+    _insert(Bill, bills)
+    _insert(BillItem, items)
+    db.session.commit()
+
+    rollups.rebuild()
+    reorder.recompute_all(storetime.sale_date(now))
+    catalog.reindex_all()
+    return {'admin_user': 1, 'customer': scale['customers'], 'product': len(products), 'batch': len(batches),
+            'bill': len(bills), 'bill_item': len(items)}
@@ -0,0 +1,138 @@
+# FILE: benchmarks/drivers.py
+import http.cookiejar
+import json
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from benchmarks import scenarios
+
+# Two ways of sending the scenario requests:
+#   TestClientDriver  in-process Flask test clients; exact SQL statement
+#                     counts per request, no network or server in the way
+#   HttpDriver        a running server over HTTP (e.g. gunicorn), for
+#                     concurrent load; statement counts come from the
+#                     server's /metrics when it is reachable
+# run_scenario() drives either one with N concurrent workers.
+
+class TestClientDriver:
+    """Sends requests to an app object in this process."""
+
+    def __init__(self, app):
+        self.app = app
+        self._local = threading.local()
+        event.listen(Engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        # Requests run on the calling thread, so a thread-local counter is per request
+        self._local.queries = getattr(self._local, 'queries', 0) + 1
+
+    def client(self):
+        return self.app.test_client()
+
+    def send(self, client, request):
+        method, path, options = request
+        self._local.queries = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, data=options.get('data'), json=options.get('json'))
+        response.close()
+        return response.status_code, time.perf_counter() - started, self._local.queries
+
+    def queries_snapshot(self):
+        return None
+
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Time the request itself, not the page it redirects to
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+class HttpDriver:
+    """Sends requests to a server at base_url, one cookie jar per worker."""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def client(self):
+        return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), _NoRedirect())
+
+    def send(self, client, request):
+        method, path, options = request
+        body, headers = None, {}
+        if 'json' in options:
+            body, headers = json.dumps(options['json']).encode(), {'Content-Type': 'application/json'}
+        elif 'data' in options:
+            body = urllib.parse.urlencode(options['data']).encode()
+        http_request = urllib.request.Request(self.base_url + path, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with client.open(http_request, timeout=self.timeout) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e: # includes the redirects we refuse to follow
+            e.read()
+            status = e.code
+        return status, time.perf_counter() - started, None
+
+    def queries_snapshot(self):
+        """{route: (statements, requests)} from the server's /metrics, or None if it has none."""
+        try:
+            with urllib.request.urlopen(self.base_url + '/metrics', timeout=self.timeout) as response:
+                text = response.read().decode()
+        except (urllib.error.URLError, OSError):
+            return None
+        snapshot = {}
+        for kind, route, value in re.findall(r'^http_request_sql_queries_(sum|count)\{route="([^"]*)",[^}]*\} (\S+)$',
+                                             text, re.MULTILINE):
+            statements, requests = snapshot.get(route, (0.0, 0.0))
+            snapshot[route] = (statements + float(value), requests) if kind == 'sum' else (statements, requests + float(value))
+        return snapshot
+
+def run_scenario(driver, scenario, scale, requests, concurrency=1, warmup=5, seed=42):
+    """Runs `requests` timed requests split over `concurrency` workers.
+
+    Returns (samples, busy_seconds): samples are (status, seconds, statements)
+    tuples, busy_seconds is the longest time any worker spent in timed requests.
+    """
+    per_worker, extra = divmod(requests, concurrency)
+    samples, busy = [], [0.0] * concurrency
+    lock = threading.Lock()
+    ready = threading.Barrier(concurrency)
+    failures = []
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = driver.client()
+        try:
+            if scenario.login:
+                driver.send(client, scenarios.login_request(scenario.login, index))
+            count = per_worker + (1 if index < extra else 0)
+            mine = []
+            for i in range(warmup + count):
+                if i == warmup:
+                    ready.wait()
+                for step in scenario.prepare(rng, scale, index, i == 0) if scenario.prepare else []:
+                    driver.send(client, step)
+                result = driver.send(client, scenario.request(rng, scale, index))
+                if i >= warmup:
+                    mine.append(result)
+                    busy[index] += result[1]
+            with lock:
+                samples.extend(mine)
+        except Exception as e:
+            ready.abort()
+            failures.append(e)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    return samples, max(busy)
@@ -0,0 +1,84 @@
+# FILE: benchmarks/plans.py
+import statistics
+import time
+from datetime import timedelta
+from sqlalchemy import event, text
+from app import db, instrumentation, ml_models, storetime
+
+# Query plans and timings of the bill analytics queries, each in its legacy
+# form (the day worked out with DATE(bill.date), which no index can serve)
+# next to the current one on the indexed bill.sale_date column. Both run on
+# the same data, so the pair shows what the rewrite changed.
+
+REPEAT = 20
+
+def _queries(today):
+    since_30d, since_7d = today - timedelta(days=29), today - timedelta(days=7)
+    forecast, forecast_params = ml_models.sales_query(since_7d)
+    return {
+        'sales_today': (
+            ("SELECT COUNT(*), SUM(b.final_amount) FROM bill b WHERE DATE(b.date) = :day",
+             {'day': today.isoformat()}),
+            ("SELECT COUNT(*), SUM(b.final_amount) FROM bill b WHERE b.sale_date = :day",
+             {'day': today}),
+        ),
+        'daily_sales_30d': (
+            ("SELECT DATE(b.date) AS day, COUNT(*), SUM(b.final_amount) FROM bill b "
+             "WHERE DATE(b.date) >= :since GROUP BY DATE(b.date)",
+             {'since': since_30d.isoformat()}),
+            ("SELECT b.sale_date AS day, COUNT(*), SUM(b.final_amount) FROM bill b "
+             "WHERE b.sale_date >= :since GROUP BY b.sale_date",
+             {'since': since_30d}),
+        ),
+        'forecast_extract_7d': (
+            ("SELECT DATE(b.date) AS ds, bi.product_id, p.category, SUM(bi.quantity) AS y "
+             "FROM bill b JOIN bill_item bi ON b.id = bi.bill_id "
+             "LEFT OUTER JOIN product p ON p.id = bi.product_id "
+             "WHERE b.date >= :since GROUP BY DATE(b.date), bi.product_id, p.category",
+             {'since': f'{since_7d.isoformat()} 00:00:00'}),
+            (forecast, forecast_params),
+        ),
+    }
+
+def _plan(conn, query, params):
+    # Runs the query once and EXPLAINs the statement the driver was given
+    issued = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        issued.append((statement, parameters))
+
+    event.listen(conn, 'after_cursor_execute', capture)
+    try:
+        conn.execute(text(query), params).all()
+    finally:
+        event.remove(conn, 'after_cursor_execute', capture)
+    _, rows = instrumentation.explain(conn, *issued[0])
+    return [' | '.join(str(value) for value in row) for row in rows]
+
+def _median_ms(conn, query, params):
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        conn.execute(text(query), params).all()
+        timings.append((time.perf_counter() - started) * 1000)
+    return round(statistics.median(timings), 3)
+
+def measure():
+    """{query: {'legacy' | 'current': {'sql', 'plan', 'median_ms'}}}. Needs an app context."""
+    results = {}
+    with db.engine.connect() as conn:
+        for name, forms in _queries(storetime.today()).items():
+            results[name] = {}
+            for form, (query, params) in zip(('legacy', 'current'), forms):
+                results[name][form] = {'sql': query, 'plan': _plan(conn, query, params),
+                                       'median_ms': _median_ms(conn, query, params)}
+    return results
+
+def describe(results):
+    """Lines of a readable report of measure()'s results."""
+    lines = []
+    for name, forms in results.items():
+        for form, result in forms.items():
+            lines.append(f"{name:<20} {form:<8} {result['median_ms']:>9} ms")
+            lines.extend(f'    {step}' for step in result['plan'])
+    return lines
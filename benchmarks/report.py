@@ -0,0 +1,80 @@
+# FILE: benchmarks/report.py
+import json
+import math
+
+# Result files are JSON: {"meta": {...}, "results": {scenario: summary}}, plus
+# "plans" (see plans.py) from in-process runs. compare() lines up two of them
+# and flags regressions beyond a threshold.
+
+# Metrics compared between runs, and whether a higher value is better
+COMPARED = [('p50_ms', False), ('p95_ms', False), ('p99_ms', False), ('throughput_rps', True),
+            ('queries_per_request', False)]
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(samples, busy_seconds):
+    latencies = sorted(seconds * 1000 for _, seconds, _ in samples)
+    statements = [count for _, _, count in samples if count is not None]
+    statuses = {}
+    for status, _, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for status, _, _ in samples if status >= 400),
+        'statuses': statuses,
+        'p50_ms': _round(percentile(latencies, 50)),
+        'p95_ms': _round(percentile(latencies, 95)),
+        'p99_ms': _round(percentile(latencies, 99)),
+        'mean_ms': _round(sum(latencies) / len(latencies)) if latencies else None,
+        'max_ms': _round(latencies[-1]) if latencies else None,
+        'throughput_rps': _round(len(samples) / busy_seconds) if busy_seconds else None,
+        'queries_per_request': _round(sum(statements) / len(statements)) if statements else None,
+        'max_queries': max(statements) if statements else None,
+    }
+
+def _round(value):
+    return round(value, 3) if value is not None else None
+
+def save(path, meta, results, plans=None):
+    data = {'meta': meta, 'results': results}
+    if plans is not None:
+        data['plans'] = plans
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def _compare_metric(lines, regressions, name, metric, before, after, higher_is_better, threshold):
+    change = (after - before) / before * 100 if before else (0.0 if after == before else math.inf)
+    worse = -change if higher_is_better else change
+    flag = ''
+    if worse > threshold:
+        flag = '  REGRESSION'
+        regressions.append((name, metric, round(change, 1)))
+    lines.append(f'{name:<20} {metric:<20} {before:>12} {after:>12} {change:>+8.1f}%{flag}')
+
+def compare(old, new, threshold=10.0):
+    """Lines of a comparison table and the list of regressions (scenario, metric, change %)."""
+    lines = [f"{'scenario':<20} {'metric':<20} {'old':>12} {'new':>12} {'change':>9}"]
+    regressions = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        for metric, higher_is_better in COMPARED:
+            before, after = old['results'][name].get(metric), new['results'][name].get(metric)
+            if before is None or after is None:
+                continue
+            _compare_metric(lines, regressions, name, metric, before, after, higher_is_better, threshold)
+    # The analytics queries in their current form
+    old_plans, new_plans = old.get('plans') or {}, new.get('plans') or {}
+    for name in sorted(set(old_plans) & set(new_plans)):
+        _compare_metric(lines, regressions, name, 'current_ms', old_plans[name]['current']['median_ms'],
+                        new_plans[name]['current']['median_ms'], False, threshold)
+    for name in sorted(set(old['results']) ^ set(new['results'])):
+        lines.append(f"{name:<20} only in the {'old' if name in old['results'] else 'new'} run")
+    return lines, regressions
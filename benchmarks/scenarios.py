@@ -0,0 +1,81 @@
+# FILE: benchmarks/scenarios.py
+import time
+from benchmarks import datagen
+
+# The routes under benchmark. A scenario says how to sign in, what to do
+# before each timed request (e.g. refill the cart a checkout just emptied)
+# and how to build the timed request itself. Only the timed request counts
+# towards the results.
+#
+# Requests are (method, path, options) tuples; options may hold 'data' (a
+# form) or 'json'. Every callable gets the worker's random.Random and the
+# dataset scale, so runs with the same seed issue the same requests.
+
+class Scenario:
+    def __init__(self, name, route, request, login=None, prepare=None):
+        self.name = name
+        self.route = route # URL rule, as labelled in /metrics
+        self.request = request
+        self.login = login # None, 'customer' or 'admin'
+        self.prepare = prepare
+
+def _product(rng, scale):
+    return rng.randint(1, scale['products'])
+
+def _fill_cart(rng, scale):
+    return [('POST', f'/cart/add/{_product(rng, scale)}', {'data': {'quantity': '1'}}) for _ in range(3)]
+
+def _bill_request(lines):
+    # Distinct products, as many as the dataset has up to `lines`
+    def request(rng, scale, worker):
+        ids = rng.sample(range(1, scale['products'] + 1), min(lines, scale['products']))
+        return ('POST', '/admin/billing/create', {'json': {
+            'customer_name': 'Walk-in', 'tax_percentage': '5', 'discount_amount': '0',
+            'items': [{'id': product_id, 'quantity': 1} for product_id in ids],
+        }})
+    return request
+
+def _checkout_form(worker):
+    return {'name': 'Bench Customer', 'email': datagen.customer_email(worker + 1), 'address': '1 Bench Street',
+            'city': 'Pune'}
+
+SCENARIOS = [
+    Scenario('home', '/', lambda rng, scale, worker: ('GET', '/', {})),
+    Scenario('home_search', '/', lambda rng, scale, worker: ('GET', f'/?q={rng.choice(datagen.WORDS)}', {})),
+    Scenario('home_signed_in', '/', lambda rng, scale, worker: ('GET', '/', {}), login='customer'),
+    Scenario('product_detail', '/product/<int:id>',
+             lambda rng, scale, worker: ('GET', f'/product/{_product(rng, scale)}', {})),
+    Scenario('view_cart', '/cart', lambda rng, scale, worker: ('GET', '/cart', {}), login='customer',
+             prepare=lambda rng, scale, worker, first: _fill_cart(rng, scale) if first else []),
+    Scenario('checkout', '/checkout',
+             lambda rng, scale, worker: ('POST', '/checkout', {'data': _checkout_form(worker)}), login='customer',
+             prepare=lambda rng, scale, worker, first: _fill_cart(rng, scale)),
+    *[Scenario(f'create_bill_{lines}', '/admin/billing/create', _bill_request(lines), login='admin')
+      for lines in (1, 10, 100)],
+    Scenario('pos_snapshot', '/admin/api/pos/snapshot',
+             lambda rng, scale, worker: ('GET', '/admin/api/pos/snapshot', {}), login='admin'),
+    Scenario('pos_changes', '/admin/api/pos/changes',
+             lambda rng, scale, worker: ('GET', f'/admin/api/pos/changes?since={time.time_ns() // 1000 - 15_000_000}', {}),
+             login='admin'),
+    Scenario('dashboard', '/admin/dashboard', lambda rng, scale, worker: ('GET', '/admin/dashboard', {}), login='admin'),
+    Scenario('inventory_summary', '/admin/inventory/summary',
+             lambda rng, scale, worker: ('GET', '/admin/inventory/summary', {}), login='admin'),
+    Scenario('forecasting', '/admin/forecasting', lambda rng, scale, worker: ('GET', '/admin/forecasting', {}),
+             login='admin'),
+]
+
+def login_request(kind, worker):
+    """The form post that signs a worker in; each worker uses its own customer account."""
+    if kind == 'admin':
+        return ('POST', '/admin/login', {'data': {'username': datagen.ADMIN_USERNAME, 'password': datagen.BENCH_PASSWORD}})
+    return ('POST', '/login', {'data': {'email': datagen.customer_email(worker + 1), 'password': datagen.BENCH_PASSWORD}})
+
+def select(names):
+    """Scenarios by name, in the order given; all of them for an empty selection."""
+    if not names:
+        return list(SCENARIOS)
+    by_name = {scenario.name: scenario for scenario in SCENARIOS}
+    unknown = [name for name in names if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown scenario(s): {', '.join(unknown)}. Known: {', '.join(by_name)}")
+    return [by_name[name] for name in names]
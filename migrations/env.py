@@ -96,6 +96,19 @@ def run_migrations_online():
 
     connectable = get_engine()
 
+    # Schema items declared with .ddl_if(dialect=...) (e.g. the MySQL-only
+    # FULLTEXT index on product) only exist on that dialect; don't compare
+    # them anywhere else
+    def include_object(object, name, type_, reflected, compare_to):
+        ddl_if = getattr(object, '_ddl_if', None)
+        if ddl_if is not None and ddl_if.dialect is not None:
+            dialects = [ddl_if.dialect] if isinstance(ddl_if.dialect, str) else ddl_if.dialect
+            return connectable.dialect.name in dialects
+        return True
+
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
+
     with connectable.connect() as connection:
         context.configure(
             connection=connection,
@@ -0,0 +1,42 @@
+"""Add cart and cart_line tables for server-side carts
+
+Revision ID: 2f8b6d0c3a71
+Revises: 7c3e9a1d4b26
+Create Date: 2026-10-18 15:47:12.630914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f8b6d0c3a71'
+down_revision = '7c3e9a1d4b26'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cart',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_cart_updated_at'), ['updated_at'], unique=False)
+
+    op.create_table('cart_line',
+    sa.Column('cart_id', sa.String(length=64), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['cart_id'], ['cart.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('cart_id', 'product_id')
+    )
+
+
+def downgrade():
+    op.drop_table('cart_line')
+    with op.batch_alter_table('cart', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_cart_updated_at'))
+
+    op.drop_table('cart')
@@ -0,0 +1,32 @@
+"""Add stock_on_hand counter to Product
+
+Revision ID: 3b7e91d0a5c2
+Revises: c4ed818b444d
+Create Date: 2026-10-18 09:12:40.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3b7e91d0a5c2'
+down_revision = 'c4ed818b444d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('stock_on_hand', sa.Integer(), server_default='0', nullable=False))
+
+    # Backfill the counter from the existing batches
+    op.execute(
+        "UPDATE product SET stock_on_hand = "
+        "(SELECT COALESCE(SUM(batch.quantity), 0) FROM batch WHERE batch.product_id = product.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('stock_on_hand')
@@ -0,0 +1,69 @@
+"""Add daily_sales_rollup and customer_order_count tables
+
+Revision ID: 5a1c7e2b9f40
+Revises: 8d2f4c6a1e93
+Create Date: 2026-10-18 11:26:05.903114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a1c7e2b9f40'
+down_revision = '8d2f4c6a1e93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('daily_sales_rollup',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('product_name', sa.String(length=100), nullable=False),
+    sa.Column('category', sa.String(length=100), nullable=False),
+    sa.Column('revenue', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('cost', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('bill_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'product_id', 'category', name='uq_daily_sales_rollup_key')
+    )
+    op.create_table('customer_order_count',
+    sa.Column('email', sa.String(length=150), nullable=False),
+    sa.Column('bill_count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('email')
+    )
+
+    # Backfill from the existing bills (same queries as `flask rebuild-rollups`)
+    op.execute(
+        "INSERT INTO daily_sales_rollup (day, product_id, product_name, category, revenue, cost, units, bill_count) "
+        "SELECT DATE(bill.date), bill_item.product_id, MAX(bill_item.product_name), "
+        "COALESCE(product.category, 'Uncategorized'), SUM(bill_item.price_per_unit * bill_item.quantity), "
+        "SUM(bill_item.cost_price_at_sale * bill_item.quantity), SUM(bill_item.quantity), COUNT(DISTINCT bill.id) "
+        "FROM bill_item JOIN bill ON bill_item.bill_id = bill.id "
+        "LEFT OUTER JOIN product ON bill_item.product_id = product.id "
+        "WHERE bill_item.product_id IS NOT NULL "
+        "GROUP BY DATE(bill.date), bill_item.product_id, COALESCE(product.category, 'Uncategorized')"
+    )
+    op.execute(
+        "INSERT INTO daily_sales_rollup (day, product_id, product_name, category, revenue, cost, units, bill_count) "
+        "SELECT DATE(bill.date), NULL, bill_item.product_name, 'Uncategorized', "
+        "SUM(bill_item.price_per_unit * bill_item.quantity), SUM(bill_item.cost_price_at_sale * bill_item.quantity), "
+        "SUM(bill_item.quantity), COUNT(DISTINCT bill.id) "
+        "FROM bill_item JOIN bill ON bill_item.bill_id = bill.id "
+        "WHERE bill_item.product_id IS NULL "
+        "GROUP BY DATE(bill.date), bill_item.product_name"
+    )
+    op.execute(
+        "INSERT INTO customer_order_count (email, bill_count) "
+        "SELECT customer_email, COUNT(id) FROM bill "
+        "WHERE customer_email IS NOT NULL AND customer_email <> '' "
+        "GROUP BY customer_email"
+    )
+
+
+def downgrade():
+    op.drop_table('customer_order_count')
+    op.drop_table('daily_sales_rollup')
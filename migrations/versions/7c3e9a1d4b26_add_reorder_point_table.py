@@ -0,0 +1,47 @@
+"""Add reorder_point table and product/day index on daily_sales_rollup
+
+Revision ID: 7c3e9a1d4b26
+Revises: 5a1c7e2b9f40
+Create Date: 2026-10-18 14:02:37.418552
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e9a1d4b26'
+down_revision = '5a1c7e2b9f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('daily_sales_rollup', schema=None) as batch_op:
+        batch_op.create_index('ix_daily_sales_rollup_product_day', ['product_id', 'day'], unique=False)
+
+    # Filled by `flask recompute-reorder-points`, or in the background on the
+    # first visit to the reorder page
+    op.create_table('reorder_point',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('units_sold', sa.Integer(), nullable=False),
+    sa.Column('velocity', sa.Float(), nullable=False),
+    sa.Column('stock_on_hand', sa.Integer(), nullable=False),
+    sa.Column('days_of_cover', sa.Float(), nullable=True),
+    sa.Column('reorder_level', sa.Integer(), nullable=False),
+    sa.Column('at_risk', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('reorder_point', schema=None) as batch_op:
+        batch_op.create_index('ix_reorder_point_risk', ['at_risk', 'days_of_cover', 'product_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('reorder_point', schema=None) as batch_op:
+        batch_op.drop_index('ix_reorder_point_risk')
+
+    op.drop_table('reorder_point')
+    with op.batch_alter_table('daily_sales_rollup', schema=None) as batch_op:
+        batch_op.drop_index('ix_daily_sales_rollup_product_day')
@@ -0,0 +1,43 @@
+"""Add FIFO batch index and bill_item_batch consumption table
+
+Revision ID: 8d2f4c6a1e93
+Revises: 3b7e91d0a5c2
+Create Date: 2026-10-18 10:03:17.542871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d2f4c6a1e93'
+down_revision = '3b7e91d0a5c2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('batch', schema=None) as batch_op:
+        batch_op.create_index('ix_batch_fifo', ['product_id', 'date_added'], unique=False,
+                              sqlite_where=sa.text('quantity > 0'), postgresql_where=sa.text('quantity > 0'))
+
+    op.create_table('bill_item_batch',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('bill_item_id', sa.Integer(), nullable=False),
+    sa.Column('batch_id', sa.Integer(), nullable=True),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['batch_id'], ['batch.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['bill_item_id'], ['bill_item.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('bill_item_batch', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_bill_item_batch_bill_item_id'), ['bill_item_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill_item_batch', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_bill_item_batch_bill_item_id'))
+
+    op.drop_table('bill_item_batch')
+    with op.batch_alter_table('batch', schema=None) as batch_op:
+        batch_op.drop_index('ix_batch_fifo')
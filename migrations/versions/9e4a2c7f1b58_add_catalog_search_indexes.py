@@ -0,0 +1,65 @@
+"""Add catalog search indexes and the product_search_token table
+
+Revision ID: 9e4a2c7f1b58
+Revises: 2f8b6d0c3a71
+Create Date: 2026-10-18 16:58:03.412771
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4a2c7f1b58'
+down_revision = '2f8b6d0c3a71'
+branch_labels = None
+depends_on = None
+
+
+def _words(*texts):
+    # Same rules as app.catalog.tokenize, frozen here so the migration doesn't import the app
+    words = set()
+    for text in texts:
+        for word in re.findall(r'\w+', (text or '').lower()):
+            if len(word) >= 2:
+                words.add(word[:50])
+    return words
+
+
+def upgrade():
+    mysql = op.get_bind().dialect.name == 'mysql'
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.create_index('ix_product_name', ['name'], unique=False)
+        batch_op.create_index('ix_product_category_name', ['category', 'name'], unique=False)
+    if mysql:
+        op.create_index('ix_product_fulltext', 'product', ['name', 'description'], unique=False, mysql_prefix='FULLTEXT')
+
+    token_table = op.create_table('product_search_token',
+    sa.Column('token', sa.String(length=50), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('token', 'product_id')
+    )
+    with op.batch_alter_table('product_search_token', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_search_token_product_id'), ['product_id'], unique=False)
+
+    # Backfill the inverted index; MySQL searches the FULLTEXT index instead
+    if not mysql:
+        rows = op.get_bind().execute(sa.text('SELECT id, name, description FROM product')).all()
+        tokens = [{'token': token, 'product_id': row.id} for row in rows for token in _words(row.name, row.description)]
+        if tokens:
+            op.bulk_insert(token_table, tokens)
+
+
+def downgrade():
+    with op.batch_alter_table('product_search_token', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_search_token_product_id'))
+
+    op.drop_table('product_search_token')
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ix_product_fulltext', table_name='product')
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_category_name')
+        batch_op.drop_index('ix_product_name')
@@ -0,0 +1,61 @@
+"""Add bill.sale_date, the store's calendar day of each bill, and index it in place of bill.date
+
+Revision ID: a7c4e2f9d816
+Revises: f2a6d9e1b375
+Create Date: 2026-10-18 23:10:02.481937
+
+"""
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+from alembic import op
+from flask import current_app
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c4e2f9d816'
+down_revision = 'f2a6d9e1b375'
+branch_labels = None
+depends_on = None
+
+# Compared as text so that SQLite matches the timestamps of CURRENT_TIMESTAMP
+# (no fraction) and of the app (with one) alike; MySQL casts it to DATETIME
+bill = sa.table('bill', sa.column('date', sa.String()), sa.column('sale_date', sa.Date()))
+
+
+def _timestamp(value):
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+def upgrade():
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('sale_date', sa.Date(), nullable=True))
+
+    # One UPDATE per store day, over the half-open range of bill.date (in the
+    # database's own zone) that the day covers, so ix_bill_date finds the rows
+    store = ZoneInfo(current_app.config.get('STORE_TIMEZONE', 'UTC'))
+    database = ZoneInfo(current_app.config.get('DATABASE_TIMEZONE', 'UTC'))
+    bind = op.get_bind()
+    first, last = bind.execute(sa.select(sa.func.min(bill.c.date), sa.func.max(bill.c.date))).one()
+    if first is not None:
+        day = _timestamp(first).replace(tzinfo=database).astimezone(store).date()
+        last_day = _timestamp(last).replace(tzinfo=database).astimezone(store).date()
+        while day <= last_day:
+            start, end = (datetime.combine(d, time.min, store).astimezone(database).strftime('%Y-%m-%d %H:%M:%S')
+                          for d in (day, day + timedelta(days=1)))
+            bind.execute(bill.update().where(bill.c.date >= start, bill.c.date < end).values(sale_date=day))
+            day += timedelta(days=1)
+    # Bills without a timestamp
+    bind.execute(bill.update().where(bill.c.sale_date.is_(None)).values(sale_date=date.today()))
+
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.alter_column('sale_date', existing_type=sa.Date(), nullable=False)
+        batch_op.drop_index('ix_bill_date')
+        batch_op.create_index('ix_bill_sale_date', ['sale_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.drop_index('ix_bill_sale_date')
+        batch_op.create_index('ix_bill_date', ['date'], unique=False)
+        batch_op.drop_column('sale_date')
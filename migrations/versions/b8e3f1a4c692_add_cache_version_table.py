@@ -0,0 +1,29 @@
+"""Add cache_version table for result cache versions shared by all workers
+
+Revision ID: b8e3f1a4c692
+Revises: a7c4e2f9d816
+Create Date: 2026-10-19 09:14:36.502817
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b8e3f1a4c692'
+down_revision = 'a7c4e2f9d816'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('namespace', sa.String(length=50), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('changed_at', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('namespace')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
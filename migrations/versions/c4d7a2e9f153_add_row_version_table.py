@@ -0,0 +1,38 @@
+"""Add row_version table so product row versions follow the database's order of issue
+
+Revision ID: c4d7a2e9f153
+Revises: b8e3f1a4c692
+Create Date: 2026-10-19 15:42:08.113604
+
+"""
+import time
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7a2e9f153'
+down_revision = 'b8e3f1a4c692'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    row_version = op.create_table('row_version',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('issued_at', sa.DateTime(), server_default=sa.func.now(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    # Row versions used to be microsecond timestamps; carry on above the
+    # highest one, so versions terminals already hold stay valid
+    bind = op.get_bind()
+    highest = max(
+        time.time_ns() // 1000,
+        bind.execute(sa.text('SELECT MAX(row_version) FROM product')).scalar() or 0,
+        bind.execute(sa.text('SELECT MAX(row_version) FROM product_tombstone')).scalar() or 0,
+    )
+    op.bulk_insert(row_version, [{'id': highest}])
+
+
+def downgrade():
+    op.drop_table('row_version')
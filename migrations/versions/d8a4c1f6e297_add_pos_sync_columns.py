@@ -0,0 +1,49 @@
+"""Add product.row_version, product_tombstone and bill.client_ref for billing terminals
+
+Revision ID: d8a4c1f6e297
+Revises: b3f7d2e8a614
+Create Date: 2026-10-18 19:05:27.904133
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a4c1f6e297'
+down_revision = 'b3f7d2e8a614'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing rows start at version 0; terminals begin from a snapshot, which is newer
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('row_version', sa.BigInteger(), server_default='0', nullable=False))
+        batch_op.create_index('ix_product_row_version', ['row_version'], unique=False)
+
+    op.create_table('product_tombstone',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('row_version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('product_tombstone', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_product_tombstone_row_version'), ['row_version'], unique=False)
+
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('client_ref', sa.String(length=64), nullable=True))
+        batch_op.create_unique_constraint('uq_bill_client_ref', ['client_ref'])
+
+
+def downgrade():
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_bill_client_ref', type_='unique')
+        batch_op.drop_column('client_ref')
+
+    with op.batch_alter_table('product_tombstone', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_product_tombstone_row_version'))
+
+    op.drop_table('product_tombstone')
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_index('ix_product_row_version')
+        batch_op.drop_column('row_version')
@@ -0,0 +1,47 @@
+"""Store bill and bill item amounts as Numeric instead of Float
+
+Revision ID: e5b9c3a7d142
+Revises: d8a4c1f6e297
+Create Date: 2026-10-18 21:12:40.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b9c3a7d142'
+down_revision = 'd8a4c1f6e297'
+branch_labels = None
+depends_on = None
+
+BILL_COLUMNS = [('subtotal', 12), ('tax_percentage', 5), ('discount_amount', 12), ('final_amount', 12)]
+BILL_ITEM_COLUMNS = [('price_per_unit', 10), ('cost_price_at_sale', 10)]
+
+
+def upgrade():
+    # Round the stored floats first; SQLite would otherwise copy them into the new columns unchanged
+    op.execute('UPDATE bill SET ' + ', '.join(f'{name} = ROUND({name}, 2)' for name, _ in BILL_COLUMNS))
+    op.execute('UPDATE bill_item SET ' + ', '.join(f'{name} = ROUND({name}, 2)' for name, _ in BILL_ITEM_COLUMNS))
+
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        for name, precision in BILL_COLUMNS:
+            batch_op.alter_column(name, existing_type=sa.Float(), type_=sa.Numeric(precision=precision, scale=2),
+                                  existing_nullable=False)
+
+    with op.batch_alter_table('bill_item', schema=None) as batch_op:
+        for name, precision in BILL_ITEM_COLUMNS:
+            batch_op.alter_column(name, existing_type=sa.Float(), type_=sa.Numeric(precision=precision, scale=2),
+                                  existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('bill_item', schema=None) as batch_op:
+        for name, precision in BILL_ITEM_COLUMNS:
+            batch_op.alter_column(name, existing_type=sa.Numeric(precision=precision, scale=2), type_=sa.Float(),
+                                  existing_nullable=False)
+
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        for name, precision in BILL_COLUMNS:
+            batch_op.alter_column(name, existing_type=sa.Numeric(precision=precision, scale=2), type_=sa.Float(),
+                                  existing_nullable=False)
@@ -0,0 +1,44 @@
+"""Add bill and bill_item indexes for order history, date ranges and bill lines
+
+Revision ID: f2a6d9e1b375
+Revises: e5b9c3a7d142
+Create Date: 2026-10-18 22:04:51.660214
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6d9e1b375'
+down_revision = 'e5b9c3a7d142'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.create_index('ix_bill_customer_date', ['customer_id', 'date'], unique=False)
+        batch_op.create_index('ix_bill_date', ['date'], unique=False)
+        batch_op.create_index('ix_bill_customer_email', ['customer_email'], unique=False)
+
+    with op.batch_alter_table('bill_item', schema=None) as batch_op:
+        batch_op.create_index('ix_bill_item_bill_product', ['bill_id', 'product_id'], unique=False)
+        batch_op.create_index('ix_bill_item_product_name', ['product_id', 'product_name'], unique=False)
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        # MySQL dropped its implicit foreign key indexes in favour of the new
+        # ones, and won't drop those while no other index covers the key
+        op.create_index('customer_id', 'bill', ['customer_id'], unique=False)
+        op.create_index('bill_id', 'bill_item', ['bill_id'], unique=False)
+        op.create_index('product_id', 'bill_item', ['product_id'], unique=False)
+
+    with op.batch_alter_table('bill_item', schema=None) as batch_op:
+        batch_op.drop_index('ix_bill_item_product_name')
+        batch_op.drop_index('ix_bill_item_bill_product')
+
+    with op.batch_alter_table('bill', schema=None) as batch_op:
+        batch_op.drop_index('ix_bill_customer_email')
+        batch_op.drop_index('ix_bill_date')
+        batch_op.drop_index('ix_bill_customer_date')
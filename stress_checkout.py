@@ -0,0 +1,113 @@
+# This script fires many simultaneous storefront checkouts at a scratch database
+# and checks that stock is never oversold.
+#
+#   python stress_checkout.py                      # temporary SQLite file
+#   python stress_checkout.py --threads 100 --orders 500 --stock 120
+#   python stress_checkout.py --database-url mysql+pymysql://root:pw@localhost/stress_db
+#
+# The target database is created from the models and filled with test data, so
+# never point it at a real database.
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+parser = argparse.ArgumentParser(description='Concurrent checkout oversell test.')
+parser.add_argument('--database-url', help='Scratch database (default: a temporary SQLite file).')
+parser.add_argument('--threads', type=int, default=50, help='Number of concurrent shoppers.')
+parser.add_argument('--orders', type=int, default=300, help='Total checkouts to attempt.')
+parser.add_argument('--stock', type=int, default=100, help='Units of the contested product.')
+parser.add_argument('--batches', type=int, default=7, help='Number of batches the stock is spread over.')
+args = parser.parse_args()
+
+os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'stress.db')
+
+from app import create_app, db, inventory, transactions, cart as carts
+from app.models import Product, Customer, Bill, BillItem, Batch
+
+app = create_app()
+
+with app.app_context():
+    db.drop_all()
+    db.create_all()
+    product = Product(name='Contested Item', cost_price=Decimal('10.00'), selling_price=Decimal('15.00'), category='Stress')
+    db.session.add(product)
+    db.session.flush()
+    per_batch, extra = divmod(args.stock, args.batches)
+    for i in range(args.batches):
+        inventory.add_batch(product.id, per_batch + (1 if i < extra else 0))
+    for i in range(args.threads):
+        customer = Customer(name=f'Shopper {i}', email=f'shopper{i}@example.com')
+        customer.set_password('stress')
+        db.session.add(customer)
+    db.session.commit()
+    product_id = product.id
+
+start = threading.Barrier(args.threads)
+results = {'placed': 0, 'rejected': 0, 'errors': []}
+lock = threading.Lock()
+
+def fill_cart(cart_id):
+    carts.store().set_line(cart_id, product_id, 1)
+    db.session.commit()
+
+def shopper(index, orders):
+    client = app.test_client()
+    client.post('/login', data={'email': f'shopper{index}@example.com', 'password': 'stress'})
+    with app.app_context():
+        cart_id = carts.customer_cart_id(Customer.query.filter_by(email=f'shopper{index}@example.com').one().id)
+    start.wait()
+    for _ in range(orders):
+        try:
+            # Put one unit in the cart while it still looks available, then race to check out
+            with app.app_context():
+                transactions.run_with_retry(lambda: fill_cart(cart_id))
+            response = client.post('/checkout', data={'name': 'Shopper', 'email': f'shopper{index}@example.com',
+                                                      'address': '1 Test Street', 'city': 'Testville'})
+            placed = response.status_code == 302 and '/order_success/' in response.headers.get('Location', '')
+            with lock:
+                results['placed' if placed else 'rejected'] += 1
+        except Exception as e:
+            with lock:
+                results['errors'].append(repr(e))
+
+per_thread, remainder = divmod(args.orders, args.threads)
+threads = [threading.Thread(target=shopper, args=(i, per_thread + (1 if i < remainder else 0))) for i in range(args.threads)]
+started = time.perf_counter()
+for t in threads:
+    t.start()
+for t in threads:
+    t.join()
+elapsed = time.perf_counter() - started
+
+with app.app_context():
+    sold = db.session.query(db.func.coalesce(db.func.sum(BillItem.quantity), 0)).scalar()
+    bills = Bill.query.count()
+    negative_batches = Batch.query.filter(Batch.quantity < 0).count()
+    counter = db.session.get(Product, product_id).stock_on_hand
+    drift = inventory.find_stock_drift()
+
+print(f'{args.orders} checkouts from {args.threads} threads in {elapsed:.2f}s')
+print(f'placed={results["placed"]} rejected={results["rejected"]} errors={len(results["errors"])}')
+print(f'units sold={sold} of {args.stock}, bills={bills}, counter left={counter}, negative batches={negative_batches}')
+
+failures = []
+if sold > args.stock:
+    failures.append(f'oversold by {sold - args.stock} units')
+if sold != min(args.stock, args.orders):
+    failures.append(f'expected {min(args.stock, args.orders)} units sold, got {sold}')
+if negative_batches:
+    failures.append(f'{negative_batches} batch(es) went negative')
+if counter != args.stock - sold or drift:
+    failures.append('stock_on_hand drifted from the batch table')
+if results['errors']:
+    failures.append(f'{len(results["errors"])} request error(s), first: {results["errors"][0]}')
+
+if failures:
+    print('FAIL: ' + '; '.join(failures))
+    sys.exit(1)
+print('OK: no oversell')